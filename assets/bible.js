@@ -14,8 +14,21 @@ function upTo(el, id) {
 var currentWord;
 var currentVerse;
 
+function get_verse_element(verseTag) {
+    // In the continuous reading mode, verses are searched in the current chapter
+    if (continuousReading) {
+        var chapterElement = get_chapter_element(currentChapter);
+
+        if (chapterElement != null) {
+            return chapterElement.querySelector('[data-verse="' + verseTag.replace("verse-", "") + '"]');
+        }
+    }
+
+    return document.getElementById(verseTag);
+}
+
 function jump_to_verse(verseTag) {
-    var verse_to_scroll_to = document.getElementById(verseTag);
+    var verse_to_scroll_to = get_verse_element(verseTag);
 
     if (verse_to_scroll_to != null) {
         // Unselect previous verse
@@ -59,4 +72,194 @@ function handle_click_on_word(evt) {
     }
 }
 
-document.getElementById("content").addEventListener('click', handle_click_on_word);
\ No newline at end of file
+document.getElementById("content").addEventListener('click', handle_click_on_word);
+
+// Continuous reading mode
+// Chapters of the book are loaded as the reader nears the edges of the document,
+// and chapters far from the viewport are unloaded.
+var MAX_LOADED_CHAPTERS = 5;
+var LOADING_MARGIN = "1500px";
+
+var continuousReading = document.body.dataset.continuous == "true";
+var bookName = document.body.dataset.book;
+var sourceNames = document.body.dataset.sources;
+var nbOfChapters = parseInt(document.body.dataset.nbOfChapters);
+var currentChapter = parseInt(document.body.dataset.chapter);
+var loadingChapters = new Set();
+var edgesObserver = null;
+
+function get_chapter_element(chapter) {
+    return document.getElementById("chapter-" + chapter);
+}
+
+function get_loaded_chapters() {
+    return Array.from(document.querySelectorAll("#content .chapter"));
+}
+
+function load_chapter(chapter) {
+    // Fetch a chapter and insert it at its place in the document
+    // Return a promise of the chapter element (null if the chapter does not exist)
+    if (chapter < 1 || chapter > nbOfChapters) {
+        return Promise.resolve(null);
+    }
+
+    var chapterElement = get_chapter_element(chapter);
+    if (chapterElement != null || loadingChapters.has(chapter)) {
+        return Promise.resolve(chapterElement);
+    }
+
+    loadingChapters.add(chapter);
+
+    r = "theke:/fragment/bible/" + encodeURIComponent(bookName + " " + chapter) + "?sources=" + encodeURIComponent(sourceNames);
+    return fetch(r)
+        .then(response => response.text())
+        .then(html => {
+            loadingChapters.delete(chapter);
+
+            var template = document.createElement("template");
+            template.innerHTML = html.trim();
+            chapterElement = template.content.firstElementChild;
+
+            if (chapterElement == null || get_chapter_element(chapter) != null) {
+                return get_chapter_element(chapter);
+            }
+
+            insert_chapter(chapterElement, chapter);
+            unload_far_chapters();
+
+            return chapterElement;
+        })
+        .catch(() => {
+            loadingChapters.delete(chapter);
+            return null;
+        });
+}
+
+function insert_chapter(chapterElement, chapter) {
+    // Chapters are kept in order
+    // If the chapter is inserted above the viewport, the scroll position is kept
+    var nextChapterElement = get_loaded_chapters().find(e => parseInt(e.dataset.chapter) > chapter);
+    var isAboveViewport = nextChapterElement != null && nextChapterElement.getBoundingClientRect().top < 0;
+    var previousHeight = document.documentElement.scrollHeight;
+
+    if (nextChapterElement != null) {
+        nextChapterElement.before(chapterElement);
+    } else {
+        document.getElementById("content").appendChild(chapterElement);
+    }
+
+    if (isAboveViewport) {
+        window.scrollBy(0, document.documentElement.scrollHeight - previousHeight);
+    }
+
+    edgesObserver.observe(chapterElement);
+}
+
+function unload_far_chapters() {
+    var chapterElements = get_loaded_chapters();
+
+    while (chapterElements.length > MAX_LOADED_CHAPTERS) {
+        // Unload the farthest chapter from the current one
+        var first = chapterElements[0];
+        var last = chapterElements[chapterElements.length - 1];
+        var farthest = (currentChapter - parseInt(first.dataset.chapter) > parseInt(last.dataset.chapter) - currentChapter) ? first : last;
+
+        var isAboveViewport = farthest.getBoundingClientRect().bottom < 0;
+        var previousHeight = document.documentElement.scrollHeight;
+
+        edgesObserver.unobserve(farthest);
+        farthest.remove();
+
+        if (isAboveViewport) {
+            window.scrollBy(0, document.documentElement.scrollHeight - previousHeight);
+        }
+
+        chapterElements = get_loaded_chapters();
+    }
+}
+
+function handle_edges(entries) {
+    // Load the previous (or next) chapter when the first (or last) loaded one nears the viewport
+    var chapterElements = get_loaded_chapters();
+
+    entries.forEach(entry => {
+        if (!entry.isIntersecting) {
+            return;
+        }
+
+        var chapter = parseInt(entry.target.dataset.chapter);
+
+        if (entry.target == chapterElements[0]) {
+            load_chapter(chapter - 1);
+        }
+
+        if (entry.target == chapterElements[chapterElements.length - 1]) {
+            load_chapter(chapter + 1);
+        }
+    });
+}
+
+function update_current_chapter() {
+    // The current chapter is the one at the first third of the viewport
+    var y = window.innerHeight / 3;
+    var chapterElement = get_loaded_chapters().find(e => {
+        var rect = e.getBoundingClientRect();
+        return rect.top <= y && rect.bottom > y;
+    });
+
+    if (chapterElement != null) {
+        var chapter = parseInt(chapterElement.dataset.chapter);
+
+        if (chapter != currentChapter) {
+            currentChapter = chapter;
+
+            // Send the current chapter out of the webview
+            r = "theke:/signal/visible_chapter?chapter=" + chapter;
+            fetch(r);
+        }
+    }
+}
+
+function goto_chapter(chapter, verse) {
+    // Scroll to a chapter of the book, loading it if needed
+    var isLoaded = get_chapter_element(chapter) != null;
+    var isNeighborLoaded = get_chapter_element(chapter - 1) != null || get_chapter_element(chapter + 1) != null;
+
+    if (!isLoaded && !isNeighborLoaded) {
+        // Loaded chapters should stay contiguous
+        get_loaded_chapters().forEach(e => {
+            edgesObserver.unobserve(e);
+            e.remove();
+        });
+    }
+
+    currentChapter = chapter;
+
+    load_chapter(chapter).then(chapterElement => {
+        if (chapterElement == null) {
+            return;
+        }
+
+        if (verse > 0) {
+            jump_to_verse("verse-" + verse);
+        } else {
+            chapterElement.scrollIntoView({behavior: "auto", block: "start", inline: "nearest"});
+        }
+    });
+}
+
+if (continuousReading) {
+    edgesObserver = new IntersectionObserver(handle_edges, {rootMargin: LOADING_MARGIN});
+    get_loaded_chapters().forEach(e => edgesObserver.observe(e));
+
+    var isScrollUpdateScheduled = false;
+    window.addEventListener("scroll", () => {
+        if (!isScrollUpdateScheduled) {
+            isScrollUpdateScheduled = true;
+            window.requestAnimationFrame(() => {
+                isScrollUpdateScheduled = false;
+                update_current_chapter();
+            });
+        }
+    });
+}
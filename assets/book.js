@@ -0,0 +1,142 @@
+// Chunks of external documents
+// Only some chunks of the document are loaded with the page,
+// the previous (or next) ones are loaded as the reader nears the edges of the document.
+var LOADING_MARGIN = "1500px";
+
+var documentContent = document.getElementById("content");
+var documentName = documentContent.dataset.document;
+var sourceName = documentContent.dataset.source;
+var nbOfChunks = parseInt(documentContent.dataset.nbOfChunks);
+var anchors = JSON.parse(documentContent.dataset.anchors);
+var pendingChunks = new Map(); // promises of chunks being loaded, by chunk
+var edgesObserver = null;
+
+function get_chunk_element(chunk) {
+    return document.getElementById("chunk-" + chunk);
+}
+
+function get_loaded_chunks() {
+    return Array.from(document.querySelectorAll("#content .chunk"));
+}
+
+function load_chunk(chunk) {
+    // Fetch a chunk and insert it at its place in the document
+    // Return a promise of the chunk element (null if the chunk does not exist)
+    if (chunk < 1 || chunk >= nbOfChunks) {
+        return Promise.resolve(null);
+    }
+
+    var chunkElement = get_chunk_element(chunk);
+    if (chunkElement != null) {
+        return Promise.resolve(chunkElement);
+    }
+
+    // A chunk being loaded is not fetched twice
+    if (pendingChunks.has(chunk)) {
+        return pendingChunks.get(chunk);
+    }
+
+    var r = "theke:/fragment/book/" + encodeURIComponent(documentName) + "?sources=" + encodeURIComponent(sourceName) + "&chunk=" + chunk;
+    var promise = fetch(r)
+        .then(response => response.text())
+        .then(html => {
+            pendingChunks.delete(chunk);
+
+            var template = document.createElement("template");
+            template.innerHTML = html.trim();
+            chunkElement = template.content.firstElementChild;
+
+            if (chunkElement == null || get_chunk_element(chunk) != null) {
+                return get_chunk_element(chunk);
+            }
+
+            insert_chunk(chunkElement, chunk);
+            return chunkElement;
+        })
+        .catch(() => {
+            pendingChunks.delete(chunk);
+            return null;
+        });
+
+    pendingChunks.set(chunk, promise);
+    return promise;
+}
+
+function insert_chunk(chunkElement, chunk) {
+    // Chunks are kept in order
+    // If the chunk is inserted above the viewport, the scroll position is kept
+    var nextChunkElement = get_loaded_chunks().find(e => parseInt(e.dataset.chunk) > chunk);
+    var isAboveViewport = nextChunkElement != null && nextChunkElement.getBoundingClientRect().top < 0;
+    var previousHeight = document.documentElement.scrollHeight;
+
+    if (nextChunkElement != null) {
+        nextChunkElement.before(chunkElement);
+    } else {
+        documentContent.appendChild(chunkElement);
+    }
+
+    if (isAboveViewport) {
+        window.scrollBy(0, document.documentElement.scrollHeight - previousHeight);
+    }
+
+    edgesObserver.observe(chunkElement);
+}
+
+function handle_edges(entries) {
+    // Load the previous (or next) chunk when the first (or last) loaded one nears the viewport
+    var chunkElements = get_loaded_chunks();
+
+    entries.forEach(entry => {
+        if (!entry.isIntersecting) {
+            return;
+        }
+
+        var chunk = parseInt(entry.target.dataset.chunk);
+
+        if (entry.target == chunkElements[0]) {
+            load_chunk(chunk - 1);
+        }
+
+        if (entry.target == chunkElements[chunkElements.length - 1]) {
+            load_chunk(chunk + 1);
+        }
+    });
+}
+
+function scroll_to_element(element) {
+    element.scrollIntoView({behavior: "smooth", block: "start", inline: "nearest"});
+}
+
+function goto_anchor(anchor) {
+    // Scroll to an anchor of the document, loading its chunk if needed
+    var element = document.getElementById(anchor) || document.getElementsByName(anchor)[0];
+
+    if (element != null) {
+        scroll_to_element(element);
+        return;
+    }
+
+    var chunk = anchors[anchor];
+    if (chunk === undefined) {
+        return;
+    }
+
+    if (get_chunk_element(chunk - 1) == null && get_chunk_element(chunk + 1) == null) {
+        // Loaded chunks should stay contiguous
+        get_loaded_chunks().forEach(e => {
+            edgesObserver.unobserve(e);
+            e.remove();
+        });
+    }
+
+    load_chunk(chunk).then(chunkElement => {
+        element = document.getElementById(anchor);
+
+        if (element != null) {
+            scroll_to_element(element);
+        }
+    });
+}
+
+edgesObserver = new IntersectionObserver(handle_edges, {rootMargin: LOADING_MARGIN});
+get_loaded_chunks().forEach(e => edgesObserver.observe(e));
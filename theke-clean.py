@@ -0,0 +1,32 @@
+#! /usr/bin/python3
+# -*- coding:utf-8 -*-
+
+"""Clean again every cached external document without the graphical interface
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+import theke
+import theke.externalCache
+
+def progress(nbOfDoneSources, nbOfSources, sourceName):
+    print("[{}/{}] {}".format(nbOfDoneSources, nbOfSources, sourceName), file = sys.stderr)
+
+# Documents are cleaned in spawned processes, which import this script again
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Clean again the external documents cached by Theke.")
+    parser.add_argument("--force", "-f", action = "store_true", help = "clean every document, even if it is up to date")
+    parser.add_argument("--jobs", "-j", type = int, default = None, help = "number of processes cleaning documents (default: number of CPUs)")
+    parser.add_argument("--debug", "-d", action = "store_true", help = "print debug messages")
+    args = parser.parse_args()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    summary = theke.externalCache.clean_cache(args.force, args.jobs, progress)
+
+    # Summary (durations in seconds)
+    print(json.dumps(summary, indent = 4))
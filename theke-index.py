@@ -0,0 +1,37 @@
+#! /usr/bin/python3
+# -*- coding:utf-8 -*-
+
+"""Build or update the index of Theke without the graphical interface
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+import theke
+import theke.index
+
+def progress(nbOfIndexedSources, nbOfSources, sourceName):
+    print("[{}/{}] {}".format(nbOfIndexedSources, nbOfSources, sourceName), file = sys.stderr)
+
+# Sword modules are scanned in spawned processes, which import this script again
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Build or update the index of Theke.")
+    parser.add_argument("--force", "-f", action = "store_true", help = "index every source, even if it is up to date")
+    parser.add_argument("--jobs", "-j", type = int, default = None, help = "number of processes scanning sword modules (default: number of CPUs)")
+    parser.add_argument("--debug", "-d", action = "store_true", help = "print debug messages")
+    args = parser.parse_args()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+
+    for path in [theke.PATH_ROOT, theke.PATH_DATA, theke.PATH_EXTERNAL]:
+        os.makedirs(path, exist_ok = True)
+
+    indexBuilder = theke.index.ThekeIndexBuilder()
+    summary = indexBuilder.build(args.force, args.jobs, progress)
+
+    # Timing summary (in seconds)
+    print(json.dumps(summary, indent = 4))
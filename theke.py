@@ -2,11 +2,21 @@
 # -*- coding:utf-8 -*-
 
 import sys
+import time
 import logging
-import theke.main
 
-if "--debug" in sys.argv or "-d" in sys.argv:
-    logging.basicConfig(level=logging.DEBUG)
+# The index is built in spawned processes, which import this script again
+if __name__ == "__main__":
+    if "--profile-startup" in sys.argv:
+        startTime = time.perf_counter()
+        import theke.startupProfiler
+        theke.startupProfiler.enable(startTime)
+        theke.startupProfiler.add_import("theke", time.perf_counter() - startTime)
 
-ThekeApp = theke.main.ThekeApp()
-ThekeApp.run(sys.argv)
\ No newline at end of file
+    import theke.main
+
+    if "--debug" in sys.argv or "-d" in sys.argv:
+        logging.basicConfig(level=logging.DEBUG)
+
+    ThekeApp = theke.main.ThekeApp()
+    ThekeApp.run(sys.argv)
@@ -2,37 +2,315 @@ from gi.repository import GObject
 from gi.repository import Gio
 from gi.repository import GLib
 
+try:
+    # Since GLib 2.80, unix specific classes are in GioUnix
+    import gi
+    gi.require_version('GioUnix', '2.0')
+    from gi.repository import GioUnix
+    UnixInputStream = GioUnix.InputStream
+
+except (ImportError, ValueError):
+    UnixInputStream = Gio.UnixInputStream
+
 import theke
 import theke.index
 import theke.externalCache
+import theke.lruCache
+import theke.reference
+import theke.searchIndex
+import theke.searchScheduler
+import theke.sword
 import theke.tableofcontent
 import theke.templates
+import theke.tracing
+import theke.uri
 
+import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import logging
 logger = logging.getLogger(__name__)
 
+# Maximal number of rendered chapters kept in memory
+CHAPTERS_CACHE_SIZE = 32
+
+# Niceness of the thread prefetching chapters (so that it uses idle CPU)
+PREFETCH_NICENESS = 10
+
+# Delay (in ms) before prefetching, so that the requested chapter is rendered first
+PREFETCH_DELAY = 300
+
+# Size (in bytes) of the chunks written into streams of rendered templates
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Templates listing the content of the index
+INDEX_TEMPLATES = ('welcome', 'modules', 'external_documents')
+
+# Delay (in s) between the last change of a file defining sources and the update of the index
+# (installing a module writes several files)
+SOURCES_CHANGED_DELAY = 2
+
 class ThekeArchivist(GObject.GObject):
     """The archivist indexes and stores documents
     """
 
-    def __init__(self) -> None:
+    __gsignals__ = {
+        # The index is updated in the background: (nbOfIndexedSources, nbOfSources, sourceName)
+        'index-progress': (GObject.SignalFlags.RUN_LAST, None, (int, int, str)),
+        # The index (and templates listing its content) was updated in the background
+        'index-updated': (GObject.SignalFlags.RUN_LAST, None, ()),
+        # Sections of an external document were extracted in the background: (sourceName)
+        'document-sections-updated': (GObject.SignalFlags.RUN_LAST, None, (str,)),
+        }
+
+    def __init__(self, continuousReading = False) -> None:
+        """
+        @param continuousReading: (bool) if True, biblical books are read as continuous documents,
+            chapters being loaded as the reader scrolls
+        """
+        super().__init__()
+
         self._index = theke.index.ThekeIndex()
+        self.continuousReading = continuousReading
+
+        # Rendered biblical chapters
+        self._chaptersCache = theke.lruCache.LRUCache(CHAPTERS_CACHE_SIZE, "ChaptersCache")
+
+        # Search index, shared by the main thread, searches and its update
+        self._searchIndex = theke.searchIndex.ThekeSearchIndex()
+        self._isSearchIndexUpdating = False
+        self._isSearchIndexUpdatePending = False
+
+        self._searchScheduler = theke.searchScheduler.ThekeSearchScheduler(self._searchIndex)
+
+        # Chapters are prefetched one by one; only the latest request is honored
+        self._prefetchExecutor = ThreadPoolExecutor(max_workers = 1,
+            thread_name_prefix = "ThekePrefetch", initializer = _lower_thread_priority)
+        self._prefetchGeneration = 0
+
+        self._isIndexUpdating = False
+        self._isIndexUpdatePending = False
+
+        # Names of external sources whose sections are being extracted
+        self._sectionsUpdating = set()
+
+        # Monitors of directories containing files defining sources
+        self._sourcesMonitors = []
+        self._sourcesChangedTimeoutId = None
+
+    def upgrade_index(self) -> None:
+        """Create or migrate the schema of the index, if needed
+
+        This should be done before the index is read.
+        """
+        theke.index.ThekeIndexBuilder()
 
     def update_index(self, force = False):
         """Update the index
         """
-        indexBuilder = theke.index.ThekeIndexBuilder()
-        indexBuilder.build(force)
+        indexBuilder = theke.index.ThekeIndexBuilder(privateSwordLibrary = True)
+        summary = indexBuilder.build(force)
+
+        if summary.get('sword') or summary.get('removed'):
+            # The shared sword libraries do not know installed, updated or removed modules
+            theke.sword.reset_libraries()
+
+        # Modules may have changed, rendered chapters and search results are obsolete
+        self._chaptersCache.clear()
+        self._searchScheduler.clear_cache()
+
+        self.update_search_index_async()
+
+    def update_index_async(self, force = False) -> None:
+        """Update the index and templates listing its content in a worker thread
+
+        Meanwhile, the current index is still read. The in-memory metadata of the index
+        are switched to the new generation at once, when it is built.
+        Progress is reported by the 'index-progress' signal and the end by the 'index-updated' one.
+        """
+        if self._isIndexUpdating:
+            # Sources may have changed since the update started
+            self._isIndexUpdatePending = True
+            return
+
+        logger.debug("Asynchronously update the index")
+        self._isIndexUpdating = True
+        self._isIndexUpdatePending = False
+
+        def _progress(nbOfIndexedSources, nbOfSources, sourceName):
+            GLib.idle_add(self.emit, 'index-progress', nbOfIndexedSources, nbOfSources, sourceName)
+
+        def _do_update():
+            summary = {}
+
+            try:
+                # The worker should not share sword managers with the main thread
+                # (the sword library is only created if sword modules changed).
+                # Meanwhile, the index is still read by other threads, but not written.
+                indexBuilder = theke.index.ThekeIndexBuilder(privateSwordLibrary = True)
+                summary = indexBuilder.build(force, progress = _progress)
+
+                self.build_templates(indexBuilder.index)
+
+            except Exception:
+                logger.exception("Fail to update the index")
+
+            GLib.idle_add(self._index_updated_cb, summary)
+
+        thread = threading.Thread(target=_do_update, name="ThekeIndex", daemon=True)
+        thread.start()
+
+    def _index_updated_cb(self, summary) -> bool:
+        self._isIndexUpdating = False
+
+        if summary.get('sword') or summary.get('removed'):
+            # Sword modules were installed, updated or removed:
+            # the shared sword libraries do not know them
+            theke.sword.reset_libraries()
+
+        # Modules may have changed, rendered chapters and search results are obsolete
+        self._chaptersCache.clear()
+        self._searchScheduler.clear_cache()
+
+        self.update_search_index_async()
+        self.emit('index-updated')
+
+        if self._isIndexUpdatePending:
+            self.update_index_async()
+
+        return GLib.SOURCE_REMOVE
+
+    def watch_sources(self) -> None:
+        """Update the index when sword modules or external sources are installed, updated or removed
+        """
+        if self._sourcesMonitors:
+            return
+
+        for path in theke.sword.get_config_dirs() + [theke.PATH_EXTERNAL]:
+            try:
+                monitor = Gio.File.new_for_path(path).monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+
+            except GLib.Error as error:
+                logger.warning("Fail to watch %s: %s", path, error.message)
+                continue
+
+            logger.debug("ThekeArchivist - Watch %s", path)
+            monitor.connect('changed', self._sources_changed_cb)
+            self._sourcesMonitors.append(monitor)
+
+    def _sources_changed_cb(self, monitor, file, otherFile, eventType) -> None:
+        if eventType not in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.DELETED,
+            Gio.FileMonitorEvent.MOVED_IN, Gio.FileMonitorEvent.MOVED_OUT, Gio.FileMonitorEvent.RENAMED):
+            return
+
+        fileNames = [f.get_basename() for f in (file, otherFile) if f is not None]
+        if not any(fileName.endswith(('.conf', '.yaml')) for fileName in fileNames):
+            return
+
+        logger.debug("ThekeArchivist - Sources changed: %s", fileNames)
+
+        # Wait for the end of the installation before updating the index
+        if self._sourcesChangedTimeoutId is not None:
+            GLib.source_remove(self._sourcesChangedTimeoutId)
+
+        self._sourcesChangedTimeoutId = GLib.timeout_add_seconds(SOURCES_CHANGED_DELAY, self._sources_changed_timeout_cb)
+
+    def _sources_changed_timeout_cb(self) -> bool:
+        self._sourcesChangedTimeoutId = None
+        self.update_index_async()
+
+        return GLib.SOURCE_REMOVE
+
+    def build_templates(self, index = None, missingOnly = False) -> None:
+        """Build/Update templates listing the content of the index
+
+        @param index: ThekeIndex to read (default: the one of the archivist)
+        @param missingOnly: if True, only build templates which were never built
+        """
+        index = index or self._index
+
+        templateNames = [templateName for templateName in INDEX_TEMPLATES
+            if not missingOnly or not os.path.isfile(theke.templates.get_built_template_path(templateName))]
+
+        if not templateNames:
+            return
+
+        bible_mods = list(index.list_sources(theke.index.SOURCETYPE_SWORD, theke.sword.MODTYPE_BIBLES))
+        book_mods = list(index.list_sources(theke.index.SOURCETYPE_SWORD, theke.sword.MODTYPE_GENBOOKS))
+        external_docs = list(index.list_external_documents())
+
+        templateData = {
+            'welcome': {'BibleMods': bible_mods},
+            'modules': {'BibleMods': bible_mods, 'BookMods' : book_mods},
+            'external_documents': {'ExternalDocs': external_docs},
+        }
+
+        for templateName in templateNames:
+            theke.templates.build_template(templateName, templateData[templateName])
+
+    def update_search_index_async(self) -> None:
+        """Asynchronously add new or updated biblical modules to the search index
+
+        Modules are indexed one update at a time: a request made during an update
+        is done once it is finished.
+        """
+        if self._isSearchIndexUpdating:
+            # Modules may have changed since the update started
+            self._isSearchIndexUpdatePending = True
+            return
+
+        self._isSearchIndexUpdatePending = False
+
+        modulesToIndex = []
+        for source in self._index.list_sources(theke.index.SOURCETYPE_SWORD, theke.sword.MODTYPE_BIBLES):
+            version = self._index.get_source_version(source.name)
+
+            if self._searchIndex.get_module_version(source.name) != version:
+                modulesToIndex.append((source.name, version))
+
+        if not modulesToIndex:
+            return
+
+        logger.debug("Asynchronously update the search index")
+        self._isSearchIndexUpdating = True
+
+        def _do_indexing():
+            try:
+                library = theke.sword.get_library(theke.sword.FMT_PLAIN, theke.sword.PLAIN_TEXT_GLOBAL_OPTIONS)
 
-    def get_document_handler(self, ref, sourceNames):
+                for moduleName, version in modulesToIndex:
+                    mod = library.get_bible_module(moduleName)
+                    self._searchIndex.index_module(moduleName, version, mod.get_plain_books())
+
+            except Exception:
+                logger.exception("Fail to update the search index")
+
+            GLib.idle_add(self._search_index_updated_cb)
+
+        thread = threading.Thread(target=_do_indexing, daemon=True)
+        thread.start()
+
+    def _search_index_updated_cb(self) -> bool:
+        self._isSearchIndexUpdating = False
+
+        if self._isSearchIndexUpdatePending:
+            self.update_search_index_async()
+
+        return GLib.SOURCE_REMOVE
+
+    def get_document_handler(self, ref, sourceNames, lazy = False):
         """Return a handler providing an input stream to the document
 
         @param sourceNames: list of source names
+        @param lazy: if True, the document is only rendered when its input stream is requested
         """
 
-        sources = [self._index.get_source_data(sourceName) for sourceName in sourceNames] if sourceNames else None
+        with theke.tracing.span("index.get_source_data"):
+            sources = [self._index.get_source_data(sourceName) for sourceName in sourceNames] if sourceNames else None
+
+        if lazy:
+            return LazyHandler(lambda: self.get_document_handler(ref, sourceNames), sources)
 
         if ref.type == theke.TYPE_INAPP:
             logger.debug("Get a document handler [inApp] : {}".format(ref))
@@ -42,26 +320,14 @@ class ThekeArchivist(GObject.GObject):
         if ref.type == theke.TYPE_BIBLE:
             logger.debug("Get a document handler [bible] : {}".format(ref))
 
-            documents = []
-            verses = []
-            #isMorphAvailable = False
-
-            for source in sources:
-                markup = theke.sword.MARKUP.get(source.name, theke.sword.FMT_PLAIN)
-                mod = theke.sword.SwordLibrary(markup=markup).get_bible_module(source.name)
-                documents.append({
-                    'lang' : mod.get_lang(),
-                    'source': source.name
-                })
-                verses.append(mod.get_chapter(ref.bookName, ref.chapter))
-
-                #isMorphAvailable |= "OSISMorph" in mod.get_global_option_filter()
-
-            content = theke.templates.render('bible', {
-                'documents': documents,
-                'verses': verses,
-                'ref': ref
-            })
+            cacheKey = self._get_chapter_cache_key(ref, sources, 'bible')
+            content = self._chaptersCache.get(cacheKey)
+
+            if content is None:
+                # The page is streamed to the webview while it is rendered,
+                # then stored in the cache
+                return TemplateHandler('bible', self._get_bible_chapter_data(ref, sources), sources,
+                    lambda content: self._chaptersCache.put(cacheKey, content))
 
             return ContentHandler(content, sources)
 
@@ -71,8 +337,22 @@ class ThekeArchivist(GObject.GObject):
             source = sources[0]
 
             if source.type == theke.index.SOURCETYPE_SWORD:
-                logger.warning("Cannot open sword books : %s", ref)
-                return ContentHandler("<p>Les livres provenant d'un module sword ne peuvent pas être ouvert par Theke.</p>", [source])
+                logger.debug("Get a document handler [sword book] : %s", ref)
+
+                page = self.get_book_page(source.name, ref.section)
+
+                if page is None:
+                    logger.warning("Sword book not indexed : %s", ref)
+                    return ContentHandler("<p>Ce livre n'est pas encore indexé par Theke.</p>", [source])
+
+                cacheKey = ('book', source.name, page.offset, self._index.get_source_version(source.name))
+                content = self._chaptersCache.get(cacheKey)
+
+                if content is None:
+                    return TemplateHandler('book', self._get_book_page_data(ref, source, page), [source],
+                        lambda content: self._chaptersCache.put(cacheKey, content))
+
+                return ContentHandler(content, [source])
 
             if source.type == theke.index.SOURCETYPE_EXTERN:
                 logger.debug("Get a document handler [external book] : %s", ref)
@@ -87,25 +367,328 @@ class ThekeArchivist(GObject.GObject):
                         return None
 
                 if not theke.externalCache.is_cache_cleaned(source.name):
-                    theke.externalCache._build_clean_document(source.name)
+                    theke.externalCache.clean_cached_document(source.name, force = True)
 
                 document_path = theke.externalCache.get_best_source_file_path(source.name, relative=True)
+                chunksIndex = theke.externalCache.load_chunks_index(source.name)
 
-                content = theke.templates.render('external_book', {
-                    'ref': ref,
-                    'document_path': document_path})
+                if chunksIndex is None:
+                    return TemplateHandler('external_book', {
+                        'ref': ref,
+                        'document_path': document_path}, [source])
 
-                return ContentHandler(content, [source])
+                # Only the head of the document, the chunk of the section and its neighbours are loaded;
+                # other chunks are loaded by the webview as the reader scrolls
+                chunkIndex = chunksIndex['anchors'].get(ref.section, 1)
+                chunkIndices = [0] + [i for i in range(chunkIndex - 1, chunkIndex + 2) if 0 < i < chunksIndex['nbOfChunks']]
+
+                return TemplateHandler('external_book', {
+                    'ref': ref,
+                    'source': source.name,
+                    'nbOfChunks': chunksIndex['nbOfChunks'],
+                    'anchors': chunksIndex['anchors'],
+                    # Chunks are read while the template is rendered
+                    'chunks': ((i, theke.externalCache.read_chunk(source.name, i)) for i in chunkIndices)}, [source])
 
         return None
 
-    def get_document_toc(self, ref):
+    def get_bible_chapter_fragment_async(self, ref, sourceNames, callback) -> None:
+        """Asynchronously render a biblical chapter as a fragment
+        to be inserted into a document (in the continuous reading mode)
+
+        @param callback: function called in the main thread with the fragment
+            (or None if the chapter cannot be rendered)
+        """
+        sources = [self._index.get_source_data(sourceName) for sourceName in sourceNames]
+        cacheKey = self._get_chapter_cache_key(ref, sources, 'bible_chapter')
+        content = self._chaptersCache.get(cacheKey)
+
+        if content is not None:
+            callback(content)
+            return
+
+        def _do_rendering():
+            try:
+                content = self._render_bible_chapter(ref, sources, 'bible_chapter')
+                self._chaptersCache.put(cacheKey, content)
+
+            except Exception:
+                logger.exception("Fail to render %s %s", ref.bookName, ref.chapter)
+                content = None
+
+            GLib.idle_add(callback, content)
+
+        thread = threading.Thread(target=_do_rendering, daemon=True)
+        thread.start()
+
+    def get_book_chunk_fragment_async(self, sourceName, chunkIndex, callback) -> None:
+        """Asynchronously read a chunk of an external document
+        to be inserted into the document (see theke.externalCache.split_clean_document())
+
+        @param callback: function called in the main thread with the chunk
+            (or None if the chunk cannot be read)
+        """
+        def _do_reading():
+            try:
+                chunksIndex = theke.externalCache.load_chunks_index(sourceName)
+
+                if chunksIndex is None or not 0 < chunkIndex < chunksIndex['nbOfChunks']:
+                    logger.error("No chunk %s in %s", chunkIndex, sourceName)
+                    content = None
+
+                else:
+                    content = '<section class="chunk" id="chunk-{0}" data-chunk="{0}">{1}</section>'.format(
+                        chunkIndex, theke.externalCache.read_chunk(sourceName, chunkIndex))
+
+            except Exception:
+                logger.exception("Fail to read the chunk %s of %s", chunkIndex, sourceName)
+                content = None
+
+            GLib.idle_add(callback, content)
+
+        thread = threading.Thread(target=_do_reading, daemon=True)
+        thread.start()
+
+    def prefetch_neighbor_chapters_async(self, ref, sourceNames) -> None:
+        """Render in the background the chapters before and after a biblical reference,
+        so that they are in the chapters cache when they are requested
+
+        A new request supersedes the previous one.
+        """
+        self._prefetchGeneration += 1
+        generation = self._prefetchGeneration
+
+        # In the continuous reading mode, neighbor chapters are requested as fragments
+        templateName = 'bible_chapter' if self.continuousReading else 'bible'
+
+        sources = [self._index.get_source_data(sourceName) for sourceName in sourceNames]
+        chaptersToPrefetch = []
+
+        # References and cache keys are built in the main thread, as they use the index
+        for chapter in (ref.chapter + 1, ref.chapter - 1):
+            if chapter < 1 or chapter > ref.nbOfChapters:
+                continue
+
+            neighborRef = theke.reference.BiblicalReference("{} {}".format(ref.bookName, chapter))
+            cacheKey = self._get_chapter_cache_key(neighborRef, sources, templateName)
+
+            if cacheKey not in self._chaptersCache:
+                chaptersToPrefetch.append((neighborRef, cacheKey))
+
+        if not chaptersToPrefetch:
+            return
+
+        def _do_prefetching():
+            for neighborRef, cacheKey in chaptersToPrefetch:
+                if generation != self._prefetchGeneration:
+                    # Superseded by a newer request
+                    return
+
+                if cacheKey in self._chaptersCache:
+                    continue
+
+                logger.debug("Prefetch %s %s", neighborRef.bookName, neighborRef.chapter)
+                try:
+                    # Sword libraries of the main thread are not locked by this low priority thread
+                    self._chaptersCache.put(cacheKey, self._render_bible_chapter(neighborRef, sources, templateName,
+                        theke.sword.POOL_PREFETCH))
+                except Exception:
+                    logger.exception("Fail to prefetch %s %s", neighborRef.bookName, neighborRef.chapter)
+
+        def _submit_prefetching():
+            if generation == self._prefetchGeneration:
+                self._prefetchExecutor.submit(_do_prefetching)
+
+            return GLib.SOURCE_REMOVE
+
+        GLib.timeout_add(PREFETCH_DELAY, _submit_prefetching)
+
+    def search_async(self, viewId, moduleName, keyword, batchCallback, finishCallback) -> None:
+        """Search a keyword in a biblical module (see ThekeSearchScheduler.search())
+        """
+        self._searchScheduler.search(viewId, moduleName, keyword, batchCallback, finishCallback)
+
+    def cancel_search(self, viewId) -> None:
+        self._searchScheduler.cancel(viewId)
+
+    def get_search_index(self):
+        """Return the search index (it can be read from any thread)
+        """
+        return self._searchIndex
+
+    def get_strongs_occurrences(self, sourceName, rawStrong):
+        """Return the number of occurrences of a Strong's number in a source
+        and the number of books containing it (None if the source has no concordance)
+
+        @return: (nbOfOccurrences, nbOfBooks)
+        """
+        if not rawStrong:
+            return None
+
+        searchIndex = self.get_search_index()
+
+        if not searchIndex.has_concordance(sourceName):
+            return None
+
+        return searchIndex.get_occurrences(sourceName, rawStrong)
+
+    def get_chapters_cache_stats(self) -> dict:
+        """Return hit/miss counters of the rendered chapters cache
+        """
+        return self._chaptersCache.get_stats()
+
+    def _get_chapter_cache_key(self, ref, sources, templateName):
+        """Return the key identifying a rendered chapter in the cache
+
+        A chapter is identified by its book, its number, the ordered list of sources
+        used to render it, their versions and their markups, and the template used to render it.
+        """
+        sourceNames = tuple(source.name for source in sources)
+
+        return (templateName, ref.bookName, ref.chapter, sourceNames,
+            tuple(self._index.get_source_version(sourceName) for sourceName in sourceNames),
+            tuple(theke.sword.MARKUP.get(sourceName, theke.sword.FMT_PLAIN) for sourceName in sourceNames))
+
+    def _render_bible_chapter(self, ref, sources, templateName, pool = None) -> str:
+        """Render a biblical chapter from sword modules
+
+        @param templateName: 'bible' (a whole document) or 'bible_chapter' (a fragment)
+        @param pool: pool of the sword libraries to read from (see theke.sword.get_library())
+        """
+        return theke.templates.render(templateName, self._get_bible_chapter_data(ref, sources, pool))
+
+    def _get_bible_chapter_data(self, ref, sources, pool = None) -> dict:
+        """Return data needed to render a biblical chapter (read from sword modules)
+        """
+        documents = []
+        verses = []
+        #isMorphAvailable = False
+
+        for source in sources:
+            markup = theke.sword.MARKUP.get(source.name, theke.sword.FMT_PLAIN)
+            mod = theke.sword.get_library(markup, pool = pool).get_bible_module(source.name)
+            documents.append({
+                'lang' : mod.get_lang(),
+                'source': source.name
+            })
+            verses.append(mod.get_chapter(ref.bookName, ref.chapter))
+
+            #isMorphAvailable |= "OSISMorph" in mod.get_global_option_filter()
+
+        return {
+            'documents': documents,
+            'verses': verses,
+            'ref': ref,
+            'continuous': self.continuousReading
+        }
+
+    ### Sword general books
+    def get_book_page(self, sourceName, section):
+        """Return the node of a sword general book displayed as a page to read a section
+
+        A page is the parent of the paragraphs (nodes without children) it contains,
+        like a chapter is the parent of its verses.
+
+        @return: theke.index.BookNodeData (or None if the book is not indexed)
+        """
+        node = self._index.get_book_node(sourceName, section) if section else None
+
+        if node is None:
+            node = self._index.get_book_first_leaf(sourceName)
+
+            if node is None:
+                return None
+
+        if node.lastPosition == node.position and node.depth > 1:
+            return self._index.get_book_node_by_offset(sourceName, node.parentOffset)
+
+        return node
+
+    def _get_book_page_data(self, ref, source, page) -> dict:
+        """Return data needed to render a page of a sword general book (read from the sword module)
+        """
+        nodes = list(self._index.list_book_nodes(source.name, page.position, page.lastPosition))
+
+        markup = theke.sword.MARKUP.get(source.name, theke.sword.FMT_HTML)
+        mod = theke.sword.get_library(markup).get_book_module(source.name)
+        texts = mod.get_texts([node.offset for node in nodes])
+
+        def get_uri(offset):
+            node = self._index.get_book_node_by_offset(source.name, offset) if offset is not None else None
+
+            if node is None:
+                return None
+
+            return theke.uri.build('theke', ['', theke.uri.SEGM_DOC, theke.uri.SEGM_BOOK, ref.documentName],
+                fragment = node.path, sources = [source.name]).get_encoded_URI()
+
+        return {
+            'ref': ref,
+            'mod_description': source.description,
+            'nodes': list(zip(nodes, texts)),
+            'previous': get_uri(page.previousOffset),
+            'next': get_uri(page.nextOffset),
+        }
+
+    def get_document_toc(self, ref, sourceNames = None, updateSections = True):
         """Return the table of contents of a reference
+
+        @param sourceNames: list of source names the document is read from
+        @param updateSections: (bool) extract again obsolete sections of an external document
         """
         if ref.type == theke.TYPE_BIBLE:
             return theke.tableofcontent.get_toc_BIBLE(ref)
 
+        if ref.type == theke.TYPE_BOOK and sourceNames:
+            source = self._index.get_source_data(sourceNames[0])
+
+            if source.type == theke.index.SOURCETYPE_EXTERN:
+                # Sections are extracted when the document is cleaned.
+                # If they are obsolete (eg. the index was rebuilt), they are extracted again
+                # in the background (see the 'document-sections-updated' signal).
+                if updateSections and not theke.externalCache.are_document_sections_up_to_date(source.name, self._index):
+                    self.update_document_sections_async(source.name)
+
+                sections = list(self._index.list_document_sections(source.name))
+
+                if sections:
+                    return theke.tableofcontent.get_toc_BOOK(ref, source.name, sections)
+
         return None
+
+    def update_document_sections_async(self, sourceName) -> None:
+        """Extract again the sections of an external document in a worker thread
+
+        The end is reported by the 'document-sections-updated' signal.
+        """
+        if sourceName in self._sectionsUpdating:
+            return
+
+        logger.debug("Asynchronously update sections of: %s", sourceName)
+        self._sectionsUpdating.add(sourceName)
+
+        def _do_update():
+            try:
+                theke.externalCache.update_document_sections(sourceName, self._index)
+
+            except Exception:
+                logger.exception("Fail to update sections of %s", sourceName)
+
+            GLib.idle_add(self._document_sections_updated_cb, sourceName)
+
+        thread = threading.Thread(target=_do_update, daemon=True)
+        thread.start()
+
+    def _document_sections_updated_cb(self, sourceName) -> bool:
+        self._sectionsUpdating.discard(sourceName)
+        self.emit('document-sections-updated', sourceName)
+
+        return GLib.SOURCE_REMOVE
+
+    def get_document_section_heading(self, sourceName, anchor) -> str:
+        """Return the anchor of the heading containing a section of an external document (or None)
+        """
+        return self._index.get_document_section_heading(sourceName, anchor)
     
     ### External documents
     def clean_external_document_async(self, source, feedback, callback) -> None:
@@ -120,7 +703,7 @@ class ThekeArchivist(GObject.GObject):
         feedback(True, "Actualisation de la mise en page")
 
         def _do_cleaning():
-            theke.externalCache._build_clean_document(source.name)
+            theke.externalCache.clean_cached_document(source.name, force = True)
             GLib.idle_add(callback)
 
         thread = threading.Thread(target=_do_cleaning, daemon=True)
@@ -142,8 +725,9 @@ class ThekeArchivist(GObject.GObject):
         def _do_downloading_and_cleaning():
             if theke.externalCache.cache_document_from_external_source(source.name, contentUri):
                 # Success to cache the document from the external source
+                # The document is cleaned again only if it (or its cleaning rules) changed
                 GLib.idle_add(feedback, True, "Actualisation de la mise en page")
-                theke.externalCache._build_clean_document(source.name)
+                theke.externalCache.clean_cached_document(source.name)
                 GLib.idle_add(callback, True)
 
             else:
@@ -184,8 +768,98 @@ class ContentHandler():
         self._content = content
         self._sources = sources
 
+        self._bytes = None
+
     def get_input_stream(self):
-        return Gio.MemoryInputStream.new_from_data(self._content.encode('utf-8'))
+        # The content is encoded once, streams share the same buffer
+        if self._bytes is None:
+            self._bytes = GLib.Bytes.new(self._content.encode('utf-8'))
+
+        return Gio.MemoryInputStream.new_from_bytes(self._bytes)
+
+    def get_sources(self):
+        return self._sources
+
+class TemplateHandler():
+    def __init__(self, templateName, templateData, sources = None, onComplete = None) -> None:
+        """A handler streaming a template while it is rendered
+
+        Chunks generated by the template are written into a pipe by a worker thread,
+        so that the webview can parse the beginning of the document before its end is rendered.
+
+        @param sources: list of source datas
+        @param onComplete: function called (from the worker thread) with the whole rendered content
+        """
+        self._templateName = templateName
+        self._templateData = templateData
+        self._sources = sources
+        self._onComplete = onComplete
+
+        # The template is rendered in a worker thread
+        self._navigationId = theke.tracing.get_navigation_id()
+
+    def get_input_stream(self):
+        readFd, writeFd = os.pipe()
+
+        thread = threading.Thread(target=self._write_chunks, args=(writeFd,), daemon=True)
+        thread.start()
+
+        return UnixInputStream.new(readFd, True)
+
+    def get_sources(self):
+        return self._sources
+
+    def _write_chunks(self, writeFd) -> None:
+        chunks = [] if self._onComplete else None
+        buffer = bytearray()
+        isComplete = False
+
+        try:
+            with theke.tracing.span("templates.render", self._navigationId, template = self._templateName):
+                for chunk in theke.templates.generate(self._templateName, self._templateData):
+                    if chunks is not None:
+                        chunks.append(chunk)
+
+                    buffer += chunk.encode('utf-8')
+
+                    if len(buffer) >= STREAM_CHUNK_SIZE:
+                        _write_all(writeFd, buffer)
+                        buffer.clear()
+
+                if buffer:
+                    _write_all(writeFd, buffer)
+
+            isComplete = True
+
+        except BrokenPipeError:
+            # The reader has closed the stream (eg. the user went to another document)
+            logger.debug("TemplateHandler - Stream of %s closed by the reader", self._templateName)
+
+        except Exception:
+            logger.exception("TemplateHandler - Fail to render %s", self._templateName)
+
+        finally:
+            os.close(writeFd)
+
+        if isComplete and self._onComplete:
+            self._onComplete(''.join(chunks))
+
+class LazyHandler():
+    def __init__(self, get_handler, sources = None) -> None:
+        """A handler rendering its document only when its input stream is requested
+
+        @param get_handler: function returning the actual handler
+        @param sources: list of source datas
+        """
+        self._get_handler = get_handler
+        self._handler = None
+        self._sources = sources
+
+    def get_input_stream(self):
+        if self._handler is None:
+            self._handler = self._get_handler()
+
+        return self._handler.get_input_stream()
 
     def get_sources(self):
         return self._sources
@@ -203,3 +877,19 @@ class FileHandler():
     
     def get_sources(self):
         return self._sources
+
+def _write_all(fd, data) -> None:
+    """Write all data into a file descriptor
+    """
+    view = memoryview(data)
+
+    while view:
+        view = view[os.write(fd, view):]
+
+def _lower_thread_priority() -> None:
+    """Lower the priority of the current thread (on Linux, the niceness is per thread)
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), PREFETCH_NICENESS)
+    except (AttributeError, OSError):
+        pass
@@ -0,0 +1,113 @@
+from contextlib import contextmanager
+
+import sqlite3
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Pools of connections, by path of the database (see get_pool())
+_pools = {}
+_poolsLock = threading.Lock()
+
+def get_pool(path, pragmas = ()):
+    """Return the pool of connections to a database, shared by the whole process
+
+    @param pragmas: pragmas set on each new connection (only used when the pool is created)
+    """
+    with _poolsLock:
+        pool = _pools.get(path)
+
+        if pool is None:
+            pool = ConnectionPool(path, pragmas)
+            _pools[path] = pool
+
+        return pool
+
+class ConnectionPool():
+    """Connections to a SQLite database, shared by threads
+
+    Each thread reads through its own connection, opened on first use and read only.
+    Writes go through a single connection, serialized by a lock (see writer()).
+    """
+
+    def __init__(self, path, pragmas = ()) -> None:
+        """
+        @param pragmas: pragmas set on each new connection
+        """
+        self.path = path
+        self._pragmas = pragmas
+
+        self._readers = threading.local()
+
+        self._writer = None
+        self._writerLock = threading.RLock()
+
+    def _connect(self, checkSameThread = True):
+        con = sqlite3.connect(self.path, check_same_thread = checkSameThread)
+
+        for pragma in self._pragmas:
+            con.execute(pragma)
+
+        return con
+
+    def get_reader(self):
+        """Return the read only connection of the current thread
+        """
+        con = getattr(self._readers, 'con', None)
+
+        if con is None:
+            logger.debug("ConnectionPool - Open a reader on %s (%s)", self.path, threading.current_thread().name)
+            con = self._connect()
+            con.execute("PRAGMA query_only = ON;")
+            self._readers.con = con
+
+        return con
+
+    def get_writer(self):
+        """Return the connection used to write, shared by all threads
+
+        Transactions should be done holding the writer lock (see writer() and get_writer_lock()).
+        """
+        with self._writerLock:
+            if self._writer is None:
+                logger.debug("ConnectionPool - Open the writer on %s", self.path)
+                self._writer = self._connect(checkSameThread = False)
+
+            return self._writer
+
+    def get_writer_lock(self):
+        """Return the (reentrant) lock serializing writes,
+        to hold it during a sequence of transactions
+        """
+        return self._writerLock
+
+    @contextmanager
+    def writer(self, timeout = -1):
+        """Do a transaction on the writer connection
+
+            with pool.writer() as con:
+                con.execute(...)
+
+        The transaction is committed at the end of the block, or rolled back on error.
+
+        @param timeout: (float) maximal time (in seconds) to wait for the writer lock (default: no limit),
+            TimeoutError is raised when it expires
+        """
+        if not self._writerLock.acquire(timeout = timeout):
+            raise TimeoutError("The writer of {} is busy".format(self.path))
+
+        try:
+            con = self.get_writer()
+
+            try:
+                yield con
+
+            except BaseException:
+                con.rollback()
+                raise
+
+            con.commit()
+
+        finally:
+            self._writerLock.release()
@@ -74,6 +74,12 @@ class ThekeDocument(GObject.GObject):
         """Get the table of contents of the document
         """
         return self._toc
+
+    @toc.setter
+    def toc(self, toc):
+        """Set the table of contents of the document
+        """
+        self._toc = toc
     
     @GObject.Property(type=int)
     def type(self):
@@ -1,14 +1,28 @@
 import logging
 
+import atexit
+import codecs
+import gzip
+import hashlib
+import json
+import multiprocessing
 import os
 import re
+import shutil
+import sqlite3
+import threading
+import time
 import yaml
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import soupsieve
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from bs4 import BeautifulSoup, SoupStrainer
-from bs4.element import NavigableString
+from bs4.element import NavigableString, Tag
 
 import theke
+import theke.index
 
 logger = logging.getLogger(__name__)
 
@@ -18,24 +32,162 @@ PATH_SUFFIX_MANUALLY_CLEANED = ''
 
 CLEANING_RULES_API_VERSION = 2
 
+# Documents of the cache are compressed
+# (uncompressed documents from former caches can still be read)
+CACHE_COMPRESSED_EXTENSION = '.gz'
+CACHE_COMPRESS_LEVEL = 6
+
+# Size budget of the cache, in bytes (it can be changed with configure_cache())
+# Once it is exceeded, least recently used raw documents are evicted first.
+CACHE_MAX_SIZE = 200 * 1024 * 1024
+CACHE_MANIFEST_FILENAME = 'manifest.json'
+
+# Clean documents are also split into chunks, so that a section can be opened
+# without loading the whole document. A chunk begins with a heading or a numbered paragraph,
+# once the previous one has at least this size (in characters).
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_HEADINGS = ('h2', 'h3', 'h4')
+
+# Maximal time (in seconds) to wait for the index to save sections of a clean document
+# (it is not writable while it is rebuilt in the background)
+SECTIONS_WRITE_TIMEOUT = 0.5
+
+_manifestLock = threading.Lock()
+
+# Last accesses of sources not written yet into the manifest (see touch_source())
+_pendingAccesses = {}
+
+# HTTP settings used to download external sources
+# (they can be changed with configure_http_session())
+HTTP_CONNECT_TIMEOUT = 3.05
+HTTP_READ_TIMEOUT = 10
+HTTP_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_POOL_SIZE = 4
+
+_httpSession = None
+_httpSessionLock = threading.Lock()
+
+def configure_http_session(connectTimeout = None, readTimeout = None, retries = None) -> None:
+    """Change the HTTP settings used to download external sources
+
+    The shared session is created again with these settings.
+    """
+    global HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_RETRIES, _httpSession
+
+    with _httpSessionLock:
+        if connectTimeout is not None:
+            HTTP_CONNECT_TIMEOUT = connectTimeout
+
+        if readTimeout is not None:
+            HTTP_READ_TIMEOUT = readTimeout
+
+        if retries is not None:
+            HTTP_RETRIES = retries
+
+        if _httpSession is not None:
+            _httpSession.close()
+            _httpSession = None
+
+def get_http_session() -> requests.Session:
+    """Return the shared HTTP session
+
+    Connections are pooled and kept alive between downloads.
+    Failed requests (connection errors, 429 and 5xx responses) are retried with an exponential backoff.
+    """
+    global _httpSession
+
+    with _httpSessionLock:
+        if _httpSession is None:
+            logger.debug("Create the HTTP session")
+
+            retry = Retry(
+                total = HTTP_RETRIES,
+                backoff_factor = HTTP_BACKOFF_FACTOR,
+                status_forcelist = (429, 500, 502, 503, 504),
+                allowed_methods = frozenset(['GET', 'HEAD']))
+            adapter = HTTPAdapter(pool_connections = HTTP_POOL_SIZE, pool_maxsize = HTTP_POOL_SIZE, max_retries = retry)
+
+            _httpSession = requests.Session()
+            _httpSession.headers.update({'User-Agent': 'Theke'})
+            _httpSession.mount('http://', adapter)
+            _httpSession.mount('https://', adapter)
+
+        return _httpSession
+
 def _get_source_definition_path(sourceName) -> str:
     return os.path.join(theke.PATH_EXTERNAL, "{}.yaml".format(sourceName))
 
 def _get_source_path(sourceName) -> str:
     return os.path.join(theke.PATH_CACHE, sourceName)
 
-def _get_source_file_path(sourceName, suffix = '', relative = False) -> str:
+def _get_source_file_path(sourceName, suffix = '', relative = False, compressed = True) -> str:
     """Return the path to a source file from the cache
 
     @param sourceName: (str) name of the source
     @param suffix: (str)    '' --> clean version of the source
                             '_raw' --> raw version of the source
     @param relative: (bool) return the relative path from theke.PATH_CACHE
+    @param compressed: (bool) path to the compressed version of the file
     """
+    filename = "{}{}.html{}".format(sourceName, suffix, CACHE_COMPRESSED_EXTENSION if compressed else '')
+
     if relative:
-        return os.path.join(sourceName, "{}{}.html".format(sourceName, suffix))
+        return os.path.join(sourceName, filename)
     else:
-        return os.path.join(_get_source_path(sourceName), "{}{}.html".format(sourceName, suffix))
+        return os.path.join(_get_source_path(sourceName), filename)
+
+def _find_source_file_path(sourceName, suffix = '', relative = False):
+    """Return the path to an existing source file from the cache, compressed or not (None if there is none)
+    """
+    for compressed in (True, False):
+        if os.path.isfile(_get_source_file_path(sourceName, suffix, compressed = compressed)):
+            return _get_source_file_path(sourceName, suffix, relative, compressed)
+
+    return None
+
+def _open_cache_file(path, mode = 'r', compressed = None):
+    """Open a file from the cache, compressed or not
+
+    Compressed text files are written in utf-8.
+
+    @param compressed: (bool) if None, compressed files are recognized by their extension
+    """
+    if compressed is None:
+        compressed = path.endswith(CACHE_COMPRESSED_EXTENSION)
+
+    if compressed:
+        if 'b' in mode:
+            return gzip.open(path, mode, compresslevel = CACHE_COMPRESS_LEVEL)
+
+        return gzip.open(path, mode + 't', compresslevel = CACHE_COMPRESS_LEVEL, encoding = 'utf-8')
+
+    return open(path, mode)
+
+def _compress_source_file(sourceName, suffix) -> None:
+    """Compress a file from a former cache
+    """
+    path = _get_source_file_path(sourceName, suffix, compressed = False)
+    path_compressed = _get_source_file_path(sourceName, suffix)
+
+    if not os.path.isfile(path) or os.path.isfile(path_compressed):
+        return
+
+    logger.debug("Compress: %s", path)
+
+    with open(path, 'rb') as uncompressedFile, _open_cache_file(path_compressed + '.part', 'wb', compressed = True) as compressedFile:
+        shutil.copyfileobj(uncompressedFile, compressedFile)
+
+    os.replace(path_compressed + '.part', path_compressed)
+    os.remove(path)
+
+def _remove_uncompressed_source_file(sourceName, suffix) -> None:
+    """Remove a file from a former cache, replaced by its compressed version
+    """
+    path = _get_source_file_path(sourceName, suffix, compressed = False)
+
+    if os.path.isfile(path):
+        os.remove(path)
 
 def get_best_source_file_path(sourceName, relative = False) -> str:
     """Return the path to to best source file from the cache
@@ -45,46 +197,406 @@ def get_best_source_file_path(sourceName, relative = False) -> str:
     - manually cleaned: the cleaning was manually improved
     - automatically cleaned: the source was automatically cleaned
             according to cleaning rules from the definition file
+
+    The file may be compressed: it can be read with _open_cache_file() or the templates loader.
     """
-    if os.path.isfile(_get_source_file_path(sourceName, PATH_SUFFIX_MANUALLY_CLEANED)):
-        return _get_source_file_path(sourceName, PATH_SUFFIX_MANUALLY_CLEANED, relative)
+    for suffix in (PATH_SUFFIX_MANUALLY_CLEANED, PATH_SUFFIX_AUTOMATICALLY_CLEANED):
+        path = _find_source_file_path(sourceName, suffix, relative)
 
-    if os.path.isfile(_get_source_file_path(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED)):
-        return _get_source_file_path(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED, relative)
+        if path is not None:
+            touch_source(sourceName)
+            return path
 
-    else:
-        logger.error("No source file found for %s", sourceName)
+    logger.error("No source file found for %s", sourceName)
+
+def _get_validators_file_path(sourceName) -> str:
+    """Return the path to the HTTP validators (ETag, Last-Modified) of the raw version of a source
+    """
+    return os.path.join(_get_source_path(sourceName), "{}{}.json".format(sourceName, PATH_SUFFIX_RAW))
+
+def _load_validators(sourceName, contentUri) -> dict:
+    """Return the HTTP validators of the cached raw document (empty if they are unknown or obsolete)
+    """
+    if _find_source_file_path(sourceName, PATH_SUFFIX_RAW) is None:
+        return {}
+
+    try:
+        with open(_get_validators_file_path(sourceName), 'r') as validatorsFile:
+            validators = json.load(validatorsFile)
+
+    except (OSError, ValueError):
+        return {}
+
+    # Validators of another uri are meaningless
+    return validators if validators.get('uri') == contentUri else {}
+
+def _save_validators(sourceName, contentUri, response) -> None:
+    validators = {
+        'uri': contentUri,
+        'etag': response.headers.get('ETag'),
+        'lastModified': response.headers.get('Last-Modified'),
+    }
+
+    with open(_get_validators_file_path(sourceName), 'w') as validatorsFile:
+        json.dump(validators, validatorsFile)
+
+### Manifest of the cache
+#   For each cached source: size of its files (in bytes), last access (timestamp) and origin (uri)
+#   Statistics about the cache are read from it, without reading cached documents.
+
+def configure_cache(maxSize = None) -> None:
+    """Change the size budget of the cache
+
+    @param maxSize: (int) in bytes
+    """
+    global CACHE_MAX_SIZE
+
+    if maxSize is not None:
+        CACHE_MAX_SIZE = maxSize
+
+def _get_manifest_path() -> str:
+    return os.path.join(theke.PATH_CACHE, CACHE_MANIFEST_FILENAME)
+
+def _load_manifest() -> dict:
+    try:
+        with open(_get_manifest_path(), 'r') as manifestFile:
+            return json.load(manifestFile)
+
+    except (OSError, ValueError):
+        return {}
+
+def _save_manifest(manifest) -> None:
+    path_manifest = _get_manifest_path()
+
+    with open(path_manifest + '.part', 'w') as manifestFile:
+        json.dump(manifest, manifestFile)
+
+    os.replace(path_manifest + '.part', path_manifest)
+
+def _get_source_size(sourceName) -> int:
+    """Return the size of the files of a source (from their metadata)
+    """
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(_get_source_path(sourceName)) if entry.is_file())
+
+    except OSError:
+        return 0
+
+def _sync_manifest(manifest) -> None:
+    """Add sources missing from the manifest (eg. from a former cache) and forget removed ones
+    """
+    if not os.path.isdir(theke.PATH_CACHE):
+        manifest.clear()
+        return
+
+    sourceNames = {sourceName for sourceName in os.listdir(theke.PATH_CACHE)
+        if os.path.isdir(_get_source_path(sourceName))}
+
+    for sourceName in set(manifest) - sourceNames:
+        del manifest[sourceName]
+
+    for sourceName in sourceNames - set(manifest):
+        manifest[sourceName] = {
+            'size': _get_source_size(sourceName),
+            'lastAccess': os.path.getmtime(_get_source_path(sourceName)),
+            'origin': None,
+        }
+
+def update_manifest(sourceName, origin = None, touch = True) -> None:
+    """Update the manifest entry of a source after a change of its files,
+    then evict sources from the cache if it exceeds its size budget
+
+    @param origin: (str) uri of the source (if None, the previous one is kept)
+    @param touch: (bool) update the last access
+    """
+    with _manifestLock:
+        manifest = _load_manifest()
+        _apply_pending_accesses(manifest)
+        entry = manifest.setdefault(sourceName, {'lastAccess': time.time(), 'origin': None})
+
+        entry['size'] = _get_source_size(sourceName)
+
+        if origin is not None:
+            entry['origin'] = origin
+
+        if touch:
+            entry['lastAccess'] = time.time()
+
+        _evict_sources(manifest, keep = sourceName)
+        _save_manifest(manifest)
+
+def touch_source(sourceName) -> None:
+    """Update the last access of a source
+
+    It is only kept in memory, and written into the manifest
+    the next time it is saved (see update_manifest()) or at exit (see flush_manifest()).
+    """
+    with _manifestLock:
+        _pendingAccesses[sourceName] = time.time()
+
+def _apply_pending_accesses(manifest) -> None:
+    """Report last accesses kept in memory into the manifest
+    (to be called holding the manifest lock)
+    """
+    for sourceName, lastAccess in _pendingAccesses.items():
+        if sourceName not in manifest:
+            manifest[sourceName] = {'size': _get_source_size(sourceName), 'origin': None}
+
+        manifest[sourceName]['lastAccess'] = lastAccess
+
+    _pendingAccesses.clear()
+
+def flush_manifest() -> None:
+    """Write last accesses kept in memory into the manifest
+    """
+    with _manifestLock:
+        if not _pendingAccesses:
+            return
+
+        manifest = _load_manifest()
+        _apply_pending_accesses(manifest)
+
+        try:
+            _save_manifest(manifest)
+
+        except OSError as error:
+            logger.warning("Cannot save the manifest of the cache: %s", error)
+
+atexit.register(flush_manifest)
+
+def get_cache_stats() -> dict:
+    """Return statistics about the cache (read from its manifest)
+    """
+    with _manifestLock:
+        manifest = _load_manifest()
+
+        if _pendingAccesses:
+            _apply_pending_accesses(manifest)
+            _save_manifest(manifest)
+
+        _sync_manifest(manifest)
+
+    return {
+        'size': sum(entry['size'] for entry in manifest.values()),
+        'maxSize': CACHE_MAX_SIZE,
+        'nbOfSources': len(manifest),
+        'sources': manifest,
+    }
+
+def _evict_sources(manifest, keep = None) -> None:
+    """Remove least recently used files from the cache until it fits in its size budget
+
+    Raw documents are evicted first (if a clean version exists),
+    then automatically cleaned documents. Manually cleaned documents are never removed.
+
+    @param keep: (str) name of a source not to evict
+    """
+    _sync_manifest(manifest)
+
+    cacheSize = sum(entry['size'] for entry in manifest.values())
+    if CACHE_MAX_SIZE is None or cacheSize <= CACHE_MAX_SIZE:
+        return
+
+    sourceNames = sorted((sourceName for sourceName in manifest if sourceName != keep),
+        key = lambda sourceName: manifest[sourceName]['lastAccess'])
+
+    def remove_files(sourceName, paths) -> None:
+        nonlocal cacheSize
+
+        for path in paths:
+            if os.path.isfile(path):
+                logger.debug("Evict from the cache: %s", path)
+                os.remove(path)
+
+        size = _get_source_size(sourceName)
+        cacheSize -= manifest[sourceName]['size'] - size
+        manifest[sourceName]['size'] = size
+
+    # Raw documents
+    for sourceName in sourceNames:
+        if cacheSize <= CACHE_MAX_SIZE:
+            return
+
+        if _find_source_file_path(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED) is None \
+                and _find_source_file_path(sourceName, PATH_SUFFIX_MANUALLY_CLEANED) is None:
+            continue
+
+        remove_files(sourceName, [
+            _get_source_file_path(sourceName, PATH_SUFFIX_RAW, compressed = True),
+            _get_source_file_path(sourceName, PATH_SUFFIX_RAW, compressed = False),
+            _get_validators_file_path(sourceName)])
+
+    # Whole sources
+    for sourceName in sourceNames:
+        if cacheSize <= CACHE_MAX_SIZE:
+            return
+
+        if _find_source_file_path(sourceName, PATH_SUFFIX_MANUALLY_CLEANED) is not None:
+            continue
+
+        remove_files(sourceName, [os.path.join(_get_source_path(sourceName), filename)
+            for filename in os.listdir(_get_source_path(sourceName))])
+
+        try:
+            os.rmdir(_get_source_path(sourceName))
+            del manifest[sourceName]
+
+        except OSError:
+            pass
 
 def is_source_cached(sourceName) -> bool:
     """Return true if a source is cached
 
+    The raw version of a source may have been evicted from the cache:
+    a clean version is enough.
+
     Notice. By default, the cache is in ~/.local/share/theke/cache/.
     """
 
-    if os.path.isfile(_get_source_file_path(sourceName, PATH_SUFFIX_RAW)):
+    if _find_source_file_path(sourceName, PATH_SUFFIX_RAW) is not None:
         logger.debug("Raw source found in the cache: %s", sourceName)
         return True
 
+    if is_cache_cleaned(sourceName):
+        return True
+
     logger.debug("Source not cached: %s", sourceName)
     return False
 
+def _get_cleaning_hash_file_path(sourceName) -> str:
+    """Return the path to the hash of the automatically cleaned version of a source
+    """
+    return os.path.join(_get_source_path(sourceName), "{}{}.json".format(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED))
+
+def _load_cleaning_rules(sourceName):
+    """Return the cleaning rules from the source definition (None if there is none)
+    """
+    with open(_get_source_definition_path(sourceName), 'r') as sourceDefinitionFile:
+        externalData = yaml.safe_load(sourceDefinitionFile)
+
+    return externalData.get('cleaning_rules', None)
+
+def get_cleaning_hash(sourceName, cleaning_rules, path_rawDocument = None) -> str:
+    """Return the hash of what a clean document is built from:
+    the raw document, the cleaning rules and the api version of the cleaning rules
+    """
+    if path_rawDocument is None:
+        path_rawDocument = _find_source_file_path(sourceName, PATH_SUFFIX_RAW)
+
+    cleaningHash = hashlib.sha256()
+
+    # Hash of the uncompressed raw document
+    with _open_cache_file(path_rawDocument, 'rb') as rawFile:
+        for chunk in iter(lambda: rawFile.read(64 * 1024), b''):
+            cleaningHash.update(chunk)
+
+    cleaningHash.update(json.dumps(cleaning_rules, sort_keys = True, default = str).encode('utf-8'))
+    cleaningHash.update(str(CLEANING_RULES_API_VERSION).encode('utf-8'))
+
+    return cleaningHash.hexdigest()
+
+def get_cleaning_stamp(sourceName, path_rawDocument = None):
+    """Return a cheap stamp of what a clean document is built from:
+    the name, mtime and size of the raw document and of the source definition (None if one is missing)
+
+    If the stamp did not change, the cleaning hash did not change either.
+    """
+    if path_rawDocument is None:
+        path_rawDocument = _find_source_file_path(sourceName, PATH_SUFFIX_RAW)
+
+    try:
+        stamp = [os.path.basename(path_rawDocument)]
+
+        for path in (path_rawDocument, _get_source_definition_path(sourceName)):
+            stat = os.stat(path)
+            stamp.extend([stat.st_mtime_ns, stat.st_size])
+
+        return stamp
+
+    except (OSError, TypeError):
+        return None
+
+def _load_cleaning_hash_data(sourceName) -> dict:
+    try:
+        with open(_get_cleaning_hash_file_path(sourceName), 'r') as hashFile:
+            return json.load(hashFile)
+
+    except (OSError, ValueError):
+        return {}
+
+def _load_cleaning_hash(sourceName):
+    """Return the hash of the automatically cleaned version of a source (None if it is unknown)
+    """
+    return _load_cleaning_hash_data(sourceName).get('hash', None)
+
+def _save_cleaning_hash(sourceName, cleaningHash, cleaningStamp = None) -> None:
+    """
+    @param cleaningStamp: stamp of the files the hash was computed from (see get_cleaning_stamp())
+    """
+    with open(_get_cleaning_hash_file_path(sourceName), 'w') as hashFile:
+        json.dump({'hash': cleaningHash, 'stamp': cleaningStamp}, hashFile)
+
+def is_auto_cleaning_up_to_date(sourceName) -> bool:
+    """Return true if the automatically cleaned version of a source
+    was built from the current raw document and cleaning rules
+
+    If the raw document was evicted from the cache, the clean version is kept as is.
+    """
+    if _find_source_file_path(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED) is None:
+        return False
+
+    if _find_source_file_path(sourceName, PATH_SUFFIX_RAW) is None:
+        return True
+
+    hashData = _load_cleaning_hash_data(sourceName)
+
+    if hashData.get('hash') is None:
+        return False
+
+    # The raw document is only hashed again if it (or the source definition) was touched
+    cleaningStamp = get_cleaning_stamp(sourceName)
+
+    if cleaningStamp is not None and hashData.get('stamp') == cleaningStamp:
+        return True
+
+    if hashData['hash'] != get_cleaning_hash(sourceName, _load_cleaning_rules(sourceName)):
+        return False
+
+    _save_cleaning_hash(sourceName, hashData['hash'], cleaningStamp)
+    return True
+
 def is_cache_cleaned(sourceName) -> bool:
-    """Return true if a clean version of the cache exist
+    """Return true if an up to date clean version of the cache exist
     """
 
-    if os.path.isfile(_get_source_file_path(sourceName, PATH_SUFFIX_MANUALLY_CLEANED)):
+    if _find_source_file_path(sourceName, PATH_SUFFIX_MANUALLY_CLEANED) is not None:
         logger.debug("Manually cleaned source found in the cache: %s", sourceName)
         return True
 
-    if os.path.isfile(_get_source_file_path(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED)):
+    if is_auto_cleaning_up_to_date(sourceName):
         logger.debug("Automatically cleaned source found in the cache: %s", sourceName)
         return True
 
-    logger.debug("Source not cleaned: %s", sourceName)
+    logger.debug("Source not cleaned (or cleaned from another raw document or other rules): %s", sourceName)
     return False
 
+def _get_response_encoding(r) -> str:
+    """Return the encoding of a response, from its headers (utf-8 if it is not declared or unknown)
+    """
+    if 'charset' not in r.headers.get('content-type', '').lower():
+        return 'utf-8'
+
+    try:
+        return codecs.lookup(r.encoding).name
+
+    except (LookupError, TypeError):
+        return 'utf-8'
+
 def cache_document_from_external_source(sourceName, contentUri) -> bool:
     """Download and cache the document designated by an external source
+
+    If the document is already cached, it is only downloaded again if it has changed
+    (using the ETag and Last-Modified validators given by the server).
     """
     logger.debug("Cache a document from an external source: %s [%s]", sourceName, contentUri)
 
@@ -94,17 +606,49 @@ def cache_document_from_external_source(sourceName, contentUri) -> bool:
     if not os.path.isdir(path_source):
         os.mkdir(path_source)
 
+    # Conditional request
+    validators = _load_validators(sourceName, contentUri)
+    headers = {}
+
+    if validators.get('etag'):
+        headers['If-None-Match'] = validators['etag']
+
+    if validators.get('lastModified'):
+        headers['If-Modified-Since'] = validators['lastModified']
+
     # Get the raw document from the external source
     # and save it to a file
     # cf. https://docs.python-requests.org/en/latest/user/quickstart/#raw-response-content
 
     try:
-        r = requests.get(contentUri, stream=True, timeout=1)
-        encoding = r.apparent_encoding
+        r = get_http_session().get(contentUri, headers = headers, stream = True,
+            timeout = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+
+        if r.status_code == 304:
+            logger.debug("External source not modified: %s", sourceName)
+            r.close()
+            touch_source(sourceName)
+            return True
+
+        r.raise_for_status()
+
+        # The document is decoded as it is downloaded, according to the charset declared by the server
+        # (requests defaults to ISO-8859-1 for text documents without charset)
+        decoder = codecs.getincrementaldecoder(_get_response_encoding(r))('ignore')
+
+        # The raw document is replaced only once it is completely downloaded
+        path_tmpDocument = path_rawDocument + '.part'
+        with _open_cache_file(path_tmpDocument, 'w', compressed = True) as fd:
+            for chunk in r.iter_content(chunk_size=64 * 1024):
+                fd.write(decoder.decode(chunk))
 
-        with open(path_rawDocument, 'w', encoding="utf-8") as fd:
-            for chunk in r.iter_content(chunk_size=512):
-                fd.write(chunk.decode(encoding, 'ignore'))
+            fd.write(decoder.decode(b'', final = True))
+
+        os.replace(path_tmpDocument, path_rawDocument)
+        _remove_uncompressed_source_file(sourceName, PATH_SUFFIX_RAW)
+        _save_validators(sourceName, contentUri, r)
+
+        update_manifest(sourceName, contentUri)
 
         return True
     
@@ -116,6 +660,10 @@ def cache_document_from_external_source(sourceName, contentUri) -> bool:
         logger.debug("External source inaccessible, check your internet connection")
         return False
 
+    except requests.RequestException as error:
+        logger.debug("Fail to download the external source: %s", error)
+        return False
+
 ### Layout formatter callbacks
 
 def layout_header_cb(tag, cleanSoup, params):
@@ -217,144 +765,759 @@ layout_rules_callbacks = {
     'header': layout_header_cb,
 }
 
-def _build_clean_document(sourceName, path_rawDocument = None):
-    """Build a clean document from a raw one
+def _has_interesting_string_types(tag, stringTypes) -> bool:
+    """Return true if one of these string types is taken into account by tag.get_text()
     """
-    if path_rawDocument is None:
-        path_rawDocument = _get_source_file_path(sourceName, PATH_SUFFIX_RAW)
-    
-    logger.debug("Clean: %s", path_rawDocument)
+    types = tag.interesting_string_types or tag.MAIN_CONTENT_STRING_TYPES
 
-    # Parse the document from the raw source
-    with open(path_rawDocument, 'r') as rawFile:
-        rawSoup = BeautifulSoup(rawFile, 'html.parser', parse_only = SoupStrainer("body"))
+    if isinstance(types, type):
+        return types in stringTypes
 
-    # Init the clean document
-    html = """<main>
-<nav>
-    <details>
-    <summary>Table des matières</summary>
-    <ul>
-    </ul>
-    </details>
-</nav>
-<header>
-</header>
-</main>"""
-    cleanSoup = BeautifulSoup(html, 'html.parser')
+    return any(stringType in types for stringType in stringTypes)
 
-    def remove_empty_tags(tag):
-        """Recursively remove empty tags"""
-        if isinstance(tag, NavigableString):
-            return
+def _compute_empty_tags(root) -> set:
+    """Return the ids of the tags of a tree without any text (as tag.get_text(strip=True) == '')
 
-        if tag.get_text(strip=True) == '':
-            tag.decompose()
-            return
+    The tree is walked once, bottom-up: each tag collects the types of the non blank strings it contains.
+    """
+    if root is None or isinstance(root, NavigableString):
+        return set()
 
-        for childTag in tag.children:
-            remove_empty_tags(childTag)
+    # Types of the non blank strings contained in each tag, by tag id
+    stringTypes = {}
+    emptyTags = set()
+
+    # Reversed document order: every node is visited after its descendants
+    nodes = list(root.descendants)
+    nodes.reverse()
+    nodes.append(root)
+
+    for node in nodes:
+        if isinstance(node, NavigableString):
+            if node.strip():
+                stringTypes.setdefault(id(node.parent), set()).add(type(node))
+            continue
+
+        nodeStringTypes = stringTypes.pop(id(node), None)
+
+        if nodeStringTypes is None or not _has_interesting_string_types(node, nodeStringTypes):
+            emptyTags.add(id(node))
 
-    def build_clean_tags(tag) -> None:
+        if nodeStringTypes is not None and node is not root:
+            stringTypes.setdefault(id(node.parent), set()).update(nodeStringTypes)
+
+    return emptyTags
+
+def _is_empty(tag) -> bool:
+    """Return true if a tag has no text (as tag.get_text(strip=True) == '')
+
+    Stop at the first non blank string.
+    """
+    return next(iter(tag.stripped_strings), None) is None
+
+class _CompiledSelector():
+    """A css selector, compiled once
+
+    Matching a tag with soupsieve is costly (the root of the document is looked for at each call):
+    tags whose name cannot match the selector are skipped beforehand.
+    """
+    def __init__(self, selector) -> None:
+        self._selector = soupsieve.compile(selector)
+
+        # Names of the tags the selector can match (None: any tag)
+        self._tagNames = set()
+        for compoundSelector in self._selector.selectors:
+            tagSelector = getattr(compoundSelector, 'tag', None)
+
+            if tagSelector is None or tagSelector.name in (None, '*'):
+                self._tagNames = None
+                break
+
+            self._tagNames.add(tagSelector.name.lower())
+
+    def match(self, tag) -> bool:
+        if self._tagNames is not None and tag.name.lower() not in self._tagNames:
+            return False
+
+        return self._selector.match(tag)
+
+class CleaningPipeline():
+    """Cleaning rules of an external source, compiled once
+
+    Css selectors are compiled when the pipeline is created,
+    then the pipeline can clean any number of documents.
+    """
+
+    def __init__(self, cleaning_rules) -> None:
+        self._contentSelector = cleaning_rules['content']['selector']
+        self._removeSelectors = [_CompiledSelector(selector) for selector in cleaning_rules.get('remove', [])]
+        self._unwrapSelectors = [_CompiledSelector(selector) for selector in cleaning_rules.get('unwrap', [])]
+
+        # List of (compiled selectors, layout name, options)
+        self._layouts = []
+        for rule in cleaning_rules.get('layouts', {}):
+            layout = rule.get('name', None)
+            options = rule.get('options', {})
+
+            selectors = options.get('selectors', None) or [options.get('selector', '')]
+            self._layouts.append(([_CompiledSelector(selector) for selector in selectors], layout, options))
+
+    def clean(self, rawSoup, cleanSoup) -> None:
+        """Apply the cleaning rules to the raw document
+        """
+        content = rawSoup.select_one(self._contentSelector)
+
+        # Tags already empty in the raw document are skipped
+        self._emptyTags = _compute_empty_tags(content)
+        self._cleanSoup = cleanSoup
+
+        self._build_clean_tags(content)
+
+        self._emptyTags = None
+        self._cleanSoup = None
+
+    def _build_clean_tags(self, tag) -> None:
         """Recursively apply cleaning rules
         """
         if isinstance(tag, NavigableString):
             return
 
         # Skip empty tags
-        if tag.get_text(strip=True) == '':
+        if id(tag) in self._emptyTags:
             return
-        
+
         # Go deeper in the tree
         for childTag in tag.children:
-            build_clean_tags(childTag)
+            self._build_clean_tags(childTag)
 
         # Check if the tag still have content
-        if tag.get_text(strip=True) == '':
+        if _is_empty(tag):
             return
 
         # Check if this tag should be removed
-        for selector in cleaning_rules.get('remove', []):
-            if soupsieve.match(selector, tag):
+        for selector in self._removeSelectors:
+            if selector.match(tag):
                 # Note: the tag is not decomposed in order not to disturb
                 #       css selectors used in cleaning rules
                 tag.clear()
                 return
 
         # Check if this tag should be unwrap
-        for selector in cleaning_rules.get('unwrap', []):
-            if soupsieve.match(selector, tag):
+        for selector in self._unwrapSelectors:
+            if selector.match(tag):
                 # Note: the tag is not decomposed in order not to disturb
                 #       css selectors used in cleaning rules
                 tag.unwrap()
                 return
 
         # Check if this tag matches a cleaning rule
-        for rule in cleaning_rules.get('layouts', {}):
-            layout = rule.get('name', None)
-            options = rule.get('options', {})
-
-            selectors = options.get('selectors', None) or [options.get('selector', '')]
-
+        for selectors, layout, options in self._layouts:
             for selector in selectors:
-                if soupsieve.match(selector, tag) and layout in layout_rules_callbacks:
+                if selector.match(tag) and layout in layout_rules_callbacks:
                     # The tag match a cleaning rule
                     # Applies the rule
-                    clean_tag = layout_rules_callbacks[layout](tag, cleanSoup, options)
+                    clean_tag = layout_rules_callbacks[layout](tag, self._cleanSoup, options)
 
                     # If specified, add an anchor to the numbering
                     if 'numbering' in options:
-                        layout_numbering(cleanSoup, clean_tag, options['numbering'])
-                    
+                        layout_numbering(self._cleanSoup, clean_tag, options['numbering'])
+
                     # Destroy the tag so it will not be parsed another time
                     if clean_tag:
                         tag.clear()
 
                     return
 
-    # Load cleaning rules from the source definition
-    path_sourceDefinition = _get_source_definition_path(sourceName)
-    externalData = yaml.safe_load(open(path_sourceDefinition, 'r'))
-    cleaning_rules = externalData.get('cleaning_rules', None)
+def remove_empty_tags(content) -> None:
+    """Remove empty tags
+    """
+    emptyTags = _compute_empty_tags(content)
 
-    if cleaning_rules is None:
-        logger.debug("No cleaning rules in %s", path_sourceDefinition)
+    def remove_tag(tag):
+        if isinstance(tag, NavigableString):
+            return
+
+        if id(tag) in emptyTags:
+            tag.decompose()
+            return
+
+        for childTag in tag.children:
+            remove_tag(childTag)
+
+    remove_tag(content)
+
+def _init_clean_soup() -> BeautifulSoup:
+    html = """<main>
+<nav>
+    <details>
+    <summary>Table des matières</summary>
+    <ul>
+    </ul>
+    </details>
+</nav>
+<header>
+</header>
+</main>"""
+    return BeautifulSoup(html, 'html.parser')
 
+def clean_raw_document(rawSoup, cleaning_rules) -> BeautifulSoup:
+    """Return a clean document built from a raw one
+
+    @param rawSoup: (BeautifulSoup) body of the raw document
+    @param cleaning_rules: (dict or None) cleaning rules from the source definition
+    """
+    cleanSoup = _init_clean_soup()
+
+    if cleaning_rules is None or cleaning_rules.get('api_version', 0) != CLEANING_RULES_API_VERSION:
         # Get the default main content
         content = rawSoup.body
         remove_empty_tags(content)
 
         cleanSoup.append(content)
+
+    else:
+        CleaningPipeline(cleaning_rules).clean(rawSoup, cleanSoup)
+
+    return cleanSoup
+
+def _build_clean_document(sourceName, path_rawDocument = None):
+    """Build a clean document from a raw one
+    """
+    if path_rawDocument is None:
+        path_rawDocument = _find_source_file_path(sourceName, PATH_SUFFIX_RAW)
+    
+    logger.debug("Clean: %s", path_rawDocument)
+
+    # Parse the document from the raw source
+    with _open_cache_file(path_rawDocument, 'r') as rawFile:
+        rawSoup = BeautifulSoup(rawFile, 'html.parser', parse_only = SoupStrainer("body"))
+
+    # Load cleaning rules from the source definition
+    path_sourceDefinition = _get_source_definition_path(sourceName)
+    cleaning_rules = _load_cleaning_rules(sourceName)
+
+    if cleaning_rules is None:
+        logger.debug("No cleaning rules in %s", path_sourceDefinition)
     
     elif cleaning_rules.get('api_version', 0) != CLEANING_RULES_API_VERSION:
         logger.debug("Cleaning rules set with a different api version (rules: %s / needed: %s)",
             cleaning_rules.get('api_version', 0), CLEANING_RULES_API_VERSION)
 
-        # Get the default main content
-        content = rawSoup.body
-        remove_empty_tags(content)
-
-        cleanSoup.append(content)
-
     else:
         logger.debug("Use cleaning rules from %s", path_sourceDefinition)
 
-        # Get the main content
-        content = rawSoup.select_one(cleaning_rules['content']['selector'])
-        build_clean_tags(content)
+    # The stamp is taken first: if files change meanwhile, the hash is checked again
+    cleaningStamp = get_cleaning_stamp(sourceName, path_rawDocument)
+    cleaningHash = get_cleaning_hash(sourceName, cleaning_rules, path_rawDocument)
+    cleanSoup = clean_raw_document(rawSoup, cleaning_rules)
 
     # Save the clean document
+    # (it is replaced only once it is completely written)
     path_cleanDocument = _get_source_file_path(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED)
-    with open(path_cleanDocument, 'w') as cleanFile:
+    path_tmpDocument = path_cleanDocument + '.part'
+    with _open_cache_file(path_tmpDocument, 'w', compressed = True) as cleanFile:
         cleanFile.write(str(cleanSoup))
 
+    os.replace(path_tmpDocument, path_cleanDocument)
+    _remove_uncompressed_source_file(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED)
+    _save_cleaning_hash(sourceName, cleaningHash, cleaningStamp)
+
+    # Save the clean document split into chunks
+    chunks, anchors = split_clean_document(cleanSoup)
+    _save_chunks(sourceName, chunks, anchors, cleaningHash)
+
+    # Save its table of contents in the index
+    _save_sections(sourceName, extract_sections(cleanSoup, anchors), cleaningHash)
+
+### Chunks of clean documents
+
+def _get_chunk_file_path(sourceName, chunkIndex) -> str:
+    return os.path.join(_get_source_path(sourceName), "{}{}.{}.html{}".format(
+        sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED, chunkIndex, CACHE_COMPRESSED_EXTENSION))
+
+def _get_chunks_index_file_path(sourceName) -> str:
+    return os.path.join(_get_source_path(sourceName), "{}{}.chunks.json".format(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED))
+
+def _is_chunk_boundary(tag) -> bool:
+    """Return true if a chunk can begin with this tag (a heading or a numbered paragraph)
+    """
+    if tag.name in CHUNK_HEADINGS:
+        return True
+
+    return tag.get('id') is not None or tag.find(id = True) is not None
+
+def split_clean_document(cleanSoup):
+    """Split a clean document into chunks
+
+    The first chunk is the head of the document (table of contents and header).
+    Other chunks split the main content at headings and numbered paragraphs.
+
+    @return: (list of chunks (str), dict anchor --> chunk index)
+        or (None, None) if the document was not built from cleaning rules
+    """
+    main = cleanSoup.main
+
+    if main is None or main.find_next_sibling() is not None or main.header is None:
+        return None, None
+
+    chunks = [[]]
+    anchors = {}
+    chunkSize = 0
+    isHead = True
+
+    for child in main.children:
+        if isinstance(child, Tag):
+            if not isHead and chunkSize >= CHUNK_MIN_SIZE and _is_chunk_boundary(child):
+                chunks.append([])
+                chunkSize = 0
+
+            for anchorTag in [child] + child.find_all(id = True):
+                if anchorTag.get('id') is not None:
+                    anchors.setdefault(anchorTag['id'], len(chunks) - 1)
+
+        content = str(child)
+        chunks[-1].append(content)
+        chunkSize += len(content)
+
+        if isHead and child is main.header:
+            # The main content begins
+            isHead = False
+            chunks.append([])
+            chunkSize = 0
+
+    if len(chunks) > 1 and not chunks[-1]:
+        chunks.pop()
+
+    return [''.join(chunk) for chunk in chunks], anchors
+
+def _save_chunks(sourceName, chunks, anchors, cleaningHash) -> None:
+    """Save chunks of a clean document and their index (or remove obsolete ones if chunks is None)
+    """
+    path_chunksIndex = _get_chunks_index_file_path(sourceName)
+
+    if os.path.isfile(path_chunksIndex):
+        os.remove(path_chunksIndex)
+
+    # Obsolete chunks
+    prefix = "{}{}.".format(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED)
+    for filename in os.listdir(_get_source_path(sourceName)):
+        if filename.startswith(prefix) and filename.endswith(".html" + CACHE_COMPRESSED_EXTENSION) \
+                and filename[len(prefix):].split('.')[0].isdigit():
+            os.remove(os.path.join(_get_source_path(sourceName), filename))
+
+    if chunks is None:
+        return
+
+    for chunkIndex, chunk in enumerate(chunks):
+        with _open_cache_file(_get_chunk_file_path(sourceName, chunkIndex), 'w') as chunkFile:
+            chunkFile.write(chunk)
+
+    # The index is written last: chunks are only used once they are all written
+    with open(path_chunksIndex + '.part', 'w') as chunksIndexFile:
+        json.dump({'hash': cleaningHash, 'nbOfChunks': len(chunks), 'anchors': anchors}, chunksIndexFile)
+
+    os.replace(path_chunksIndex + '.part', path_chunksIndex)
+
+def load_chunks_index(sourceName):
+    """Return the index of the chunks of the clean document of a source
+
+    @return: dict with keys 'nbOfChunks' and 'anchors' (anchor --> chunk index),
+        or None if the best version of the source is not split into chunks
+        (eg. it was manually cleaned, or it was cleaned without cleaning rules)
+    """
+    if _find_source_file_path(sourceName, PATH_SUFFIX_MANUALLY_CLEANED) is not None:
+        return None
+
+    try:
+        with open(_get_chunks_index_file_path(sourceName), 'r') as chunksIndexFile:
+            chunksIndex = json.load(chunksIndexFile)
+
+    except (OSError, ValueError):
+        return None
+
+    # Chunks of another clean document
+    if chunksIndex.get('hash') != _load_cleaning_hash(sourceName):
+        return None
+
+    return chunksIndex
+
+def read_chunk(sourceName, chunkIndex) -> str:
+    """Return a chunk of the clean document of a source
+    """
+    with _open_cache_file(_get_chunk_file_path(sourceName, chunkIndex), 'r') as chunkFile:
+        return chunkFile.read()
+
+### Sections of clean documents
+
+def extract_sections(cleanSoup, anchors = None) -> list:
+    """Return the sections of a clean document: its headings and its numbered anchors
+
+    @param anchors: (dict) anchor --> chunk index (see split_clean_document())
+    @return: list of theke.index.DocumentSectionData in the order of the document
+        (numbered anchors have the level 0)
+    """
+    main = cleanSoup.main
+
+    if main is None or main.find_next_sibling() is not None or main.header is None:
+        return []
+
+    anchors = anchors or {}
+    sections = []
+
+    for child in main.header.find_next_siblings():
+        for anchorTag in [child] + child.find_all(id = True):
+            anchor = anchorTag.get('id')
+
+            if anchor is None:
+                continue
+
+            if anchorTag.name in CHUNK_HEADINGS:
+                sections.append(theke.index.DocumentSectionData(
+                    anchor, anchorTag.get_text(" ", strip = True), int(anchorTag.name[1]), anchors.get(anchor)))
+            else:
+                sections.append(theke.index.DocumentSectionData(anchor, anchor, 0, anchors.get(anchor)))
+
+    return sections
+
+def _save_sections(sourceName, sections, cleaningHash, index = None) -> None:
+    """Save the sections of a clean document in the index
+
+    If the index is being rebuilt, sections are not saved (they are extracted again on the next read).
+    """
+    try:
+        index = index or theke.index.ThekeIndex()
+
+        if not index.set_document_sections(sourceName, sections, cleaningHash, SECTIONS_WRITE_TIMEOUT):
+            logger.debug("Source not indexed, its sections are not saved: %s", sourceName)
+
+    except (sqlite3.Error, TimeoutError) as error:
+        logger.warning("Cannot save the sections of %s in the index: %s", sourceName, error)
+
+def are_document_sections_up_to_date(sourceName, index = None) -> bool:
+    """Return true if the sections of the clean document of a source saved in the index are up to date
+    (without reading the document)
+    """
+    index = index or theke.index.ThekeIndex()
+    cleaningHash = _load_cleaning_hash(sourceName)
+
+    return cleaningHash is None or index.get_document_sections_hash(sourceName) == cleaningHash
+
+def update_document_sections(sourceName, index = None) -> None:
+    """Extract again the sections of the clean document of a source
+    if those saved in the index are obsolete (eg. the index was rebuilt)
+    """
+    index = index or theke.index.ThekeIndex()
+
+    if are_document_sections_up_to_date(sourceName, index):
+        return
+
+    cleaningHash = _load_cleaning_hash(sourceName)
+
+    path_cleanDocument = _find_source_file_path(sourceName, PATH_SUFFIX_AUTOMATICALLY_CLEANED)
+
+    if path_cleanDocument is None:
+        return
+
+    logger.debug("Update sections of: %s", sourceName)
+
+    with _open_cache_file(path_cleanDocument, 'r') as cleanFile:
+        cleanSoup = BeautifulSoup(cleanFile, 'html.parser')
+
+    chunksIndex = load_chunks_index(sourceName)
+    _save_sections(sourceName, extract_sections(cleanSoup, chunksIndex['anchors'] if chunksIndex else None), cleaningHash, index)
+
+def clean_cached_document(sourceName, force = False, updateManifest = True) -> bool:
+    """Build the clean document of a cached source, if needed
+
+    @param force: (bool) build it even if it is up to date
+    @param updateManifest: (bool) update the manifest of the cache
+        (only one process should do it, see clean_cache())
+    @return: True if the clean document was built, False if it was up to date
+        or if the raw document is not in the cache any more
+    """
+    if not force and is_auto_cleaning_up_to_date(sourceName):
+        logger.debug("Clean document up to date: %s", sourceName)
+        return False
+
+    if _find_source_file_path(sourceName, PATH_SUFFIX_RAW) is None:
+        logger.debug("Raw document not in the cache: %s", sourceName)
+        return False
+
+    _compress_source_file(sourceName, PATH_SUFFIX_RAW)
+    _build_clean_document(sourceName)
+
+    if updateManifest:
+        update_manifest(sourceName)
+
+    return True
+
+def list_cached_sources() -> list:
+    """Return names of sources whose raw document is cached
+    """
+    if not os.path.isdir(theke.PATH_CACHE):
+        return []
+
+    return sorted(sourceName for sourceName in os.listdir(theke.PATH_CACHE)
+        if _find_source_file_path(sourceName, PATH_SUFFIX_RAW) is not None)
+
+### Cleaning of the whole cache
+#   This function can be run in a separate process.
+
+def _clean_cached_document_job(sourceName, force = False):
+    """Clean a cached source
+
+    @return: (sourceName, True if it was cleaned, error message or None, duration in seconds)
+    """
+    start = time.perf_counter()
+
+    try:
+        isCleaned = clean_cached_document(sourceName, force, updateManifest = False)
+        return sourceName, isCleaned, None, time.perf_counter() - start
+
+    except Exception as error:
+        return sourceName, False, "{}: {}".format(type(error).__name__, error), time.perf_counter() - start
+
+def clean_cache(force = False, jobs = None, progress = None) -> dict:
+    """Build the clean document of every cached source, in a pool of processes
+
+    Clean documents which are up to date (same raw document, same cleaning rules) are skipped.
+
+    @param jobs: (int) number of processes (default: number of CPUs)
+    @param progress: function called after each source, taking three arguments
+        nbOfDoneSources (int), nbOfSources (int), sourceName (str)
+    @return: summary (durations in seconds)
+    """
+    start = time.perf_counter()
+
+    sourceNames = list_cached_sources()
+    summary = {'cleaned': {}, 'skipped': {}, 'failed': {}}
+
+    def collect(sourceName, isCleaned, error, duration) -> None:
+        if error is not None:
+            logger.error("Fail to clean %s: %s", sourceName, error)
+            summary['failed'][sourceName] = error
+        elif isCleaned:
+            summary['cleaned'][sourceName] = duration
+            update_manifest(sourceName, touch = False)
+        else:
+            summary['skipped'][sourceName] = duration
+
+        if progress is not None:
+            progress(sum(len(summary[key]) for key in ('cleaned', 'skipped', 'failed')), len(sourceNames), sourceName)
+
+    jobs = min(jobs or os.cpu_count() or 1, len(sourceNames))
+
+    if jobs <= 1:
+        for sourceName in sourceNames:
+            collect(*_clean_cached_document_job(sourceName, force))
+
+    else:
+        logger.debug("Clean %d sources with %d processes", len(sourceNames), jobs)
+
+        # Do not fork: the parent process may hold gtk stuff
+        with ProcessPoolExecutor(max_workers = jobs, mp_context = multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_clean_cached_document_job, sourceName, force) for sourceName in sourceNames]
+
+            for future in as_completed(futures):
+                collect(*future.result())
+
+    summary['total'] = time.perf_counter() - start
+    return summary
+
 if __name__ == "__main__":
-    class theke:
-        PATH_CACHE = "/home/antoine/.local/share/theke/cache"
-        PATH_EXTERNAL = "/home/antoine/.local/share/theke/external"
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        # Benchmark of downloads from a local stand-in HTTP server (offline)
+        #   python3 -m theke.externalCache benchmark [nbOfRuns]
+        import tempfile
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        nbOfRuns = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+        document = ("<html><body>" + "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n" * 40000 + "</body></html>").encode('utf-8')
+        documentEtag = '"{}"'.format(hashlib.sha1(document).hexdigest())
+        documentLastModified = "Mon, 02 Jan 2023 10:00:00 GMT"
+
+        class StandInHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if self.headers.get('If-None-Match') == documentEtag:
+                    self.send_response(304)
+                    self.send_header('ETag', documentEtag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(document)))
+                self.send_header('ETag', documentEtag)
+                self.send_header('Last-Modified', documentLastModified)
+                self.end_headers()
+                self.wfile.write(document)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        contentUri = "http://127.0.0.1:{}/document.html".format(server.server_port)
+
+        with tempfile.TemporaryDirectory() as tmpDir:
+            theke.PATH_CACHE = tmpDir
+            sourceName = "benchmark"
+
+            def run(name, function):
+                durations = []
+                for _ in range(nbOfRuns):
+                    start = time.perf_counter()
+                    function()
+                    durations.append(time.perf_counter() - start)
+
+                duration = sum(durations) / nbOfRuns
+                print("{:<30} {:8.2f} ms/download {:8.1f} MB/s".format(
+                    name, 1e3 * duration, len(document) / duration / 1e6))
+
+            def bare_download():
+                # Former behaviour: a new connection for each download
+                r = requests.get(contentUri, stream = True, timeout = 1)
+                r.apparent_encoding
+                for chunk in r.iter_content(chunk_size = 512):
+                    pass
+
+            def full_download():
+                for path in (_get_source_file_path(sourceName, PATH_SUFFIX_RAW), _get_validators_file_path(sourceName)):
+                    if os.path.isfile(path):
+                        os.remove(path)
+
+                cache_document_from_external_source(sourceName, contentUri)
+
+            print("Document: {:.1f} MB".format(len(document) / 1e6))
+            run("bare requests.get()", bare_download)
+            run("pooled session", full_download)
+            run("pooled session (304)", lambda: cache_document_from_external_source(sourceName, contentUri))
+
+        server.shutdown()
+
+    elif len(sys.argv) > 1 and sys.argv[1] == 'benchmark-cleaning':
+        # Benchmark of the cleaning of a long synthetic encyclical,
+        # compared with the former implementation (which must give the same document)
+        #   python3 -m theke.externalCache benchmark-cleaning [nbOfParagraphs]
+        nbOfParagraphs = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+        cleaning_rules = {
+            'api_version': CLEANING_RULES_API_VERSION,
+            'content': {'selector': 'div.documento'},
+            'remove': ['sup', 'div.note', 'script'],
+            'unwrap': ['font', 'span:not(.keep)', 'div.section'],
+            'layouts': [
+                {'name': 'header', 'options': {'selector': 'p.title'}},
+                {'name': 'h2', 'options': {'selectors': ['p[align="center"]', 'p > b:only-child'], 'strict': True}},
+                {'name': 'h3', 'options': {'selector': 'p > i:only-child'}},
+                {'name': 'p', 'options': {'selector': 'p',
+                    'numbering': {'pattern': r'^(?P<number>\d+)\.(?P<text>.*)', 'class': 'numbering'}}},
+                {'name': 'unknown', 'options': {'selector': 'div'}},
+            ],
+        }
+
+        parts = ['<html><head><title>Encyclique</title></head><body><div class="documento">',
+            '<p class="title"><font>LETTRE ENCYCLIQUE</font> <b>LAUDATO SI\'</b></p>', '<script>var x = 1;</script>']
+        for i in range(1, nbOfParagraphs + 1):
+            if i % 50 == 1:
+                if i > 1:
+                    parts.append('</div>')
+                parts.append('<div class="section"><p align="center"><b>CHAPITRE {}</b></p>'.format(i // 50 + 1))
+            if i % 17 == 0:
+                parts.append('<p><i>Sous-titre {}</i></p><p> </p><p><span>\n</span></p><!-- note -->'.format(i))
+            # As on some old pages, <font> tags are never closed: paragraphs of a chapter are nested
+            parts.append('<font face="Times"><p><font><span>{}.</span> Lorem <i>ipsum</i> dolor sit amet<sup>[{}]</sup>, '
+                '<span class="keep">consectetur</span> adipiscing elit.</font></p>'.format(i, i))
+            parts.append('<div><div><p><span>  </span><font> </font></p></div></div>')
+        parts.append('</div><div class="note"><p>Notes</p></div></div></body></html>')
+        rawDocument = ''.join(parts)
+
+        def legacy_clean(rawSoup, cleaning_rules):
+            """Former implementation, kept as a reference"""
+            cleanSoup = _init_clean_soup()
+
+            def build_clean_tags(tag) -> None:
+                if isinstance(tag, NavigableString):
+                    return
+                if tag.get_text(strip=True) == '':
+                    return
+                for childTag in tag.children:
+                    build_clean_tags(childTag)
+                if tag.get_text(strip=True) == '':
+                    return
+                for selector in cleaning_rules.get('remove', []):
+                    if soupsieve.match(selector, tag):
+                        tag.clear()
+                        return
+                for selector in cleaning_rules.get('unwrap', []):
+                    if soupsieve.match(selector, tag):
+                        tag.unwrap()
+                        return
+                for rule in cleaning_rules.get('layouts', {}):
+                    layout = rule.get('name', None)
+                    options = rule.get('options', {})
+                    selectors = options.get('selectors', None) or [options.get('selector', '')]
+                    for selector in selectors:
+                        if soupsieve.match(selector, tag) and layout in layout_rules_callbacks:
+                            clean_tag = layout_rules_callbacks[layout](tag, cleanSoup, options)
+                            if 'numbering' in options:
+                                layout_numbering(cleanSoup, clean_tag, options['numbering'])
+                            if clean_tag:
+                                tag.clear()
+                            return
+
+            build_clean_tags(rawSoup.select_one(cleaning_rules['content']['selector']))
+            return cleanSoup
+
+        def legacy_remove_empty_tags(rawSoup, cleaning_rules):
+            """Former implementation, kept as a reference"""
+            cleanSoup = _init_clean_soup()
+
+            def remove_empty_tags(tag):
+                if isinstance(tag, NavigableString):
+                    return
+                if tag.get_text(strip=True) == '':
+                    tag.decompose()
+                    return
+                for childTag in tag.children:
+                    remove_empty_tags(childTag)
+
+            content = rawSoup.body
+            remove_empty_tags(content)
+            cleanSoup.append(content)
+            return cleanSoup
+
+        def run(name, function, rules):
+            rawSoup = BeautifulSoup(rawDocument, 'html.parser', parse_only = SoupStrainer("body"))
+            start = time.perf_counter()
+            document = str(function(rawSoup, rules))
+            duration = time.perf_counter() - start
+            print("{:<40} {:8.1f} ms".format(name, 1e3 * duration))
+            return document
+
+        print("Document: {:.1f} kB, {} paragraphs".format(len(rawDocument) / 1e3, nbOfParagraphs))
+
+        expected = run("former implementation (rules)", legacy_clean, cleaning_rules)
+        document = run("compiled pipeline (rules)", clean_raw_document, cleaning_rules)
+        print("Identical output: {}".format(document == expected))
+
+        expected = run("former implementation (no rules)", legacy_remove_empty_tags, None)
+        document = run("compiled pipeline (no rules)", clean_raw_document, None)
+        print("Identical output: {}".format(document == expected))
+
+    else:
+        class theke:
+            PATH_CACHE = "/home/antoine/.local/share/theke/cache"
+            PATH_EXTERNAL = "/home/antoine/.local/share/theke/external"
 
-    logging.basicConfig(level=logging.DEBUG)
+        logging.basicConfig(level=logging.DEBUG)
 
-    sourceName = "François_amoris laetitia_2016"
-    path_rawDocument = "/home/antoine/.local/share/theke/cache/François_amoris laetitia_2016/François_amoris laetitia_2016_raw.html"
-    _build_clean_document(sourceName, path_rawDocument)
+        sourceName = "François_amoris laetitia_2016"
+        path_rawDocument = "/home/antoine/.local/share/theke/cache/François_amoris laetitia_2016/François_amoris laetitia_2016_raw.html"
+        _build_clean_document(sourceName, path_rawDocument)
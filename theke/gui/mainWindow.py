@@ -8,9 +8,9 @@ from gi.repository import WebKit2
 import theke
 import theke.navigator
 import theke.reference
+import theke.startupProfiler
 
 # Import needed to load the gui
-from theke.gui.aboutDialog import AboutDialog
 from theke.gui.widget_ThekeHistoryBar import ThekeHistoryBar
 from theke.gui.widget_ThekeGotoBar import ThekeGotoBar
 from theke.gui.widget_ThekeSourcesBar import ThekeSourcesBar
@@ -62,12 +62,7 @@ class ThekeWindow(Gtk.ApplicationWindow):
         self._ThekeHistoryBar.set_button_clicked_callback(self.on_history_button_clicked)
 
         #   ... gotoBar
-        # Populate the gotobar autocompletion list
-        for documentData in self._archivist.list_documents_by_type(theke.TYPE_BIBLE):
-            self._ThekeGotoBar.append((documentData.name, 'powder blue'))
-
-        for documentData in self._archivist.list_documents_by_type(theke.TYPE_BOOK):
-            self._ThekeGotoBar.append((documentData.name, 'white smoke'))
+        self.populate_gotobar()
 
         #   ... document view
         # ... document view > webview: where the document is displayed
@@ -83,7 +78,12 @@ class ThekeWindow(Gtk.ApplicationWindow):
         self._ThekeDocumentView.connect("webview-mouse-target-changed", self._documentView_mouse_target_changed_cb)
         self._ThekeDocumentView.connect("webview-scroll-changed", self._documentView_scroll_changed_cb)
 
+        #   ... archivist: the index is updated in the background
+        self._archivist.connect("index-progress", self._archivist_index_progress_cb)
+        self._archivist.connect("index-updated", self._archivist_index_updated_cb)
+
         #   ... search panel
+        self._ThekeSearchView.register_archivist(self._archivist)
         self._ThekeSearchView.connect("selection-changed", self._searchView_selection_changed)
         self._ThekeSearchView.connect("start", self._searchView_start_cb)
         self._ThekeSearchView.connect("finish", self._searchView_finish_cb)
@@ -200,6 +200,19 @@ class ThekeWindow(Gtk.ApplicationWindow):
         else:
             self.props.local_search_mode_active = not searchMode
     
+    @Gtk.Template.Callback()
+    def _document_bibleSearch_menuItem_activate_cb(self, menu_item) -> None:
+        """Document > Search in the Bible
+        """
+        doc = self._ThekeDocumentView.doc
+
+        if doc is None or doc.type != theke.TYPE_BIBLE or not doc.sources:
+            self.display_warning_modal("Ouvrez une Bible pour y faire une recherche.")
+            return
+
+        self._ThekeSearchView.show()
+        self._ThekeSearchView.search_entry_grab_focus(doc.sources[0].name)
+
     @Gtk.Template.Callback()
     def _document_hardRefresh_menuItem_activate_cb(self, menu_item) -> None:
         """Document > Refresh cache
@@ -228,6 +241,9 @@ class ThekeWindow(Gtk.ApplicationWindow):
     def _help_about_menuItem_activate_cb(self, menu_item) -> None:
         """Help > About...
         """
+        # The dialog (and its template) is only loaded when it is needed
+        from theke.gui.aboutDialog import AboutDialog
+
         aboutDialog = AboutDialog()
         aboutDialog.props.transient_for = self
         aboutDialog.run()
@@ -250,6 +266,10 @@ class ThekeWindow(Gtk.ApplicationWindow):
                 self._statusbar_revealer.set_reveal_child(True)
 
         elif load_event == WebKit2.LoadEvent.FINISHED:
+            if theke.startupProfiler.is_enabled():
+                theke.startupProfiler.end_phase("first load_uri")
+                theke.startupProfiler.finish()
+
             # Scroll to the last position
             scrolled_value = self._ThekeHistoryBar.get_scrolled_value(documentView.shortTitle)
             documentView.update_scroll(scrolled_value)
@@ -274,6 +294,20 @@ class ThekeWindow(Gtk.ApplicationWindow):
     def _documentView_scroll_changed_cb(self, object, uri):
         self._ThekeHistoryBar.save_scrolled_value(uri.params['shortTitle'], int(uri.params['y_scroll']))
 
+    ### Callbacks (_archivist)
+    def _archivist_index_progress_cb(self, archivist, nbOfIndexedSources, nbOfSources, sourceName) -> None:
+        contextId = self._statusbar.get_context_id("index")
+        self._statusbar.pop(contextId)
+        self._statusbar.push(contextId, "Mise à jour de l'index : {} ({}/{})".format(sourceName, nbOfIndexedSources, nbOfSources))
+        self._statusbar_revealer.set_reveal_child(True)
+
+    def _archivist_index_updated_cb(self, archivist) -> None:
+        contextId = self._statusbar.get_context_id("index")
+        self._statusbar.pop(contextId)
+        self._statusbar_revealer.set_reveal_child(self._ThekeDocumentView.type != theke.TYPE_BIBLE)
+
+        self.populate_gotobar()
+
     ### Callbacks (_navigator)
     def _navigator_context_updated_cb(self, navigator, update_type) -> None:
         if update_type == theke.navigator.NEW_DOCUMENT:
@@ -303,6 +337,16 @@ class ThekeWindow(Gtk.ApplicationWindow):
         if update_type == theke.navigator.SOURCES_UPDATED:
             self._ThekeSourcesBar.updateSources(navigator.doc.sources)
 
+        if update_type == theke.navigator.AVAILABLE_SOURCES_UPDATED:
+            # The index was updated (see ThekeNavigator.handle_archivist_index_updated_cb())
+            self._ThekeSourcesBar.updateAvailableSources(navigator.doc.availableSources)
+            self._ThekeSourcesBar.updateSources(navigator.doc.sources)
+
+        if update_type == theke.navigator.NEW_CHAPTER:
+            # Continuous reading mode: only the reference has changed
+            self.fill_gotobar_with_reference(navigator.doc)
+            self._ThekeHistoryBar.add_uri_to_history(navigator.doc.shortTitle, navigator.doc.uri)
+
     def _navigator_selected_word_changed_cb(self, navigator, params):
         """Transmit the selected word to the tools box
         """
@@ -312,6 +356,7 @@ class ThekeWindow(Gtk.ApplicationWindow):
 
         self._ThekeToolsBox.set_lemma(w.lemma)
         self._ThekeToolsBox.set_strongs(w.strong)
+        self._ThekeToolsBox.set_occurrences(self._archivist.get_strongs_occurrences(w.source, w.rawStrong))
         self._ThekeToolsBox.show()
 
     ### Callbacks (_searchView)
@@ -344,6 +389,17 @@ class ThekeWindow(Gtk.ApplicationWindow):
         self.open_uri(button.uri)
         return True
 
+    def populate_gotobar(self) -> None:
+        """Populate the gotobar autocompletion list with documents of the index
+        """
+        self._ThekeGotoBar.clear()
+
+        for documentData in self._archivist.list_documents_by_type(theke.TYPE_BIBLE):
+            self._ThekeGotoBar.append((documentData.name, 'powder blue'))
+
+        for documentData in self._archivist.list_documents_by_type(theke.TYPE_BOOK):
+            self._ThekeGotoBar.append((documentData.name, 'white smoke'))
+
     def fill_gotobar_with_reference(self, doc) -> None:
         """Fill the gotobar with the reference of the given document
         """
@@ -11,6 +11,7 @@ import threading
 import theke
 import theke.uri
 import theke.index
+import theke.navigator
 import theke.externalCache
 
 logger = logging.getLogger(__name__)
@@ -55,8 +56,12 @@ class ThekeDocumentView(Gtk.Paned):
         super().__init__()
 
         self._app = application
+        self._archivist = self._app.props.archivist
         self._navigator = navigator
 
+        # True while the toc selection follows the document (and should not navigate)
+        self._isTocSelectionSynchronizing = False
+
         self._webview = ThekeWebView(self._app, self._navigator)
         self._webview_findController = self._webview.get_find_controller()
 
@@ -66,6 +71,7 @@ class ThekeDocumentView(Gtk.Paned):
     def _setup_callbacks(self) -> None:
         #   ... navigtor
         self._navigator.connect("navigation-error", self._navigator_navigation_error_cb)
+        self._navigator.connect("context-updated", self._navigator_context_updated_cb)
         #   ... document view
         self.connect("notify::local-search-mode-active", self._local_search_mode_active_cb)
         # ... document view > webview: where the document is displayed
@@ -88,8 +94,8 @@ class ThekeDocumentView(Gtk.Paned):
 
         # Setup the table of contents
         renderer = Gtk.CellRendererText()
-        column = Gtk.TreeViewColumn("Chapitre", renderer, text=0)
-        self._toc_treeView.append_column(column)
+        self._toc_column = Gtk.TreeViewColumn("Chapitre", renderer, text=0)
+        self._toc_treeView.append_column(self._toc_column)
 
         # Setup the expand/reduce button
         self._toc_reduceExpand_button.set_orientation(self._toc_reduceExpand_button.ORIENTATION_RIGHT)
@@ -125,18 +131,40 @@ class ThekeDocumentView(Gtk.Paned):
     def _toc_treeSelection_changed_cb(self, tree_selection):
         """Go to the selected item of the toc
         """
+        if self._isTocSelectionSynchronizing:
+            return
+
         model, treeIter = tree_selection.get_selected()
 
         if treeIter is not None:
             uri = model[treeIter][1]
 
-            if (uri & self.uri) & theke.uri.comparison.SAME_BASE_URI != theke.uri.comparison.SAME_BASE_URI:
+            if self._navigator.doc.toc.type == theke.TYPE_BOOK:
+                # Entries of a book are sections of the current document
+                if (uri & self.uri) != theke.uri.comparison.SAME_URI:
+                    self._navigator.goto_uri(uri)
+
+            elif (uri & self.uri) & theke.uri.comparison.SAME_BASE_URI != theke.uri.comparison.SAME_BASE_URI:
                 self._navigator.goto_uri(model[treeIter][1])
 
     ### Callbacks (from the navigator)
     def _navigator_navigation_error_cb(self, object, error) -> None:
         self.emit("navigation-error", error)
 
+    def _navigator_context_updated_cb(self, object, update_type) -> None:
+        if update_type == theke.navigator.NEW_CHAPTER:
+            # Continuous reading mode: the document is not reloaded,
+            # so the current chapter has to be selected in the table of content
+            self._isTocSelectionSynchronizing = True
+            self._toc_treeSelection.select_path(Gtk.TreePath(self._navigator.doc.ref.chapter-1))
+            self._isTocSelectionSynchronizing = False
+
+        elif update_type == theke.navigator.NEW_SECTION:
+            self.select_toc_section()
+
+        elif update_type == theke.navigator.TOC_UPDATED:
+            self.update_toc()
+
     ### Other callbacks (from _webview)
     def _document_load_changed_cb(self, web_view, load_event):
         """Handle the load changed signal of the document view
@@ -151,15 +179,7 @@ class ThekeDocumentView(Gtk.Paned):
         if load_event == WebKit2.LoadEvent.FINISHED:
             # Update the table of content
             if self._navigator.doc.toc is not None:
-                self.set_title(self._navigator.doc.title)
-                self.set_content(self._navigator.doc.toc.toc)
-
-                if self._navigator.doc.toc.type == theke.TYPE_BIBLE:
-                    # Trick: as a biblical toc is the list of chapters
-                    #        the index of a chapter is its value -1
-                    self._toc_treeSelection.select_path(Gtk.TreePath(self._navigator._currentDocument.ref.chapter-1))
-
-                self.show_toc()
+                self.update_toc()
 
             # # If a verse is given, scroll to it
             # if self._navigator.ref and self._navigator.ref.type == theke.TYPE_BIBLE and self._navigator.ref.verse is not None:
@@ -303,6 +323,54 @@ class ThekeDocumentView(Gtk.Paned):
         """
         self._toc_treeView.set_model(content)
 
+    def update_toc(self) -> None:
+        """Show the table of content of the current document (or hide it if it has none)
+        """
+        if self._navigator.doc.toc is None:
+            self.hide_toc()
+            return
+
+        self.set_title(self._navigator.doc.title)
+        self.set_content(self._navigator.doc.toc.toc)
+
+        if self._navigator.doc.toc.type == theke.TYPE_BIBLE:
+            self._toc_column.set_title("Chapitre")
+
+            # Trick: as a biblical toc is the list of chapters
+            #        the index of a chapter is its value -1
+            self._toc_treeSelection.select_path(Gtk.TreePath(self._navigator._currentDocument.ref.chapter-1))
+
+        elif self._navigator.doc.toc.type == theke.TYPE_BOOK:
+            self._toc_column.set_title("Section")
+            self.select_toc_section()
+
+        self.show_toc()
+
+    def select_toc_section(self) -> None:
+        """Select the heading containing the current section of a book
+        (without navigating)
+        """
+        toc = self._navigator.doc.toc
+
+        if toc is None or toc.type != theke.TYPE_BOOK:
+            return
+
+        sources = self._navigator.doc.sources
+        section = self._navigator.doc.section
+        heading = self._archivist.get_document_section_heading(sources[0].name, section) if sources and section else None
+
+        self._isTocSelectionSynchronizing = True
+
+        if heading in toc.paths:
+            path = toc.paths[heading]
+            self._toc_treeView.expand_to_path(path)
+            self._toc_treeSelection.select_path(path)
+            self._toc_treeView.scroll_to_cell(path, None, False, 0, 0)
+        else:
+            self._toc_treeSelection.unselect_all()
+
+        self._isTocSelectionSynchronizing = False
+
     def toc_select_neighbor(self, direction):
         """Select a neighbor toc entry
         @param direction: NEXT, PREVIOUS, UP, DOWN
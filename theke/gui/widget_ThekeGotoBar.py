@@ -38,3 +38,8 @@ class ThekeGotoBar(Gtk.SearchEntry):
         """Append date to the autocompletion list
         """
         self._autoCompletionlist.append(data)
+
+    def clear(self):
+        """Empty the autocompletion list
+        """
+        self._autoCompletionlist.clear()
@@ -1,18 +1,25 @@
 from gi.repository import Gtk
+from gi.repository import GLib
 from gi.repository import GObject
 from gi.repository import Pango
 
 import theke
 import theke.searchResults
-import theke.sword
 
-from collections import namedtuple
+import time
+from collections import deque, namedtuple
 
 import logging
 logger = logging.getLogger(__name__)
 
 ResultData = namedtuple('resultData', ['reference', 'referenceType', 'nbOfResults'])
 
+# Maximal duration (in seconds) of an idle slice appending results to the model
+RESULTS_SLICE_DURATION = 0.008
+
+# Maximal number of results of a same book appended at once
+RESULTS_GROUP_SIZE = 50
+
 @Gtk.Template.from_file('./theke/gui/templates/ThekeSearchView.glade')
 class ThekeSearchView(Gtk.Bin):
     __gtype_name__ = "ThekeSearchView"
@@ -31,6 +38,7 @@ class ThekeSearchView(Gtk.Bin):
     _reduceExpand_button = Gtk.Template.Child()
     _title_label = Gtk.Template.Child()
     _close_button = Gtk.Template.Child()
+    _search_entry = Gtk.Template.Child()
 
     _results_window = Gtk.Template.Child()
     _results_treeView = Gtk.Template.Child()
@@ -42,6 +50,17 @@ class ThekeSearchView(Gtk.Bin):
         super().__init__(*args, **kwargs)
 
         self.results = None
+        self._archivist = None
+
+        # Module searched by the search entry
+        self._moduleName = None
+
+        # Search results waiting to be appended to the model
+        self._searchId = 0
+        self._pendingResults = deque()
+        self._nbOfResults = 0
+        self._isSearchDone = True
+        self._appendSourceId = None
 
         self._setup_view()
 
@@ -68,6 +87,7 @@ class ThekeSearchView(Gtk.Bin):
     ### Callbacks (from glade)
     @Gtk.Template.Callback()
     def _close_button_clicked_cb(self, button) -> None:
+        self.search_cancel()
         self.hide()
 
     @Gtk.Template.Callback()
@@ -77,6 +97,15 @@ class ThekeSearchView(Gtk.Bin):
         else:
             self.reduce()
 
+    @Gtk.Template.Callback()
+    def _search_entry_activate_cb(self, entry) -> None:
+        """Search the keyword of the search entry in the current module
+        """
+        keyword = entry.get_text().strip()
+
+        if keyword and self._moduleName:
+            self.search_start(self._moduleName, keyword)
+
     @Gtk.Template.Callback()
     def _results_treeSelection_changed_cb(self, tree_selection) -> None:
         model, treeIter = tree_selection.get_selected()
@@ -88,23 +117,126 @@ class ThekeSearchView(Gtk.Bin):
                 self.emit("selection-changed", ResultData(*model[treeIter]))
     
     ### Others
-    def _search_callback(self, results):
-        logger.debug("ThekeSearchPane - Load search results in the SearchPane")
+    def _search_batch_callback(self, searchId, batch, nbOfResults) -> None:
+        """Queue a batch of search results
+        """
+        if searchId != self._searchId:
+            # Results of an outdated search
+            return
 
-        self.results = theke.searchResults.ThekeSearchResults()
-        self._results_treeView.set_model(self.results)
+        self._nbOfResults = nbOfResults
+        self._pendingResults.extend(batch)
+
+        if self._appendSourceId is None:
+            self._appendSourceId = GLib.idle_add(self._append_pending_results)
+
+    def _search_finish_callback(self, searchId, nbOfResults) -> None:
+        if searchId != self._searchId:
+            return
+
+        self._nbOfResults = nbOfResults
+        self._isSearchDone = True
+
+        if self._appendSourceId is None:
+            self._appendSourceId = GLib.idle_add(self._append_pending_results)
+
+    def _append_pending_results(self) -> bool:
+        """Append queued results to the model, during a bounded time slice
+
+        Consecutive results of the same book are appended at once.
+        """
+        deadline = time.monotonic() + RESULTS_SLICE_DURATION
+
+        while self._pendingResults and time.monotonic() < deadline:
+            bookName, reference = self._pendingResults.popleft()
+            references = [reference]
+
+            while self._pendingResults and self._pendingResults[0][0] == bookName and len(references) < RESULTS_GROUP_SIZE:
+                references.append(self._pendingResults.popleft()[1])
+
+            self.results.add(bookName, references, theke.TYPE_BIBLE)
+
+        self._update_progress()
 
-        for bookName, rawReferences in results.items():
-            self.results.add(bookName, rawReferences, theke.TYPE_BIBLE)
+        if self._pendingResults:
+            return GLib.SOURCE_CONTINUE
 
-        logger.debug("ThekeSearchPane - End of the search")
-        self.emit("finish")    
+        self._appendSourceId = None
+
+        if self._isSearchDone:
+            logger.debug("ThekeSearchPane - End of the search")
+            self.emit("finish")
+
+        return GLib.SOURCE_REMOVE
+
+    def _update_progress(self) -> None:
+        nbOfLoadedResults = self.results.get_nb_of_results()
+
+        if self._isSearchDone and not self._pendingResults:
+            self._title_label.set_label("Recherche ({} résultat{})".format(
+                nbOfLoadedResults, "s" if nbOfLoadedResults > 1 else ""))
+        else:
+            self._title_label.set_label("Recherche… ({}/{})".format(nbOfLoadedResults, self._nbOfResults))
     ###
 
     def search_start(self, moduleName, keyword):
         self.emit("start", moduleName, keyword)
         logger.debug("ThekeSearchPane - Start a search: %s in %s", keyword, moduleName)
-        theke.sword.bibleSearch_keyword_async(moduleName, keyword, self._search_callback)
+
+        self._moduleName = moduleName
+        self._search_entry.set_text(keyword)
+        self._search_entry.set_placeholder_text("Rechercher dans {}".format(moduleName))
+
+        # Drop results of a previous search
+        self._searchId += 1
+        self._pendingResults.clear()
+        self._nbOfResults = 0
+        self._isSearchDone = False
+
+        if self._appendSourceId is not None:
+            GLib.source_remove(self._appendSourceId)
+            self._appendSourceId = None
+
+        self.results = theke.searchResults.ThekeSearchResults()
+        self._results_treeView.set_model(self.results)
+        self._update_progress()
+
+        searchId = self._searchId
+        self._archivist.search_async(id(self), moduleName, keyword,
+            lambda batch, nbOfResults: self._search_batch_callback(searchId, batch, nbOfResults),
+            lambda nbOfResults: self._search_finish_callback(searchId, nbOfResults))
+
+    def search_cancel(self) -> None:
+        """Cancel the current search (results already loaded are kept)
+        """
+        if self._isSearchDone and self._appendSourceId is None:
+            return
+
+        logger.debug("ThekeSearchPane - Cancel the search")
+        self._archivist.cancel_search(id(self))
+
+        self._searchId += 1
+        self._pendingResults.clear()
+        self._isSearchDone = True
+
+        if self._appendSourceId is not None:
+            GLib.source_remove(self._appendSourceId)
+            self._appendSourceId = None
+
+        self._update_progress()
+        self.emit("finish")
+
+    def search_entry_grab_focus(self, moduleName) -> None:
+        """Give the focus to the search entry, to search a keyword in a module
+        """
+        self._moduleName = moduleName
+        self._search_entry.set_placeholder_text("Rechercher dans {}".format(moduleName))
+        self._search_entry.grab_focus()
+
+    def register_archivist(self, archivist) -> None:
+        """Register the archivist doing searches
+        """
+        self._archivist = archivist
 
     def show(self):
         super().show()
@@ -113,6 +245,7 @@ class ThekeSearchView(Gtk.Bin):
 
     def expand(self):
         self.props.isReduce = False
+        self._search_entry.show()
         self._results_window.show()
         self._title_label.show()
         self._close_button.show()
@@ -120,6 +253,7 @@ class ThekeSearchView(Gtk.Bin):
 
     def reduce(self):
         self.props.isReduce = True
+        self._search_entry.hide()
         self._results_window.hide()
         self._title_label.hide()
         self._close_button.hide()
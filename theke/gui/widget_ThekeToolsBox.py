@@ -24,6 +24,7 @@ class ThekeToolsBox(Gtk.Revealer):
     _toolsBox_lemma_label = Gtk.Template.Child()
 
     _toolsBox_strong_label = Gtk.Template.Child()
+    _toolsBox_occurrences_label = Gtk.Template.Child()
 
     _toolsBox_morphoView = Gtk.Template.Child()
     _toolsBox_dicoView = Gtk.Template.Child()
@@ -72,6 +73,20 @@ class ThekeToolsBox(Gtk.Revealer):
             self._toolsBox_search_button.set_sensitive(False)
             self._toolsBox_strong_label.hide()
 
+    def set_occurrences(self, occurrences):
+        """Display the number of occurrences of the selected word
+
+        @param occurrences: (nbOfOccurrences, nbOfBooks) or None if unknown
+        """
+        if occurrences and occurrences[0] > 0:
+            nbOfOccurrences, nbOfBooks = occurrences
+            self._toolsBox_occurrences_label.set_label("{} occurrence{} dans {} livre{}".format(
+                nbOfOccurrences, "s" if nbOfOccurrences > 1 else "",
+                nbOfBooks, "s" if nbOfBooks > 1 else ""))
+            self._toolsBox_occurrences_label.show()
+        else:
+            self._toolsBox_occurrences_label.hide()
+
     ### Widget like functions
 
     def hide(self):
@@ -6,6 +6,7 @@ from gi.repository import WebKit2
 import theke
 import theke.uri
 import theke.navigator
+import theke.tracing
 
 import logging
 logger = logging.getLogger(__name__)
@@ -16,7 +17,9 @@ class ThekeWebView(WebKit2.WebView):
         'click_on_word': (GObject.SIGNAL_RUN_FIRST, None,
                       (object,)),
         'scroll-changed': (GObject.SIGNAL_RUN_FIRST, None,
-                      (object,))
+                      (object,)),
+        'visible-chapter-changed': (GObject.SIGNAL_RUN_FIRST, None,
+                      (int,))
         }
 
     def __init__(self, application, navigator):
@@ -35,6 +38,9 @@ class ThekeWebView(WebKit2.WebView):
         context = self.get_context()
         context.register_uri_scheme('theke', self.handle_theke_uri, None)
 
+        # Fragments of documents are fetched from scripts (continuous reading mode)
+        context.get_security_manager().register_uri_scheme_as_cors_enabled('theke')
+
         self._setup_callbacks()
 
     def _setup_callbacks(self) -> None:
@@ -46,6 +52,9 @@ class ThekeWebView(WebKit2.WebView):
     def do_click_on_word(self, uri) -> None:
         self._navigator.handle_webview_click_on_word_cb(None, uri)
 
+    def do_visible_chapter_changed(self, chapter) -> None:
+        self._navigator.handle_webview_visible_chapter_changed_cb(None, chapter)
+
     # Webview callbacks
     def handle_decide_policy(self, web_view, decision, decision_type):
         """Take a decision according to the context update
@@ -57,8 +66,12 @@ class ThekeWebView(WebKit2.WebView):
         if decision_type == WebKit2.PolicyDecisionType.NAVIGATION_ACTION:
             self._navigator.set_loading(True)
 
-            uri = theke.uri.parse(decision.get_request().get_uri())
-            updateType = self._navigator.update_context_from_uri(uri)
+            rawUri = decision.get_request().get_uri()
+            theke.tracing.start_navigation(rawUri)
+
+            with theke.tracing.span("navigator.update_context_from_uri"):
+                uri = theke.uri.parse(rawUri)
+                updateType = self._navigator.update_context_from_uri(uri)
 
             if updateType == theke.navigator.NEW_VERSE:
                 # It is not necessary to reload the document
@@ -67,9 +80,20 @@ class ThekeWebView(WebKit2.WebView):
                 self.grab_focus()
 
                 self._navigator.set_loading(False)
+                theke.tracing.end_navigation("verse")
                 decision.ignore()
                 return True
         
+            elif updateType == theke.navigator.NEW_CHAPTER:
+                # Continuous reading mode: the chapter is loaded in the current document
+                self.goto_chapter(self._navigator.doc.ref.chapter, self._navigator.doc.ref.get_verse())
+                self.grab_focus()
+
+                self._navigator.set_loading(False)
+                theke.tracing.end_navigation("chapter")
+                decision.ignore()
+                return True
+
             elif updateType == theke.navigator.NEW_SECTION:
                 # It is not necessary to reload the document
                 # Just jump to the section
@@ -77,6 +101,7 @@ class ThekeWebView(WebKit2.WebView):
                 self.grab_focus()
 
                 self._navigator.set_loading(False)
+                theke.tracing.end_navigation("section")
                 decision.ignore()
                 return True
 
@@ -92,7 +117,9 @@ class ThekeWebView(WebKit2.WebView):
         Case 1. The uri is a Theke signal
             eg. uri = theke:/signal/click_on_word?word=...
         Case 2. The uri is a path to an asset
-        Case 3. Else, the uri is a path to a document
+        Case 3. The uri is a path to a fragment of a document
+            eg. uri = theke:/fragment/bible/John 2?sources=...
+        Case 4. Else, the uri is a path to a document
         """
         uri = theke.uri.parse(request.get_uri())
 
@@ -108,6 +135,9 @@ class ThekeWebView(WebKit2.WebView):
 
             if uri.path[2] == 'scroll_position':
                 self.emit("scroll-changed", uri)
+
+            if uri.path[2] == 'visible_chapter':
+                self.emit("visible-chapter-changed", int(uri.params.get('chapter', 0)))
                 
             html_bytes = GLib.Bytes.new("".encode('utf-8'))
             tmp_stream_in = Gio.MemoryInputStream.new_from_bytes(html_bytes)
@@ -119,9 +149,26 @@ class ThekeWebView(WebKit2.WebView):
             f = Gio.File.new_for_path('./assets/' + '/'.join(uri.path[3:]))
             request.finish(f.read(), -1, None)
 
+        elif uri.path[1] == theke.uri.SEGM_FRAGMENT:
+            # Case 3. Path to a fragment of a document
+            # (rendered asynchronously, the request is finished later)
+            def finish_request(content):
+                if content is None:
+                    request.finish_error(GLib.Error("Cannot get the fragment {}".format(uri)))
+                    return
+
+                html_bytes = GLib.Bytes.new(content.encode('utf-8'))
+                request.finish(Gio.MemoryInputStream.new_from_bytes(html_bytes), -1, 'text/html; charset=utf-8')
+
+            self._navigator.get_fragment_async(uri, finish_request)
+
         else:
-            # Case 3. Path to a document           
-            request.finish(self._navigator.doc.inputStream, -1, 'text/html; charset=utf-8')
+            # Case 4. Path to a document           
+            with theke.tracing.span("webview.handle_theke_uri", uri = uri):
+                request.finish(self._navigator.doc.inputStream, -1, 'text/html; charset=utf-8')
+
+            # The document is then parsed and laid out by webkit
+            theke.tracing.start_span("webkit.load")
 
     def handle_load_changed(self, web_view, load_event):
         if load_event == WebKit2.LoadEvent.FINISHED:
@@ -141,19 +188,23 @@ class ThekeWebView(WebKit2.WebView):
             self.run_javascript(script, None, None, None)
 
             self._navigator.set_loading(False)
+            theke.tracing.end_navigation()
 
     # Webview API
     def jump_to_anchor(self, anchor):
         """Ask the webview to scroll to an inner anchor
         
         Try to get the object by id (html5). If it fails, try by name.
+        In an external document split into chunks, the chunk of the anchor is loaded if needed.
         """
         
-        script = """var e = document.getElementById('{anchor}');
+        script = """if (typeof goto_anchor === "function") {{ goto_anchor('{anchor}'); }} else {{
+        var e = document.getElementById('{anchor}');
         if (e) {{e.scrollIntoView({{behavior: "smooth", block: "start", inline: "nearest"}});}}
         
         e = document.getElementsByName('{anchor}');
         e[0].scrollIntoView({{behavior: "smooth", block: "start", inline: "nearest"}});
+        }}
         """.format(anchor = anchor)
         self.run_javascript(script, None, None, None)
     
@@ -165,6 +216,12 @@ class ThekeWebView(WebKit2.WebView):
 
         self.run_javascript(script, None, None, None)
 
+    def goto_chapter(self, chapter, verse = 0):
+        """Scroll to a chapter of the current biblical book (continuous reading mode)
+        """
+        script = 'goto_chapter({}, {})'.format(int(chapter), int(verse))
+        self.run_javascript(script, None, None, None)
+
     def scroll_to_verse(self, verse):
         if verse > 0:
             script = 'jump_to_verse("verse-{}")'.format(verse)
@@ -1,14 +1,21 @@
 from collections import namedtuple
+from contextlib import contextmanager
 from typing import Any
 
+import hashlib
 import logging
+import multiprocessing
 import os
 import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sqlite3.dbapi2 import Cursor
 import yaml
 
 import Sword
 import theke
+import theke.connectionPool
 import theke.sword
 
 logger = logging.getLogger(__name__)
@@ -16,20 +23,151 @@ logger = logging.getLogger(__name__)
 SourceData = namedtuple('SourceData',['name', 'type', 'contentType', 'lang', 'description'])
 DocumentData = namedtuple('documentData',['name', 'type'])
 ExternalDocumentData = namedtuple('externalDocumentData',['name', 'uri'])
+DocumentSectionData = namedtuple('documentSectionData',['anchor', 'label', 'level', 'chunk'])
+FileFingerprint = namedtuple('fileFingerprint',['path', 'sourceType', 'sourceName', 'mtime', 'size', 'hash'])
+BookNodeData = namedtuple('bookNodeData',['position', 'offset', 'parentOffset', 'previousOffset', 'nextOffset', 'depth', 'name', 'path', 'lastPosition'])
 
 SOURCETYPE_SWORD = 'sword'
 SOURCETYPE_EXTERN = 'extern'
 
-NEEDED_API_VERSION = "0.4"
+NEEDED_API_VERSION = "0.8"
 INDEX_PATH = os.path.join(theke.PATH_DATA, 'thekeIndex.db')
 
+# Pragmas set on each connection to the index (see theke.connectionPool)
+INDEX_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+    "PRAGMA temp_store = MEMORY;",
+    "PRAGMA cache_size = -8000;",
+    "PRAGMA mmap_size = 67108864;",
+)
+
+# In-memory copy of the small and hot tables of the index,
+# shared by every ThekeIndex instance (see IndexMetadata)
+_metadata = None
+_metadataLock = threading.Lock()
+
+class IndexMetadata:
+    """In-memory copy of the small and hot tables of the index
+
+    Building a reference needs book names, abbreviations, testaments, number of chapters
+    and links between documents and sources. Those tables are loaded once
+    so that references can be built without touching the disk.
+
+    The generation is the counter stored in the header of the index.
+    It is bumped by the ThekeIndexBuilder each time the index is rebuilt.
+    """
+    def __init__(self, con) -> None:
+        logger.debug("IndexMetadata - Load metadata from the index")
+
+        rawGeneration = con.execute("""SELECT value
+            FROM header
+            WHERE key='generation';""").fetchone()
+        self.generation = 0 if rawGeneration is None else int(rawGeneration[0])
+
+        # name --> id_document
+        self.documentIds = {name: documentId for documentId, name in con.execute("""SELECT id_document, name
+            FROM documentNaming;""")}
+
+        # id_document --> type
+        self.documentTypes = dict(con.execute("""SELECT id, type
+            FROM documents;"""))
+
+        # id_document --> {'names': [...], 'shortnames': [...]}
+        self.biblicalBookNames = {}
+        for documentId, name, isShortName in con.execute("""SELECT id_document, name, isShortName
+                FROM biblicalBookNames;"""):
+            names = self.biblicalBookNames.setdefault(documentId, {'names': [], 'shortnames': []})
+            names['shortnames' if isShortName else 'names'].append(name)
+
+        # id_document --> (nbOfChapters, testament)
+        self.biblicalBookData = {documentId: (nbOfChapters, testament) for documentId, nbOfChapters, testament in con.execute("""SELECT id_document, nbOfChapters, testament
+            FROM biblicalBookData;""")}
+
+        # id_document --> {'names': [...], 'shortnames': [...]}
+        self.documentNames = {}
+        for documentId, name, abbreviation in con.execute("""SELECT id_document, name, abbreviation
+                FROM documentNames;"""):
+            names = self.documentNames.setdefault(documentId, {'names': [], 'shortnames': []})
+            names['names'].append(name)
+            if abbreviation != "":
+                names['shortnames'].append(abbreviation)
+
+        # source name --> SourceData
+        self.sources = {}
+        # source name --> version
+        self.sourceVersions = {}
+        # id_source --> source name
+        sourceNames = {}
+
+        for sourceId, version, *rawSourceData in con.execute("""SELECT sources.id, sources.version, sources.name, sources.type, sources.contentType, sources.lang, sourceDescriptions.description
+                FROM sources
+                LEFT JOIN sourceDescriptions ON sources.id = sourceDescriptions.id_source;"""):
+            sourceData = SourceData._make(rawSourceData)
+            self.sources[sourceData.name] = sourceData
+            self.sourceVersions[sourceData.name] = version
+            sourceNames[sourceId] = sourceData.name
+
+        # id_document --> [SourceData, ...]
+        self.documentSources = {}
+        for documentId, sourceId in con.execute("""SELECT id_document, id_source
+                FROM link_document_source;"""):
+            if sourceId in sourceNames:
+                self.documentSources.setdefault(documentId, []).append(self.sources[sourceNames[sourceId]])
+
 class ThekeIndex:
     """Helper to use the index of Theke
+
+    Connections are shared by all instances through a pool (see theke.connectionPool):
+    the index can be read from any thread.
     """
-    def __init__(self) -> None:
+    def __init__(self, path = INDEX_PATH, writable = False) -> None:
+        """
+        @param writable: if True, queries go through the writer connection (see ThekeIndexBuilder),
+            otherwise through the read only connection of the current thread
+        """
         logger.debug("ThekeIndex - Create a new instance")
-        logger.debug("ThekeIndex - Connect to the database: %s", INDEX_PATH)
-        self.con = sqlite3.connect(INDEX_PATH)
+        self._pool = theke.connectionPool.get_pool(path, INDEX_PRAGMAS)
+        self._writable = writable
+
+        # True while commits are grouped into a single transaction (see transaction())
+        self._isInTransaction = False
+
+    @property
+    def con(self) -> sqlite3.Connection:
+        """Return the connection to use from the current thread
+        """
+        return self._pool.get_writer() if self._writable else self._pool.get_reader()
+
+    def get_writer_lock(self):
+        """Return the lock serializing writes to the index
+        """
+        return self._pool.get_writer_lock()
+
+    @property
+    def metadata(self) -> IndexMetadata:
+        """Return the in-memory metadata of the index (load them if needed)
+        """
+        global _metadata
+
+        with _metadataLock:
+            if _metadata is None:
+                _metadata = IndexMetadata(self.con)
+
+            return _metadata
+
+    def reload_metadata(self) -> None:
+        """Reload the in-memory metadata of the index from the database
+        """
+        global _metadata
+
+        with _metadataLock:
+            _metadata = IndexMetadata(self.con)
+
+    def get_generation(self) -> int:
+        """Return the generation of the index metadata
+        """
+        return self.metadata.generation
 
     def execute(self, sql, parameters = ()) -> Cursor:
         """Execute a sql query
@@ -47,9 +185,35 @@ class ThekeIndex:
 
         return cur.lastrowid
 
+    def executemany(self, sql, seqOfParameters) -> Cursor:
+        """Execute a sql query against all parameter sequences
+        """
+
+        return self.con.executemany(sql, seqOfParameters)
+
     def commit(self) -> None:
-        """Commit modifications
+        """Commit modifications (unless they are grouped into a transaction, see transaction())
         """
+        if not self._isInTransaction:
+            self.con.commit()
+
+    @contextmanager
+    def transaction(self):
+        """Group modifications done in the block into a single transaction
+
+        Readers see all of them once the block ends, or none of them if it fails.
+        """
+        self._isInTransaction = True
+
+        try:
+            yield
+
+        except BaseException:
+            self._isInTransaction = False
+            self.con.rollback()
+            raise
+
+        self._isInTransaction = False
         self.con.commit()
 
     def get_from_header(self, key, default = None) -> str:
@@ -81,73 +245,48 @@ class ThekeIndex:
         """
 
         bookId = self.get_document_id(bookName)
-        rawNames = self.con.execute("""SELECT name, isShortName
-            FROM biblicalBookNames
-            WHERE id_document=?;""",
-            (bookId,)).fetchall()
+        names = self.metadata.biblicalBookNames.get(bookId, {'names': [], 'shortnames': []})
 
-        return {'names': [n[0] for n in rawNames if not n[1]],
-                'shortnames': [n[0] for n in rawNames if n[1]]}
+        return {'names': list(names['names']),
+                'shortnames': list(names['shortnames'])}
 
     def get_biblical_book_nbOfChapters(self, documentName) -> int:
         """Return the number of chapters in the biblical book given its name
         """
 
-        rawNbOfChapters = self.con.execute("""SELECT nbOfChapters
-            FROM biblicalBookData
-            INNER JOIN documentNaming ON biblicalBookData.id_document = documentNaming.id_document
-            WHERE documentNaming.name=?;""",
-            (documentName,)).fetchone()
+        bookData = self.metadata.biblicalBookData.get(self.get_document_id(documentName), None)
 
-        return -1 if rawNbOfChapters is None else rawNbOfChapters[0]
+        return -1 if bookData is None else bookData[0]
     
     def get_biblical_book_testament(self, documentName) -> int:
         """Return the testamet id of a biblical book given its name
         """
 
-        rawTestament = self.con.execute("""SELECT testament
-            FROM biblicalBookData
-            INNER JOIN documentNaming ON biblicalBookData.id_document = documentNaming.id_document
-            WHERE documentNaming.name=?;""",
-            (documentName,)).fetchone()
+        bookData = self.metadata.biblicalBookData.get(self.get_document_id(documentName), None)
 
-        return -1 if rawTestament is None else rawTestament[0]
+        return -1 if bookData is None else bookData[1]
 
     def get_document_id(self, documentName) -> int:
         """Return the id of document given its name
         """
 
-        rawId = self.con.execute("""SELECT id_document
-            FROM documentNaming
-            WHERE name=?;""",
-            (documentName,)).fetchone()
-
-        return -1 if rawId is None else rawId[0]
+        return self.metadata.documentIds.get(documentName, -1)
 
     def get_document_names(self, documentName) -> Any:
         """From a name of a document, return all other names
         """
 
         documentId = self.get_document_id(documentName)
-        rawNames = self.con.execute("""SELECT name, abbreviation
-            FROM documentNames
-            WHERE id_document=?;""",
-            (documentId,)).fetchall()
+        names = self.metadata.documentNames.get(documentId, {'names': [], 'shortnames': []})
 
-        return {'names': [n[0] for n in rawNames],
-                'shortnames': [n[1] for n in rawNames if n[1] != ""]}
+        return {'names': list(names['names']),
+                'shortnames': list(names['shortnames'])}
 
     def get_document_type(self, documentName) -> int:
         """Return the type of a document given its name
         """
 
-        rawTypes = self.con.execute("""SELECT type
-            FROM documents
-            INNER JOIN documentNaming ON documents.id = documentNaming.id_document
-            WHERE documentNaming.name=?;""",
-            (documentName,)).fetchone()
-
-        return -1 if rawTypes is None else rawTypes[0]
+        return self.metadata.documentTypes.get(self.get_document_id(documentName), -1)
 
     def get_edition_id(self, editionName) -> int:
         """Return the id of an edition given its name
@@ -164,24 +303,13 @@ class ThekeIndex:
         """Return all data about a source
         """
 
-        rawSourceData = self.con.execute("""SELECT sources.name, sources.type, sources.contentType, sources.lang, sourceDescriptions.description
-            FROM sources
-            LEFT JOIN sourceDescriptions ON sources.id = sourceDescriptions.id_source
-            WHERE sources.name =?;""",
-            (sourceName,)).fetchone()
-
-        return SourceData._make(rawSourceData)
+        return self.metadata.sources[sourceName]
 
     def get_source_version(self, sourceName) -> str:
         """Return the version a source
         """
 
-        rawVersion = self.con.execute("""SELECT version
-            FROM sources
-            WHERE name=?;""",
-            (sourceName,)).fetchone()
-
-        return '0' if rawVersion is None else rawVersion[0]
+        return self.metadata.sourceVersions.get(sourceName, '0')
 
     def get_source_type(self, sourceName) -> str:
         """Return the type of a source
@@ -286,28 +414,368 @@ class ThekeIndex:
 
         documentId = self.get_document_id(documentName)
 
-        rawSourcesData = self.con.execute("""SELECT sources.name, sources.type, sources.contentType, sources.lang, sourceDescriptions.description
-            FROM sources
-            LEFT JOIN sourceDescriptions ON sources.id = sourceDescriptions.id_source
-            INNER JOIN link_document_source ON link_document_source.id_source = sources.id
-            WHERE link_document_source.id_document = ?;""",
-            (documentId,)).fetchall()
+        for sourceData in self.metadata.documentSources.get(documentId, []):
+            yield sourceData
 
-        for rawSourceData in rawSourcesData:
-            yield SourceData._make(rawSourceData)
+    ### Sections of external documents
+
+    def get_document_sections_hash(self, sourceName) -> str:
+        """Return the cleaning hash of the document the sections of a source were extracted from
+        """
+
+        rawHash = self.con.execute("""SELECT documentSectionsHashes.hash
+            FROM documentSectionsHashes
+            INNER JOIN sources ON sources.id = documentSectionsHashes.id_source
+            WHERE sources.name=?;""",
+            (sourceName,)).fetchone()
+
+        return None if rawHash is None else rawHash[0]
+
+    def set_document_sections(self, sourceName, sections, cleaningHash, timeout = -1) -> bool:
+        """Replace the sections (headings and numbered anchors) of the document of a source
+
+        @param sections: list of DocumentSectionData, in the order of the document
+        @param cleaningHash: hash of the clean document the sections were extracted from
+        @param timeout: maximal time (in seconds) to wait for the index to be writable (TimeoutError is raised)
+        @return: False if the source is not indexed
+        """
+
+        with self._pool.writer(timeout) as con:
+            rawId = con.execute("""SELECT id
+                FROM sources
+                WHERE name=?;""",
+                (sourceName,)).fetchone()
+
+            if rawId is None:
+                return False
+
+            sourceId = rawId[0]
+
+            con.execute("""DELETE FROM documentSections WHERE id_source=?;""", (sourceId,))
+            con.executemany("""INSERT OR IGNORE INTO documentSections (id_source, position, level, anchor, label, chunk)
+                VALUES(?, ?, ?, ?, ?, ?);""",
+                ((sourceId, position, section.level, section.anchor, section.label, section.chunk)
+                    for position, section in enumerate(sections)))
+            con.execute("""INSERT OR REPLACE INTO documentSectionsHashes (id_source, hash)
+                VALUES(?, ?);""",
+                (sourceId, cleaningHash))
+
+        return True
+
+    def list_document_sections(self, sourceName, minLevel = 1):
+        """List the sections of the document of a source, in the order of the document
+
+        @param minLevel: 1 to list headings only, 0 to also list numbered anchors
+        """
+
+        rawSectionsData = self.con.execute("""SELECT documentSections.anchor, documentSections.label, documentSections.level, documentSections.chunk
+            FROM documentSections
+            INNER JOIN sources ON sources.id = documentSections.id_source
+            WHERE sources.name=? AND documentSections.level>=?
+            ORDER BY documentSections.position;""",
+            (sourceName, minLevel))
+
+        for rawSectionData in rawSectionsData:
+            yield DocumentSectionData._make(rawSectionData)
+
+    def get_document_section(self, sourceName, anchor) -> DocumentSectionData:
+        """Return a section of the document of a source given its anchor (or None)
+        """
+
+        rawSectionData = self.con.execute("""SELECT documentSections.anchor, documentSections.label, documentSections.level, documentSections.chunk
+            FROM documentSections
+            INNER JOIN sources ON sources.id = documentSections.id_source
+            WHERE sources.name=? AND documentSections.anchor=?;""",
+            (sourceName, anchor)).fetchone()
+
+        return None if rawSectionData is None else DocumentSectionData._make(rawSectionData)
+
+    def get_document_section_heading(self, sourceName, anchor) -> str:
+        """Return the anchor of the heading containing a section (or None)
+        """
+
+        rawAnchor = self.con.execute("""SELECT heading.anchor
+            FROM documentSections AS heading
+            INNER JOIN documentSections AS section ON section.id_source = heading.id_source
+            INNER JOIN sources ON sources.id = section.id_source
+            WHERE sources.name=? AND section.anchor=? AND heading.level>0 AND heading.position<=section.position
+            ORDER BY heading.position DESC
+            LIMIT 1;""",
+            (sourceName, anchor)).fetchone()
+
+        return None if rawAnchor is None else rawAnchor[0]
+
+    ### Nodes of sword general books
+
+    def get_book_node(self, sourceName, section) -> BookNodeData:
+        """Return a node of a sword general book given its path or its name (or None)
+
+        If several nodes have this name (eg. a paragraph number), the first one is returned.
+        """
+
+        rawNodeData = self.con.execute("""SELECT bookNodes.position, bookNodes.offset, bookNodes.parentOffset, bookNodes.previousOffset,
+                bookNodes.nextOffset, bookNodes.depth, bookNodes.name, bookNodes.path, bookNodes.lastPosition
+            FROM bookNodes
+            INNER JOIN sources ON sources.id = bookNodes.id_source
+            WHERE sources.name=? AND (bookNodes.path=? OR bookNodes.name=?)
+            ORDER BY bookNodes.path=? DESC, bookNodes.position
+            LIMIT 1;""",
+            (sourceName, section, section, section)).fetchone()
+
+        return None if rawNodeData is None else BookNodeData._make(rawNodeData)
+
+    def get_book_node_by_offset(self, sourceName, offset) -> BookNodeData:
+        """Return a node of a sword general book given its offset in the tree (or None)
+        """
+
+        rawNodeData = self.con.execute("""SELECT bookNodes.position, bookNodes.offset, bookNodes.parentOffset, bookNodes.previousOffset,
+                bookNodes.nextOffset, bookNodes.depth, bookNodes.name, bookNodes.path, bookNodes.lastPosition
+            FROM bookNodes
+            INNER JOIN sources ON sources.id = bookNodes.id_source
+            WHERE sources.name=? AND bookNodes.offset=?;""",
+            (sourceName, offset)).fetchone()
+
+        return None if rawNodeData is None else BookNodeData._make(rawNodeData)
+
+    def get_book_first_leaf(self, sourceName) -> BookNodeData:
+        """Return the first node without children of a sword general book (or None)
+        """
+
+        rawNodeData = self.con.execute("""SELECT bookNodes.position, bookNodes.offset, bookNodes.parentOffset, bookNodes.previousOffset,
+                bookNodes.nextOffset, bookNodes.depth, bookNodes.name, bookNodes.path, bookNodes.lastPosition
+            FROM bookNodes
+            INNER JOIN sources ON sources.id = bookNodes.id_source
+            WHERE sources.name=? AND bookNodes.lastPosition=bookNodes.position
+            ORDER BY bookNodes.position
+            LIMIT 1;""",
+            (sourceName,)).fetchone()
+
+        return None if rawNodeData is None else BookNodeData._make(rawNodeData)
+
+    def list_book_nodes(self, sourceName, firstPosition, lastPosition):
+        """List nodes of a sword general book between two positions (included), in the order of the book
+        """
+
+        rawNodesData = self.con.execute("""SELECT bookNodes.position, bookNodes.offset, bookNodes.parentOffset, bookNodes.previousOffset,
+                bookNodes.nextOffset, bookNodes.depth, bookNodes.name, bookNodes.path, bookNodes.lastPosition
+            FROM bookNodes
+            INNER JOIN sources ON sources.id = bookNodes.id_source
+            WHERE sources.name=? AND bookNodes.position BETWEEN ? AND ?
+            ORDER BY bookNodes.position;""",
+            (sourceName, firstPosition, lastPosition))
+
+        for rawNodeData in rawNodesData:
+            yield BookNodeData._make(rawNodeData)
+
+### Migrations of the index schema
+
+def _migrate_to_v0_5(index) -> None:
+    """Add indexes and unique constraints
+
+    Duplicated rows (which the previous schema could not prevent) are removed first.
+    """
+    # Header: one value by key
+    index.execute("""DELETE FROM header WHERE rowid NOT IN (
+        SELECT MAX(rowid) FROM header GROUP BY key);""")
+    index.execute("""CREATE UNIQUE INDEX IF NOT EXISTS header_key
+        ON header (key);""")
+
+    # Documents naming (covering index for lookups by name)
+    index.execute("""CREATE INDEX IF NOT EXISTS documentNaming_name
+        ON documentNaming (name, id_document);""")
+
+    # Document names and descriptions
+    index.execute("""CREATE INDEX IF NOT EXISTS documentNames_id_document
+        ON documentNames (id_document, name, abbreviation);""")
+
+    index.execute("""DELETE FROM documentDescriptions WHERE rowid NOT IN (
+        SELECT MIN(rowid) FROM documentDescriptions GROUP BY id_document, description, lang);""")
+    index.execute("""CREATE UNIQUE INDEX IF NOT EXISTS documentDescriptions_unique
+        ON documentDescriptions (id_document, description, lang);""")
+
+    # Biblical books
+    index.execute("""CREATE INDEX IF NOT EXISTS biblicalBookNames_id_document
+        ON biblicalBookNames (id_document, name, isShortName);""")
+
+    index.execute("""DELETE FROM biblicalBookData WHERE rowid NOT IN (
+        SELECT MIN(rowid) FROM biblicalBookData GROUP BY id_document);""")
+    index.execute("""CREATE UNIQUE INDEX IF NOT EXISTS biblicalBookData_id_document
+        ON biblicalBookData (id_document);""")
+
+    # Sources (sources.name is already indexed by its UNIQUE constraint)
+    index.execute("""DELETE FROM sourceDescriptions WHERE rowid NOT IN (
+        SELECT MAX(rowid) FROM sourceDescriptions GROUP BY id_source, lang);""")
+    index.execute("""CREATE UNIQUE INDEX IF NOT EXISTS sourceDescriptions_unique
+        ON sourceDescriptions (id_source, lang);""")
+
+    # Links between documents and sources
+    index.execute("""DELETE FROM link_document_source WHERE rowid NOT IN (
+        SELECT MIN(rowid) FROM link_document_source GROUP BY id_document, id_source);""")
+    index.execute("""CREATE UNIQUE INDEX IF NOT EXISTS link_document_source_unique
+        ON link_document_source (id_document, id_source);""")
+    index.execute("""CREATE INDEX IF NOT EXISTS link_document_source_id_source
+        ON link_document_source (id_source, id_document);""")
+
+def _migrate_to_v0_6(index) -> None:
+    """Add tables of the sections of external documents (filled when they are cleaned)
+    """
+    index.execute("""CREATE TABLE IF NOT EXISTS documentSections (
+        id_source integer NOT NULL,
+        position integer NOT NULL,
+        level integer NOT NULL,
+        anchor text NOT NULL,
+        label text NOT NULL,
+        chunk integer,
+        FOREIGN KEY(id_source) REFERENCES sources(id) ON DELETE CASCADE
+        );""")
+    index.execute("""CREATE UNIQUE INDEX IF NOT EXISTS documentSections_anchor
+        ON documentSections (id_source, anchor);""")
+    index.execute("""CREATE INDEX IF NOT EXISTS documentSections_position
+        ON documentSections (id_source, position, level);""")
+
+    index.execute("""CREATE TABLE IF NOT EXISTS documentSectionsHashes (
+        id_source integer PRIMARY KEY,
+        hash text NOT NULL,
+        FOREIGN KEY(id_source) REFERENCES sources(id) ON DELETE CASCADE
+        );""")
+
+def _migrate_to_v0_7(index) -> None:
+    """Add the table of the nodes of sword general books
+
+    General books already indexed have to be indexed again to fill it.
+    """
+    index.execute("""CREATE TABLE IF NOT EXISTS bookNodes (
+        id_source integer NOT NULL,
+        position integer NOT NULL,
+        offset integer NOT NULL,
+        parentOffset integer,
+        previousOffset integer,
+        nextOffset integer,
+        depth integer NOT NULL,
+        name text NOT NULL,
+        path text NOT NULL,
+        lastPosition integer NOT NULL,
+        FOREIGN KEY(id_source) REFERENCES sources(id) ON DELETE CASCADE
+        );""")
+    index.execute("""CREATE UNIQUE INDEX IF NOT EXISTS bookNodes_position
+        ON bookNodes (id_source, position);""")
+    index.execute("""CREATE INDEX IF NOT EXISTS bookNodes_offset
+        ON bookNodes (id_source, offset);""")
+    index.execute("""CREATE INDEX IF NOT EXISTS bookNodes_path
+        ON bookNodes (id_source, path);""")
+    index.execute("""CREATE INDEX IF NOT EXISTS bookNodes_name
+        ON bookNodes (id_source, name, position);""")
+
+    index.execute("""UPDATE sources SET version = '0' WHERE type=? AND contentType=?;""",
+        (SOURCETYPE_SWORD, theke.sword.MODTYPE_GENBOOKS))
+
+def _migrate_to_v0_8(index) -> None:
+    """Add the table of fingerprints of files defining sources
+    (configurations of sword modules, definitions of external sources)
+    """
+    index.execute("""CREATE TABLE IF NOT EXISTS fingerprints (
+        path text PRIMARY KEY,
+        sourceType text NOT NULL,
+        sourceName text NOT NULL,
+        mtime integer NOT NULL,
+        size integer NOT NULL,
+        hash text NOT NULL
+        );""")
+
+# (api version, migration) sorted by api version
+SCHEMA_MIGRATIONS = (
+    ("0.5", _migrate_to_v0_5),
+    ("0.6", _migrate_to_v0_6),
+    ("0.7", _migrate_to_v0_7),
+    ("0.8", _migrate_to_v0_8),
+)
+
+def _hash_file(path) -> str:
+    fileHash = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            fileHash.update(block)
+
+    return fileHash.hexdigest()
+
+def list_source_files():
+    """List files defining sources: configurations of sword modules and definitions of external sources
+
+    @return: iterator of (path, sourceType, os.stat_result)
+    """
+    for configDir in theke.sword.get_config_dirs():
+        for entry in os.scandir(configDir):
+            if entry.name.endswith('.conf') and entry.is_file():
+                yield entry.path, SOURCETYPE_SWORD, entry.stat()
+
+    if os.path.isdir(theke.PATH_EXTERNAL):
+        for entry in os.scandir(theke.PATH_EXTERNAL):
+            if entry.name.endswith('.yaml') and entry.is_file():
+                yield entry.path, SOURCETYPE_EXTERN, entry.stat()
+
+### Scan of sword modules
+#   Those functions can be run in a separate process.
+
+def scan_sword_biblical_module(moduleName, swordLibrary = None) -> Any:
+    """Return names of biblical books available in a sword module
+
+    @param swordLibrary: SwordLibrary to read the module from
+        (default: the shared one, created after the start of a worker process)
+    @return: (moduleName, list of book names, duration of the scan in seconds)
+    """
+    start = time.perf_counter()
+
+    mod = (swordLibrary or theke.sword.get_library()).get_module(moduleName)
+    vk = Sword.VerseKey()
+    bookNames = []
+
+    with mod.library.lock:
+        for itestament in [theke.BIBLE_OT, theke.BIBLE_NT]:
+            vk.setTestament(itestament)
+
+            for ibook in range(1, vk.getBookMax() +1):
+                vk.setBook(ibook)
+                if mod.has_entry(vk):
+                    bookNames.append(str(vk.getBookName()))
+
+    return moduleName, bookNames, time.perf_counter() - start
 
 class ThekeIndexBuilder:
     """Helper the build the index of Theke
     """
-    def __init__(self) -> None:
+    def __init__(self, path = INDEX_PATH, swordLibrary = None, privateSwordLibrary = False) -> None:
+        """
+        @param swordLibrary: SwordLibrary used to read sword modules (default: the shared one, see theke.sword.get_library())
+        @param privateSwordLibrary: if True and no swordLibrary is given, a new SwordLibrary is created on demand
+            (eg. to index from another thread, or to see newly installed modules)
+        """
         logger.debug("ThekeIndexBuilder - Create a new instance")
-        self.index = ThekeIndex()
+        self.index = ThekeIndex(path, writable = True)
+        self._swordLibrary = swordLibrary
+        self._privateSwordLibrary = privateSwordLibrary
 
-        currentApiVersion = self.index.get_api_version()
+        # True if the index was modified during the build
+        self._hasChanged = False
 
-        if currentApiVersion >= NEEDED_API_VERSION:
-            return
+        with self.index.get_writer_lock():
+            currentApiVersion = self.index.get_api_version()
+
+            if currentApiVersion >= NEEDED_API_VERSION:
+                return
+
+            if currentApiVersion < "0.4":
+                self.init_schema()
+
+            self.migrate_schema()
 
+    ### Index schema
+
+    def init_schema(self) -> None:
+        """Initiate the database from scratch (schema of the API version 0.4)
+
+        Newer versions of the schema are reached through migrations (see migrate_schema()).
+        """
         logger.debug("ThekeIndexBuilder - Initiate the database from scratch")
 
         # Header
@@ -318,7 +786,7 @@ class ThekeIndexBuilder:
             );""")
 
         self.index.execute("""INSERT INTO header (key, value) VALUES(?, ?);""",
-            ("api_version", NEEDED_API_VERSION))
+            ("api_version", "0.4"))
 
         self.index.commit()
 
@@ -400,45 +868,316 @@ class ThekeIndexBuilder:
             FOREIGN KEY(id_source) REFERENCES sources(id) ON DELETE CASCADE
             );""")
 
+        self.index.commit()
+
+    def migrate_schema(self) -> None:
+        """Upgrade the schema of the index in place, one API version after the other
+        """
+        for apiVersion, migration in SCHEMA_MIGRATIONS:
+            if self.index.get_api_version() < apiVersion:
+                logger.debug("ThekeIndexBuilder - Migrate the index to the API version %s", apiVersion)
+
+                migration(self.index)
+                self.index.execute("""UPDATE header SET value = ? WHERE key = 'api_version';""",
+                    (apiVersion,))
+                self.index.commit()
+
     ### Index building
 
-    def build(self, force = False) -> None:
+    def get_sword_library(self):
+        """Return the sword library used to read sword modules
+        (created on demand: it scans every installed module)
+        """
+        if self._swordLibrary is None:
+            self._swordLibrary = theke.sword.SwordLibrary() if self._privateSwordLibrary else theke.sword.get_library()
+
+        return self._swordLibrary
+
+    def build(self, force = False, jobs = None, progress = None) -> dict:
         """Build the index.
+
+        Only sources whose files changed since the last build are indexed
+        (see detect_source_changes()), unless force is True.
+
+        The new generation of the index is written in a single transaction:
+        meanwhile, readers see the previous one.
+
+        @param jobs: (int) number of processes scanning sword modules (default: number of CPUs)
+        @param progress: function called after each indexed source, taking three arguments
+            nbOfIndexedSources (int), nbOfSources (int), sourceName (str)
+        @return: timing summary (durations in seconds) and names of removed sources
+        """
+        with self.index.get_writer_lock():
+            with self.index.transaction():
+                summary = self._build(force, jobs, progress)
+
+            if self._hasChanged:
+                self.index.reload_metadata()
+
+            return summary
+
+    def _build(self, force, jobs, progress) -> dict:
+        start = time.perf_counter()
+
+        changes = self.detect_source_changes()
+        updatedSources = {sourceType: {sourceName: isKnown for (updatedSourceType, sourceName), isKnown in changes['updated'].items()
+            if updatedSourceType == sourceType} for sourceType in (SOURCETYPE_SWORD, SOURCETYPE_EXTERN)}
+
+        if updatedSources[SOURCETYPE_SWORD] and self._swordLibrary is None:
+            # Sword libraries created before modules were installed or updated do not see them
+            self._privateSwordLibrary = True
+
+        summary = {
+            'sword': self.index_sword_modules(force, jobs, progress, None if force else updatedSources[SOURCETYPE_SWORD])
+                if force or updatedSources[SOURCETYPE_SWORD] else {},
+            'external': self.index_external_sources(force, None if force else updatedSources[SOURCETYPE_EXTERN])
+                if force or updatedSources[SOURCETYPE_EXTERN] else {},
+            'removed': [],
+        }
+
+        for sourceType, sourceName in changes['removed']:
+            self.remove_source(sourceName)
+            summary['removed'].append(sourceName)
+
+        self.save_fingerprints(changes)
+
+        if self._hasChanged:
+            self.bump_generation()
+
+        summary['total'] = time.perf_counter() - start
+        return summary
+
+    def detect_source_changes(self) -> dict:
+        """Compare files defining sources with their fingerprints saved at the last build
+
+        Files are only stat-ed: a file is read (and hashed) only if its size or its mtime changed.
+
+        @return: dict with keys
+            'updated': (sourceType, sourceName) --> True if the source was known (its file changed),
+                False if it is a new file,
+            'removed': set of (sourceType, sourceName) of sources whose files were removed,
+            'fingerprints': list of FileFingerprint to save,
+            'obsolete': list of paths of removed files
+        """
+        knownFingerprints = {rawFingerprint[0]: FileFingerprint._make(rawFingerprint) for rawFingerprint in self.index.execute("""SELECT path, sourceType, sourceName, mtime, size, hash
+            FROM fingerprints;""")}
+
+        changes = {'updated': {}, 'removed': set(), 'fingerprints': [], 'obsolete': []}
+        currentSources = set()
+
+        for path, sourceType, stat in list_source_files():
+            knownFingerprint = knownFingerprints.pop(path, None)
+
+            if knownFingerprint is not None and knownFingerprint.mtime == stat.st_mtime_ns and knownFingerprint.size == stat.st_size:
+                currentSources.add((sourceType, knownFingerprint.sourceName))
+                continue
+
+            if sourceType == SOURCETYPE_SWORD:
+                sourceName = theke.sword.read_config_module_name(path)
+            else:
+                sourceName = os.path.basename(path)[:-5]
+
+            if sourceName is None:
+                continue
+
+            fileHash = _hash_file(path)
+            currentSources.add((sourceType, sourceName))
+            changes['fingerprints'].append(FileFingerprint(path, sourceType, sourceName, stat.st_mtime_ns, stat.st_size, fileHash))
+
+            if knownFingerprint is None:
+                changes['updated'].setdefault((sourceType, sourceName), False)
+
+            elif knownFingerprint.hash != fileHash or knownFingerprint.sourceName != sourceName:
+                changes['updated'][(sourceType, sourceName)] = True
+
+        # Remaining known fingerprints are those of removed files
+        for knownFingerprint in knownFingerprints.values():
+            changes['obsolete'].append(knownFingerprint.path)
+
+            if (knownFingerprint.sourceType, knownFingerprint.sourceName) not in currentSources:
+                changes['removed'].add((knownFingerprint.sourceType, knownFingerprint.sourceName))
+
+        return changes
+
+    def save_fingerprints(self, changes) -> None:
+        """Save fingerprints of files defining sources (see detect_source_changes())
+
+        Fingerprints of sources which are not in the index (eg. a module sword could not read)
+        are not saved, so that they are indexed again at the next build.
         """
-        self.index_sword_modules(force)
-        self.index_external_sources(force)
+        indexedSourceNames = {sourceName for sourceName, in self.index.execute("""SELECT name FROM sources;""")}
 
-    def index_sword_modules(self, force = False) -> None:
+        self.index.executemany("""DELETE FROM fingerprints WHERE path=?;""",
+            ((path,) for path in changes['obsolete']))
+        self.index.executemany("""INSERT OR REPLACE INTO fingerprints (path, sourceType, sourceName, mtime, size, hash)
+            VALUES(?, ?, ?, ?, ?, ?);""",
+            (fingerprint for fingerprint in changes['fingerprints'] if fingerprint.sourceName in indexedSourceNames))
+        self.index.commit()
+
+    def remove_source(self, sourceName) -> None:
+        """Remove a source from the index, with documents which are not found in other sources
+        """
+        rawId = self.index.execute("""SELECT id
+            FROM sources
+            WHERE name=?;""",
+            (sourceName,)).fetchone()
+
+        if rawId is None:
+            return
+
+        logger.debug("ThekeIndexBuilder - Remove the source %s", sourceName)
+        self._hasChanged = True
+
+        sourceId = rawId[0]
+        documentIds = [documentId for documentId, in self.index.execute("""SELECT id_document
+            FROM link_document_source
+            WHERE id_source=?;""",
+            (sourceId,))]
+
+        for table in ('link_document_source', 'sourceDescriptions', 'bookNodes', 'documentSections', 'documentSectionsHashes'):
+            self.index.execute("""DELETE FROM {} WHERE id_source=?;""".format(table), (sourceId,))
+
+        self.index.execute("""DELETE FROM sources WHERE id=?;""", (sourceId,))
+
+        # Biblical books are kept: they are known even if no source contains them
+        for documentId in documentIds:
+            isOrphan = self.index.execute("""SELECT NOT EXISTS (SELECT 1 FROM link_document_source WHERE id_document=?)
+                AND NOT EXISTS (SELECT 1 FROM documents WHERE id=? AND type=?);""",
+                (documentId, documentId, theke.TYPE_BIBLE)).fetchone()[0]
+
+            if isOrphan:
+                for table in ('documentNaming', 'documentNames', 'documentDescriptions'):
+                    self.index.execute("""DELETE FROM {} WHERE id_document=?;""".format(table), (documentId,))
+
+                self.index.execute("""DELETE FROM documents WHERE id=?;""", (documentId,))
+
+        self.index.commit()
+
+    def bump_generation(self) -> None:
+        """Bump the generation of the index
+
+        Its in-memory metadata should then be reloaded, once the generation is committed.
+        """
+        generation = int(self.index.get_from_header('generation', 0)) + 1
+        logger.debug("ThekeIndexBuilder - Bump the generation of the index to %d", generation)
+
+        self.index.execute("""DELETE FROM header WHERE key='generation';""")
+        self.index.execute("""INSERT INTO header (key, value) VALUES(?, ?);""",
+            ("generation", str(generation)))
+        self.index.commit()
+
+    def index_sword_modules(self, force = False, jobs = None, progress = None, moduleNames = None) -> dict:
         """Index sword modules.
+
+        Biblical modules are scanned concurrently in a pool of processes,
+        then written to the index (see build()).
+
+        @param moduleNames: (dict) if given, only look at those modules:
+            moduleName --> True to index it even if its version did not change
+        @return: duration of the indexing of each module (in seconds)
         """
         logger.debug("ThekeIndexBuilder − Index sword modules")
-        swordLibrary = theke.sword.SwordLibrary()
+        swordLibrary = self.get_sword_library()
 
         self.index_sword_biblical_book_names()
 
-        # Index each sword module
-        for moduleName, mod in swordLibrary.get_modules():
-            if force or (mod.get_version() > self.index.get_source_version(moduleName)):
-                self.index_sword_module(mod)
+        # List modules to index
+        if moduleNames is None:
+            modules = {moduleName: mod for moduleName, mod in swordLibrary.get_modules()
+                if force or (mod.get_version() > self.get_source_version(moduleName))}
+
+        else:
+            modules = {}
+            for moduleName, isUpdated in moduleNames.items():
+                try:
+                    mod = swordLibrary.get_module(moduleName)
+                except ValueError:
+                    logger.debug("ThekeIndexBuilder − Unknown module: %s", moduleName)
+                    continue
+
+                if force or isUpdated or (mod.get_version() > self.get_source_version(moduleName)):
+                    modules[moduleName] = mod
+
+        timings = {}
+
+        def index_module(moduleName, bookNames = None, scanDuration = 0) -> None:
+            start = time.perf_counter()
+            self.index_sword_module(modules[moduleName], bookNames)
+            timings[moduleName] = scanDuration + time.perf_counter() - start
+
+            if progress is not None:
+                progress(len(timings), len(modules), moduleName)
 
-    def index_external_sources(self, force = False) -> None:
+        # Index modules which do not need to be scanned
+        for moduleName, mod in modules.items():
+            if mod.get_type() != theke.sword.MODTYPE_BIBLES:
+                index_module(moduleName)
+
+        # Scan biblical modules and index them
+        biblicalModuleNames = [moduleName for moduleName, mod in modules.items()
+            if mod.get_type() == theke.sword.MODTYPE_BIBLES]
+
+        for moduleName, bookNames, scanDuration in self._scan_sword_biblical_modules(biblicalModuleNames, jobs):
+            index_module(moduleName, bookNames, scanDuration)
+
+        return timings
+
+    def _scan_sword_biblical_modules(self, moduleNames, jobs = None):
+        """Scan biblical modules, if possible in a pool of processes
+
+        Yield results of scan_sword_biblical_module() as soon as they are available.
+        """
+        jobs = min(jobs or os.cpu_count() or 1, len(moduleNames))
+
+        if jobs <= 1:
+            # The shared library may have been created before modules were installed
+            for moduleName in moduleNames:
+                yield scan_sword_biblical_module(moduleName, self.get_sword_library())
+            return
+
+        logger.debug("ThekeIndexBuilder − Scan %d biblical modules with %d processes", len(moduleNames), jobs)
+
+        # Do not fork: the parent process may hold sword managers and gtk stuff
+        with ProcessPoolExecutor(max_workers = jobs, mp_context = multiprocessing.get_context('spawn')) as executor:
+            # Workers are new processes: their sword libraries see every installed module
+            futures = [executor.submit(scan_sword_biblical_module, moduleName) for moduleName in moduleNames]
+
+            for future in as_completed(futures):
+                yield future.result()
+
+    def index_external_sources(self, force = False, sourceNames = None) -> dict:
         """Index external sources
+
+        @param sourceNames: (dict) if given, only look at those sources:
+            sourceName --> True to index it even if its version did not change
+        @return: duration of the indexing of each external source (in seconds)
         """
         logger.debug("ThekeIndexBuilder − Index external sources")
+        timings = {}
 
-        for externalFilename in os.listdir(theke.PATH_EXTERNAL):
-            if externalFilename.endswith('.yaml'):
-                externalSourceName = externalFilename[:-5]
-                externalPath = os.path.join(theke.PATH_EXTERNAL, externalFilename)
-                externalData = yaml.safe_load(open(externalPath, 'r'))
+        if sourceNames is None:
+            sourceNames = {externalFilename[:-5]: False for externalFilename in os.listdir(theke.PATH_EXTERNAL)
+                if externalFilename.endswith('.yaml')}
 
-                if force or (str(externalData['version']) > self.index.get_source_version(externalSourceName)):
-                    self.index_external_source(externalSourceName, externalData)
+        for externalSourceName, isUpdated in sourceNames.items():
+            start = time.perf_counter()
+
+            externalPath = os.path.join(theke.PATH_EXTERNAL, externalSourceName + '.yaml')
+            externalData = yaml.safe_load(open(externalPath, 'r'))
+
+            if force or isUpdated or (str(externalData['version']) > self.get_source_version(externalSourceName)):
+                self.index_external_source(externalSourceName, externalData)
+                timings[externalSourceName] = time.perf_counter() - start
+
+        return timings
 
     ### Index sword modules
 
-    def index_sword_module(self, mod) -> None:
-        """Index a sword module
+    def index_sword_module(self, mod, bookNames = None) -> None:
+        """Index a sword module (in a single transaction)
+
+        @param bookNames: for a biblical module, names of the books it contains
+            (if None, the module is scanned, see scan_sword_biblical_module())
         """
 
         logger.debug("ThekeIndexBuilder - Index %s", mod.get_name())
@@ -451,16 +1190,14 @@ class ThekeIndexBuilder:
             raise sqlite3.Error("Fails to index the module {}".format(mod.get_name()))
 
         # Add the module description to the index
-        self.index.execute_returning_id("""INSERT INTO sourceDescriptions (id_source, description)
+        self.index.execute_returning_id("""INSERT OR REPLACE INTO sourceDescriptions (id_source, description)
                 VALUES(?, ?);
                 """,
             (sourceId, mod.get_description()))
 
-        self.index.commit()
-
         # Next indexing steps depend of the module type
         if mod.get_type() == theke.sword.MODTYPE_BIBLES:
-            self.index_sword_biblical_module(sourceId, mod)
+            self.index_sword_biblical_module(sourceId, mod, bookNames)
 
         elif mod.get_type() == theke.sword.MODTYPE_GENBOOKS:
             self.index_sword_book_module(sourceId, mod)
@@ -468,6 +1205,8 @@ class ThekeIndexBuilder:
         else:
             logger.debug("ThekeIndexBuilder - Unknown type (%s) of %s", mod.get_type(), mod.get_name())
 
+        self.index.commit()
+
     def index_sword_biblical_book_names(self) -> None:
         """Index sword biblical book names.
 
@@ -480,6 +1219,7 @@ class ThekeIndexBuilder:
             return
 
         logger.debug("ThekeIndexBuilder − Index sword biblical book names")
+        self._hasChanged = True
 
         # Index names used by sword for biblical books
         vk = Sword.VerseKey()
@@ -507,26 +1247,24 @@ class ThekeIndexBuilder:
 
         self.index.commit()
 
-    def index_sword_biblical_module(self, sourceId, mod) -> None:
+    def index_sword_biblical_module(self, sourceId, mod, bookNames = None) -> None:
         """Index a sword biblical module
+
+        @param bookNames: names of the books contained in the module (if None, scan the module)
         """
 
         logger.debug("ThekeIndexBuilder - Index %s as a Bible (id: %s)", mod.get_name(), sourceId)
 
-        # Index each of the biblical books of this module
-        # TODO: Y a-t-il une façon plus propre de faire la même chose ?
-        vk = Sword.VerseKey()
+        if bookNames is None:
+            _, bookNames, _ = scan_sword_biblical_module(mod.get_name(), self.get_sword_library())
 
-        for itestament in [1, 2]:
-            vk.setTestament(itestament)
+        # Link each of the biblical books of this module
+        documentIds = dict(self.index.execute("""SELECT name, id_document
+            FROM documentNaming;""").fetchall())
 
-            for ibook in range(1, vk.getBookMax() +1):
-                vk.setBook(ibook)
-                if mod.has_entry(vk):
-                    bookId = self.index.get_document_id(vk.getBookName())
-                    self.link_biblical_book(vk.getBookName(), bookId, sourceId, doCommit=False)
-
-        self.index.commit()
+        self.index.executemany("""INSERT OR IGNORE INTO link_document_source (id_document, id_source, uri_document)
+                VALUES(?, ?, ?);""",
+            [(documentIds.get(bookName, -1), sourceId, bookName) for bookName in bookNames])
 
     def index_sword_book_module(self, sourceId, mod) -> None:
         """Index a sword book module
@@ -534,7 +1272,17 @@ class ThekeIndexBuilder:
         logger.debug("ThekeIndexBuilder - Index %s as a book (id: %s)", mod.get_name(), sourceId)
 
         # TODO: boucler sur les titres des livres contenus dans ce module.
-        self.index_document(mod.get_name(), mod.get_short_repr(), theke.TYPE_BOOK, None, mod.get_lang(), sourceId, "", doCommit=True)
+        self.index_document(mod.get_name(), mod.get_short_repr(), theke.TYPE_BOOK, None, mod.get_lang(), sourceId, "", doCommit=False)
+
+        # Walk the tree of the book once, so that any node can then be read
+        # with a single seek (see theke.sword.SwordBook.get_texts())
+        nodes = self.get_sword_library().get_book_module(mod.get_name()).get_tree_nodes()
+
+        self.index.execute("""DELETE FROM bookNodes WHERE id_source=?;""", (sourceId,))
+        self.index.executemany("""INSERT INTO bookNodes (id_source, position, offset, parentOffset, previousOffset,
+                nextOffset, depth, name, path, lastPosition)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+            ((sourceId, position) + tuple(node) for position, node in enumerate(nodes)))
 
     ### Index exernal source
 
@@ -551,7 +1299,7 @@ class ThekeIndexBuilder:
             raise sqlite3.Error("Fails to index the external source {}".format(sourceName))
 
         # Add the module description to the index
-        self.index.execute_returning_id("""INSERT INTO sourceDescriptions (id_source, description)
+        self.index.execute_returning_id("""INSERT OR REPLACE INTO sourceDescriptions (id_source, description)
                 VALUES(?, ?);
                 """,
             (sourceId, data['description']))
@@ -610,7 +1358,7 @@ class ThekeIndexBuilder:
         @param sourceId: (int) id of the source
         """
         # Is this document already registered?
-        documentId = self.index.get_document_id(name)
+        documentId = self.get_document_id(name)
 
         if documentId < 0:
             # No, so create a new document entry
@@ -646,6 +1394,31 @@ class ThekeIndexBuilder:
             self.index.commit()
 
     ### Helpers
+    #   The builder reads the database directly:
+    #   the in-memory metadata are only reloaded at the end of the build.
+
+    def get_document_id(self, documentName) -> int:
+        """Return the id of document given its name
+        """
+
+        rawId = self.index.execute("""SELECT id_document
+            FROM documentNaming
+            WHERE name=?;""",
+            (documentName,)).fetchone()
+
+        return -1 if rawId is None else rawId[0]
+
+    def get_source_version(self, sourceName) -> str:
+        """Return the version a source
+        """
+
+        rawVersion = self.index.execute("""SELECT version
+            FROM sources
+            WHERE name=?;""",
+            (sourceName,)).fetchone()
+
+        return '0' if rawVersion is None else rawVersion[0]
+
     def add_source(self, name, sourceType, contentType, version, lang, uri = '') -> Any:
         """Add a source to the index.
 
@@ -657,6 +1430,8 @@ class ThekeIndexBuilder:
                 ON CONFLICT(name)
                 DO UPDATE SET version=excluded.version;
         """
+        self._hasChanged = True
+
         # Does the source already exist?
         rawSourceId = self.index.execute("""SELECT id
             FROM sources
@@ -664,13 +1439,96 @@ class ThekeIndexBuilder:
             (name,)).fetchone()
 
         if rawSourceId is not None:
-            print('Update the source version ...')
-            return self.index.execute_returning_id("""UPDATE sources
+            logger.debug("ThekeIndexBuilder - Update the version of %s", name)
+            self.index.execute("""UPDATE sources
                 SET version = ?
                 WHERE id = ?;""",
             (version, rawSourceId[0]))
 
+            # (lastrowid is not set by an UPDATE)
+            return rawSourceId[0]
+
         # Add the module to the index
         return self.index.execute_returning_id("""INSERT INTO sources (name, type, contentType, version, lang, uri)
                 VALUES(?, ?, ?, ?, ?, ?);""",
             (name, sourceType, contentType, version, lang, uri))
+
+if __name__ == "__main__":
+    # Benchmark of the hot queries of the index, before and after the migration to the API version 0.5
+    #   python3 -m theke.index [nbOfRuns]
+    import sys
+    import tempfile
+    import timeit
+
+    nbOfRuns = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    benchmarkQueries = (
+        ("documentNaming by name", """SELECT id_document FROM documentNaming WHERE name=?;""", 'documentName'),
+        ("biblicalBookNames by document", """SELECT name, isShortName FROM biblicalBookNames WHERE id_document=?;""", 'documentId'),
+        ("biblicalBookData by name", """SELECT nbOfChapters FROM biblicalBookData
+            INNER JOIN documentNaming ON biblicalBookData.id_document = documentNaming.id_document
+            WHERE documentNaming.name=?;""", 'documentName'),
+        ("sources by name", """SELECT version FROM sources WHERE name=?;""", 'sourceName'),
+        ("document sources", """SELECT sources.name, sourceDescriptions.description
+            FROM sources
+            LEFT JOIN sourceDescriptions ON sources.id = sourceDescriptions.id_source
+            INNER JOIN link_document_source ON link_document_source.id_source = sources.id
+            WHERE link_document_source.id_document = ?;""", 'documentId'),
+    )
+
+    def run_benchmark(index, label) -> None:
+        documentName, documentId = index.execute("""SELECT name, id_document FROM documentNaming
+            ORDER BY id_document DESC LIMIT 1;""").fetchone()
+        sourceName = index.execute("""SELECT name FROM sources ORDER BY id DESC LIMIT 1;""").fetchone()[0]
+        parameters = {'documentName': documentName, 'documentId': documentId, 'sourceName': sourceName}
+
+        print("[{}]".format(label))
+        for name, sql, parameter in benchmarkQueries:
+            duration = timeit.timeit(lambda: index.execute(sql, (parameters[parameter],)).fetchall(), number = nbOfRuns)
+            print("  {:<32} {:8.1f} µs/query".format(name, 1e6 * duration / nbOfRuns))
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        benchmarkPath = os.path.join(tmpDir, 'thekeIndex.db')
+
+        if os.path.isfile(INDEX_PATH):
+            print("Benchmark on a copy of {}".format(INDEX_PATH))
+            with sqlite3.connect(INDEX_PATH) as con, sqlite3.connect(benchmarkPath) as benchmarkCon:
+                con.backup(benchmarkCon)
+
+            builder = ThekeIndexBuilder(benchmarkPath)
+
+        else:
+            print("Benchmark on a synthetic index (66 books, 300 sources)")
+            builder = ThekeIndexBuilder(benchmarkPath)
+
+            for ibook in range(66):
+                documentId = builder.index.execute_returning_id("""INSERT INTO documents (type) VALUES(?);""", (theke.TYPE_BIBLE,))
+                builder.index_biblical_book_name(documentId, "Book {}".format(ibook), "en", "sword", doCommit = False)
+                builder.index.execute("""INSERT INTO biblicalBookData (id_document, nbOfChapters, testament)
+                    VALUES(?, ?, ?);""", (documentId, 50, theke.BIBLE_OT))
+
+            for isource in range(300):
+                sourceId = builder.add_source("Source {}".format(isource), SOURCETYPE_SWORD, "Biblical Texts", "1.0", "en")
+                builder.index.execute("""INSERT OR REPLACE INTO sourceDescriptions (id_source, description)
+                    VALUES(?, ?);""", (sourceId, "Source {}".format(isource)))
+
+                for documentId in range(1, 67):
+                    builder.link_biblical_book("Book", documentId, sourceId, doCommit = False)
+
+            builder.index.commit()
+
+        # Before: schema of the API version 0.4 (without the indexes added by the migration)
+        for (indexName,) in builder.index.execute("""SELECT name FROM sqlite_master
+                WHERE type = 'index' AND sql IS NOT NULL;""").fetchall():
+            builder.index.execute("""DROP INDEX {};""".format(indexName))
+        builder.index.commit()
+
+        run_benchmark(builder.index, "API 0.4")
+
+        # After
+        _migrate_to_v0_5(builder.index)
+        builder.index.commit()
+        builder.index.execute("""ANALYZE;""")
+
+        run_benchmark(builder.index, "API 0.5")
+
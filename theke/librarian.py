@@ -4,6 +4,7 @@ import theke
 import theke.archivist
 import theke.document
 import theke.reference
+import theke.tracing
 
 import logging
 logger = logging.getLogger(__name__)
@@ -15,14 +16,19 @@ class ThekeLibrarian(GObject.GObject):
     def __init__(self, archivist) -> None:
         self._archivist = archivist
 
-    def get_document(self, ref, sourceNames = None):
+    def get_document(self, ref, sourceNames = None, lazy = False):
         """Find and return a document
+
+        @param lazy: if True, the document is only rendered when it is read
         """
 
         logger.debug("Get a document : {}".format(ref))
 
-        handler = self._archivist.get_document_handler(ref, sourceNames)
-        toc = self._archivist.get_document_toc(ref)
+        with theke.tracing.span("archivist.get_document_handler", ref = ref, sources = sourceNames, lazy = lazy):
+            handler = self._archivist.get_document_handler(ref, sourceNames, lazy)
+
+        with theke.tracing.span("archivist.get_document_toc"):
+            toc = self._archivist.get_document_toc(ref, sourceNames)
 
         return theke.document.ThekeDocument(ref, handler, toc) if handler else None
 
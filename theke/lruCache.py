@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+class LRUCache():
+    """A bounded, thread-safe, least recently used cache
+    """
+
+    def __init__(self, maxSize, name = "LRUCache") -> None:
+        """
+        @param maxSize: (int) maximal number of entries kept in the cache
+        @param name: (str) name of the cache, used in debug messages
+        """
+        self._maxSize = maxSize
+        self._name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default = None):
+        """Return the value cached for this key (or default)
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        """Store a value in the cache, evicting the least recently used entries if needed
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self._maxSize:
+                evictedKey, _ = self._entries.popitem(last = False)
+                logger.debug("%s - Evict %s", self._name, evictedKey)
+
+    def clear(self) -> None:
+        """Remove every entry from the cache
+        """
+        with self._lock:
+            logger.debug("%s - Clear", self._name)
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        """Return some statistics about the cache
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxSize': self._maxSize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
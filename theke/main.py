@@ -6,10 +6,9 @@ from gi.repository import GObject
 import os
 import yaml
 import theke
-import theke.gui.mainWindow
-import theke.navigator
-import theke.sword
-import theke.templates
+import theke.externalCache
+import theke.startupProfiler
+import theke.tracing
 import theke.uri
 
 from theke.archivist import ThekeArchivist
@@ -45,6 +44,24 @@ class ThekeApp(Gtk.Application):
             "URI",
         )
 
+        self.add_main_option(
+            "profile-startup",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Print the time spent in each step of the startup",
+            None,
+        )
+
+        self.add_main_option(
+            "trace",
+            0,
+            GLib.OptionFlags.NONE,
+            GLib.OptionArg.NONE,
+            "Trace the loading of documents (Chrome trace format)",
+            None,
+        )
+
         self.add_main_option(
             GLib.OPTION_REMAINING,
             0,
@@ -90,36 +107,53 @@ class ThekeApp(Gtk.Application):
 
         Gtk.Application.do_startup(self)
 
-        # Load settings
-        self._settings = yaml.safe_load(open(theke.PATH_SETTINGS_FILE, 'r'))
-
-        # Create some directories
-        for path in [theke.PATH_ROOT, theke.PATH_DATA, theke.PATH_EXTERNAL, theke.PATH_CACHE]:
-            if not os.path.isdir(path):
-                logger.debug("ThekeApp − Make dir : %s", path)
-                os.mkdir(path)
-        
-        # Create some files (eg. theke.conf, custom.css)
-        for path in [theke.PATH_SETTINGS_FILE, theke.PATH_CUSTOM_CSS]:
-            if not os.path.isfile(path):
-                with open(path, 'w') as f:
-                    pass
-
-        # Init the archivist and the librarian
-        self._archivist = ThekeArchivist()
-        self._librarian = ThekeLibrarian(self._archivist)
-
-        # Update the index
-        self._archivist.update_index()
-
-        # Build/Update templates
-        bible_mods = self._archivist.list_sword_sources(contentType = theke.sword.MODTYPE_BIBLES)
-        book_mods = self._archivist.list_sword_sources(contentType = theke.sword.MODTYPE_GENBOOKS)
-        external_docs = self._archivist.list_external_documents()
-
-        theke.templates.build_template('welcome', {'BibleMods': bible_mods})
-        theke.templates.build_template('modules', {'BibleMods': bible_mods, 'BookMods' : book_mods})
-        theke.templates.build_template('external_documents', {'ExternalDocs': external_docs})
+        with theke.startupProfiler.phase("do_startup: settings"):
+            # Load settings
+            self._settings = yaml.safe_load(open(theke.PATH_SETTINGS_FILE, 'r'))
+
+            # Create some directories
+            for path in [theke.PATH_ROOT, theke.PATH_DATA, theke.PATH_EXTERNAL, theke.PATH_CACHE]:
+                if not os.path.isdir(path):
+                    logger.debug("ThekeApp − Make dir : %s", path)
+                    os.mkdir(path)
+            
+            # Create some files (eg. theke.conf, custom.css)
+            for path in [theke.PATH_SETTINGS_FILE, theke.PATH_CUSTOM_CSS]:
+                if not os.path.isfile(path):
+                    with open(path, 'w') as f:
+                        pass
+
+            # HTTP settings used to download external sources
+            httpSettings = self._settings.get("http", None) if self._settings else None
+            if httpSettings:
+                theke.externalCache.configure_http_session(
+                    httpSettings.get("connectTimeout"), httpSettings.get("readTimeout"), httpSettings.get("retries"))
+
+            # Size budget of the cache of external documents (in MB)
+            cacheSettings = self._settings.get("cache", None) if self._settings else None
+            if cacheSettings and cacheSettings.get("maxSize") is not None:
+                theke.externalCache.configure_cache(int(cacheSettings["maxSize"] * 1024 * 1024))
+
+        with theke.startupProfiler.phase("do_startup: archivist and librarian"):
+            # Init the archivist and the librarian
+            self._archivist = ThekeArchivist(
+                continuousReading = bool(self._settings.get("continuousReading", False)) if self._settings else False)
+            self._librarian = ThekeLibrarian(self._archivist)
+
+        # The window is opened on the current index
+        with theke.startupProfiler.phase("do_startup: index schema"):
+            self._archivist.upgrade_index()
+
+        with theke.startupProfiler.phase("do_startup: templates"):
+            self._archivist.build_templates(missingOnly = True)
+
+        # Update the index (and templates) in the background, once the window is drawn
+        GLib.idle_add(self._update_index_cb)
+
+    def _update_index_cb(self) -> bool:
+        self._archivist.update_index_async()
+        self._archivist.watch_sources()
+        return GLib.SOURCE_REMOVE
 
     def do_activate(self):
         """Shows the default first window of the application (like a new document).
@@ -128,19 +162,23 @@ class ThekeApp(Gtk.Application):
         logger.debug("ThekeApp - Do activate")
 
         if not self._window:
-            import theke.gui.mainWindow
-            import theke.navigator
+            # Widgets are imported (and their templates read) only when the window is created
+            with theke.startupProfiler.phase("do_activate: window"):
+                import theke.gui.mainWindow
+                import theke.navigator
 
-            logger.debug("ThekeApp - Create a new window")
+                logger.debug("ThekeApp - Create a new window")
 
-            self._window = theke.gui.mainWindow.ThekeWindow(self)
-            self._window.set_application(self)
+                self._window = theke.gui.mainWindow.ThekeWindow(self)
+                self._window.set_application(self)
 
             # Register application screens in the GotoBar
             # for inAppUriKey in theke.uri.inAppURI.keys():
             #     self.window.gotobar.append((inAppUriKey, 'sandy brown'))
 
         # Load the given uri
+        # (the profiling of the startup ends once it is loaded)
+        theke.startupProfiler.start_phase("first load_uri")
         uri = theke.uri.parse(self._defaultUri)
         self._window.open_uri(uri)
 
@@ -151,6 +189,10 @@ class ThekeApp(Gtk.Application):
         # convert GVariantDict -> GVariant -> dict
         options = options.end().unpack()
 
+        if "trace" in options:
+            # Trace the loading of each document
+            theke.tracing.enable()
+
         if "uri" in options:
             # Start Theke with this uri
             logger.debug("Uri read from the command line: %s", options["uri"])
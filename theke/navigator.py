@@ -8,6 +8,7 @@ import theke
 import theke.uri
 import theke.index
 import theke.reference
+import theke.tracing
 
 import logging
 logger = logging.getLogger(__name__)
@@ -23,6 +24,15 @@ NEW_VERSE = 3
 
 SOURCES_UPDATED = 4
 
+# In the continuous reading mode, a new chapter of the current biblical book
+NEW_CHAPTER = 5
+
+# The table of contents of the current document was updated
+TOC_UPDATED = 6
+
+# Sources of the current document were installed or removed
+AVAILABLE_SOURCES_UPDATED = 7
+
 class ThekeNavigator(GObject.Object):
     """Load content and provide metadata.
 
@@ -51,6 +61,9 @@ class ThekeNavigator(GObject.Object):
 
         self._currentDocument = self._librarian.get_empty_document()
 
+        self._archivist.connect("index-updated", self.handle_archivist_index_updated_cb)
+        self._archivist.connect("document-sections-updated", self.handle_archivist_document_sections_updated_cb)
+
         # Load default biblical sources names from the settings file
         dbsn = self._app.props.settings.get("defaultBiblicalSourcesNames", None)
         if dbsn:
@@ -90,7 +103,21 @@ class ThekeNavigator(GObject.Object):
         if reload or ref != self._currentDocument.ref:
             logger.debug("Goto ref: %s", ref)
             self.set_loading(True)
-            self.update_context_from_ref(ref)
+
+            updateType = self.update_context_from_ref(ref)
+
+            if updateType == NEW_CHAPTER and not reload:
+                self._webview.goto_chapter(ref.chapter, ref.get_verse())
+                self.set_loading(False)
+                return
+
+            if updateType == NEW_SECTION and not reload:
+                # Same book: scroll to the anchor of the section
+                # (its chunk is loaded if needed)
+                self._webview.jump_to_anchor(ref.section)
+                self.set_loading(False)
+                return
+
             self.reload()
 
     def reload(self) -> None:
@@ -189,13 +216,15 @@ class ThekeNavigator(GObject.Object):
             logger.debug("Update context (same uri, skip)")
             return SAME_DOCUMENT
 
-        elif uriComparison == theke.uri.comparison.DIFFER_BY_FRAGMENT:
+        elif uriComparison == theke.uri.comparison.DIFFER_BY_FRAGMENT and self._is_section_loaded(uri.fragment):
             # Same uri with a different fragment
             logger.debug("Update context (section)")
             self._currentDocument.section = uri.fragment
+            self.emit("context-updated", NEW_SECTION)
             return NEW_SECTION
 
-        ref = theke.reference.get_reference_from_uri(uri)
+        with theke.tracing.span("reference.get_reference_from_uri"):
+            ref = theke.reference.get_reference_from_uri(uri)
 
         # Collect sources names given in the uri
         # and available for this reference
@@ -222,18 +251,29 @@ class ThekeNavigator(GObject.Object):
                 self._currentDocument.section = ref.verse
                 return NEW_VERSE
 
+            if (self._archivist.continuousReading
+                and refComparisonMask & theke.reference.comparison.DIFFER_BY_CHAPTER == theke.reference.comparison.DIFFER_BY_CHAPTER
+                and (not wantedSourcesNames or wantedSourcesNames == self._currentDocument.sourceNames)):
+                # Same biblical book: the chapter is loaded in the current document
+                self._set_current_chapter(ref)
+                return NEW_CHAPTER
+
             sourcesNames = wantedSourcesNames or self._get_default_biblical_sources(ref)
             self._currentDocument = self._librarian.get_document(ref, sourcesNames)
 
             self.emit("context-updated", NEW_DOCUMENT)
+
+            # The next chapter is likely to be read soon
+            self._archivist.prefetch_neighbor_chapters_async(ref, self._currentDocument.sourceNames)
             return NEW_DOCUMENT
 
         elif ref.type == theke.TYPE_BOOK:
             logger.debug("Update context [book]")
 
-            if refComparisonMask == theke.reference.comparison.DIFFER_BY_SECTION:
+            if refComparisonMask == theke.reference.comparison.DIFFER_BY_SECTION and self._is_section_loaded(ref.section):
                 # Same book reference with a different section name
                 self._currentDocument.section = ref.section
+                self.emit("context-updated", NEW_SECTION)
                 return NEW_SECTION
 
             # If needed, select sources to read the document from
@@ -254,8 +294,108 @@ class ThekeNavigator(GObject.Object):
             logger.error("Reference type not supported: %s", ref)
             return ERROR_REFERENCE_NOT_SUPPORTED
 
+    def _is_section_loaded(self, section) -> bool:
+        """Return True if a section of the current document is in the loaded page
+
+        A sword general book is displayed one page at a time (see ThekeArchivist.get_book_page()).
+        """
+        sources = self._currentDocument.sources
+
+        if self._currentDocument.type != theke.TYPE_BOOK or not sources or sources[0].type != theke.index.SOURCETYPE_SWORD:
+            return True
+
+        currentPage = self._archivist.get_book_page(sources[0].name, self._currentDocument.section)
+        page = self._archivist.get_book_page(sources[0].name, section)
+
+        return currentPage is not None and page is not None and currentPage.offset == page.offset
+
+    def _set_current_chapter(self, ref) -> None:
+        """Set the current chapter of the current biblical book (continuous reading mode)
+
+        The document is not rendered again: its chapters are loaded by the webview.
+        """
+        logger.debug("Update context [chapter]")
+
+        sourcesNames = self._currentDocument.sourceNames
+        self._currentDocument = self._librarian.get_document(ref, sourcesNames, lazy = True)
+
+        self.emit("context-updated", NEW_CHAPTER)
+        self._archivist.prefetch_neighbor_chapters_async(ref, sourcesNames)
+
+    def get_fragment_async(self, uri, callback) -> None:
+        """Get a fragment of a document
+            - a biblical chapter, in the continuous reading mode
+                eg. theke:/fragment/bible/John 2?sources=...
+            - a chunk of an external document
+                eg. theke:/fragment/book/Amoris laetitia?sources=...&chunk=3
+
+        @param callback: function called with the fragment (or None)
+        """
+        if len(uri.path) >= 4 and uri.path[2] == theke.uri.SEGM_BOOK:
+            ref = theke.reference.BookReference(uri.path[3])
+            sourceName = uri.params.get('sources', '')
+
+            if sourceName not in ref.availableSources or not uri.params.get('chunk', '').isdigit():
+                logger.error("Fragment not supported: %s", uri)
+                callback(None)
+                return
+
+            self._archivist.get_book_chunk_fragment_async(sourceName, int(uri.params['chunk']), callback)
+            return
+
+        if len(uri.path) < 4 or uri.path[2] != theke.uri.SEGM_BIBLE:
+            logger.error("Fragment not supported: %s", uri)
+            callback(None)
+            return
+
+        ref = theke.reference.BiblicalReference(uri.path[3])
+        sourcesNames = [sourceName for sourceName in uri.params.get('sources', '').split(';')
+            if sourceName in ref.availableSources]
+
+        if not sourcesNames:
+            logger.error("No available source for this fragment: %s", uri)
+            callback(None)
+            return
+
+        self._archivist.get_bible_chapter_fragment_async(ref, sourcesNames, callback)
+
     ### Signals handling
 
+    def handle_webview_visible_chapter_changed_cb(self, object, chapter) -> None:
+        """Update the context when the reader scrolls to another chapter (continuous reading mode)
+        """
+        doc = self._currentDocument
+
+        if doc.type != theke.TYPE_BIBLE or chapter == doc.ref.chapter or not 0 < chapter <= doc.ref.nbOfChapters:
+            return
+
+        self._set_current_chapter(theke.reference.BiblicalReference("{} {}".format(doc.ref.bookName, chapter)))
+
+    def handle_archivist_index_updated_cb(self, object) -> None:
+        """Update the context once the index was updated in the background
+        """
+        doc = self._currentDocument
+
+        # In-app pages (eg. the welcome page) list the content of the index
+        if doc.type == theke.TYPE_INAPP:
+            self.reload()
+
+        # Sources of the current document may have been installed or removed
+        if isinstance(doc.ref, theke.reference.DocumentReference):
+            doc.ref.update_available_sources()
+            self.emit("context-updated", AVAILABLE_SOURCES_UPDATED)
+
+    def handle_archivist_document_sections_updated_cb(self, object, sourceName) -> None:
+        """Update the table of contents of the current document once its sections are extracted
+        """
+        doc = self._currentDocument
+
+        if doc.type != theke.TYPE_BOOK or doc.sourceNames[:1] != [sourceName]:
+            return
+
+        doc.toc = self._archivist.get_document_toc(doc.ref, doc.sourceNames, updateSections = False)
+        self.emit("context-updated", TOC_UPDATED)
+
     def handle_webview_click_on_word_cb(self, object, uri) -> None:
         """Do what should be do when a new word is selected in the webview
         Action(s):
@@ -10,7 +10,19 @@ import theke.uri
 import theke.index
 
 logger = logging.getLogger(__name__)
-index = theke.index.ThekeIndex()
+
+# The index can be read from any thread (see theke.connectionPool)
+_index = None
+
+def get_index():
+    """Return the index used to build references
+    """
+    global _index
+
+    if _index is None:
+        _index = theke.index.ThekeIndex()
+
+    return _index
 
 DEFAULT_SWORD_BOOK_SECTION = "Couverture"
 
@@ -26,6 +38,7 @@ class comparison():
     SAME_VERSE = 1 << 3
 
     DIFFER_BY_VERSE = SAME_TYPE | SAME_BOOKNAME | SAME_CHAPTER
+    DIFFER_BY_CHAPTER = SAME_TYPE | SAME_BOOKNAME
 
     # For book references comparison...
     SAME_DOCUMENTNAME = 1 << 1
@@ -72,7 +85,7 @@ def parse_reference(rawReference, wantedSources = None):
 
     if match_r is not None:
         documentName = match_r.group(1).strip()
-        documentType = theke.index.ThekeIndex().get_document_type(documentName)
+        documentType = get_index().get_document_type(documentName)
 
         if documentType == theke.TYPE_BIBLE:
             return BiblicalReference(rawReference)
@@ -181,7 +194,12 @@ class DocumentReference(Reference):
 
         # List from the index available sources
         if self.availableSources is None:
-            self.availableSources = {s.name: s for s in index.list_document_sources(self.documentName)}
+            self.update_available_sources()
+
+    def update_available_sources(self) -> None:
+        """List from the index available sources (eg. again, once sources were installed or removed)
+        """
+        self.availableSources = {s.name: s for s in get_index().list_document_sources(self.documentName)}
 
 class BiblicalReference(DocumentReference):
     def __init__(self, rawReference, tags = None):
@@ -247,12 +265,12 @@ class BiblicalReference(DocumentReference):
         """
         super().update_data_from_index()
 
-        documentNames = index.get_biblical_book_names(self.bookName)
+        documentNames = get_index().get_biblical_book_names(self.bookName)
         self.documentName = documentNames['names'][0]
         self.documentShortname = documentNames['shortnames'][0] if len(documentNames['shortnames']) > 0 else documentNames['names'][0]
         
-        self.testament = index.get_biblical_book_testament(self.bookName)
-        self.nbOfChapters = index.get_biblical_book_nbOfChapters(self.bookName)
+        self.testament = get_index().get_biblical_book_testament(self.bookName)
+        self.nbOfChapters = get_index().get_biblical_book_nbOfChapters(self.bookName)
 
     def __and__(self, other) -> int:
         genericComparaison = super().__and__(other)
@@ -297,7 +315,7 @@ class BookReference(DocumentReference):
         """
         super().update_data_from_index()
 
-        documentNames = index.get_document_names(self.documentName)
+        documentNames = get_index().get_document_names(self.documentName)
         self.documentName = documentNames['names'][0]
         self.documentShortname = documentNames['shortnames'][0] if len(documentNames['shortnames']) > 0 else documentNames['names'][0]
 
@@ -0,0 +1,286 @@
+import logging
+
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any
+
+import theke
+import theke.connectionPool
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_PATH = os.path.join(theke.PATH_DATA, 'thekeSearch.db')
+
+# Pragmas set on each connection to the search index (see theke.connectionPool)
+SEARCH_INDEX_PRAGMAS = (
+    "PRAGMA journal_mode = WAL;",
+    "PRAGMA synchronous = NORMAL;",
+)
+
+# Version of the search index schema
+# (modules indexed with an older schema are indexed again)
+SEARCH_INDEX_VERSION = 2
+
+# Number of verses inserted at once
+VERSES_BATCH_SIZE = 2000
+
+# Availability of the full-text index, by path of the database
+# (the schema is created once per database, see ThekeSearchIndex.__init__())
+_isFullTextAvailable = {}
+_schemaLock = threading.Lock()
+
+pattern_query_token = re.compile(r'"[^"]*"|\S+')
+pattern_strongs = re.compile(r'^([GH]?)0*(\d+)')
+
+def normalize_strongs(rawStrongs, defaultPrefix = 'G') -> str:
+    """Normalize a Strong's number (None if this is not a Strong's number)
+
+        G02316 --> G2316
+        7225 --> H7225 (with defaultPrefix = 'H')
+    """
+    match_strongs = pattern_strongs.match(rawStrongs)
+
+    if match_strongs is None:
+        return None
+
+    return "{}{}".format(match_strongs.group(1) or defaultPrefix, match_strongs.group(2))
+
+class ThekeSearchIndex:
+    """Search index of biblical modules
+
+    - full-text index of the verses (using SQLite FTS5),
+    - concordance of Strong's numbers and lemmas.
+
+    The full-text index is optional: if FTS5 is not available in the SQLite library,
+    isFullTextAvailable is False and keywords should be searched directly in sword modules.
+
+    Connections are shared through a pool (see theke.connectionPool):
+    an instance can be searched from any thread while a module is indexed.
+    """
+    def __init__(self, path = SEARCH_INDEX_PATH) -> None:
+        logger.debug("ThekeSearchIndex - Create a new instance")
+        self._pool = theke.connectionPool.get_pool(path, SEARCH_INDEX_PRAGMAS)
+
+        # The schema is only created by the first instance on this database,
+        # so that new instances do not wait for a module being indexed
+        with _schemaLock:
+            if path not in _isFullTextAvailable:
+                with self._pool.writer() as con:
+                    self._create_schema(con)
+
+                _isFullTextAvailable[path] = self.isFullTextAvailable
+
+            self.isFullTextAvailable = _isFullTextAvailable[path]
+
+    @property
+    def con(self) -> sqlite3.Connection:
+        """Return the read only connection of the current thread
+        """
+        return self._pool.get_reader()
+
+    def _create_schema(self, con) -> None:
+        con.execute("""CREATE TABLE IF NOT EXISTS modules (
+            name text PRIMARY KEY,
+            version text NOT NULL
+            );""")
+
+        con.execute("""CREATE TABLE IF NOT EXISTS concordance (
+            module text NOT NULL,
+            strongs text NOT NULL,
+            lemma text,
+            book text NOT NULL,
+            reference text NOT NULL,
+            count integer NOT NULL
+            );""")
+
+        con.execute("""CREATE INDEX IF NOT EXISTS concordance_strongs
+            ON concordance (module, strongs);""")
+        con.execute("""CREATE INDEX IF NOT EXISTS concordance_lemma
+            ON concordance (module, lemma);""")
+
+        self.isFullTextAvailable = True
+
+        try:
+            con.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS verses USING fts5(
+                module UNINDEXED,
+                book UNINDEXED,
+                reference UNINDEXED,
+                text,
+                tokenize = 'unicode61 remove_diacritics 1'
+                );""")
+
+        except sqlite3.OperationalError as error:
+            logger.debug("ThekeSearchIndex - Full-text search is not available: %s", error)
+            self.isFullTextAvailable = False
+
+        if con.execute("PRAGMA user_version;").fetchone()[0] < SEARCH_INDEX_VERSION:
+            logger.debug("ThekeSearchIndex - Outdated schema, every module will be indexed again")
+            con.execute("""DELETE FROM modules;""")
+            con.execute("PRAGMA user_version = {};".format(SEARCH_INDEX_VERSION))
+
+    def get_module_version(self, moduleName) -> str:
+        """Return the version of an indexed module (None if the module is not indexed)
+        """
+        rawVersion = self.con.execute("""SELECT version
+            FROM modules
+            WHERE name=?;""",
+            (moduleName,)).fetchone()
+
+        return None if rawVersion is None else rawVersion[0]
+
+    def is_module_indexed(self, moduleName) -> bool:
+        """True if the verses of this module are in the full-text index
+        """
+        return self.isFullTextAvailable and self.get_module_version(moduleName) is not None
+
+    def has_concordance(self, moduleName) -> bool:
+        """True if Strong's numbers of this module are in the concordance
+        (and the module is completely indexed)
+        """
+        return self.con.execute("""SELECT 1
+            FROM modules
+            JOIN concordance ON concordance.module = modules.name
+            WHERE modules.name=?
+            LIMIT 1;""",
+            (moduleName,)).fetchone() is not None
+
+    def index_module(self, moduleName, version, books) -> None:
+        """Index (or re-index) the verses of a module and its Strong's numbers
+
+        @param books: iterable of (bookName, list of (chapter, verse, text, words))
+            where words is a list of (strongs, lemma)
+        """
+        logger.debug("ThekeSearchIndex - Index %s (version %s)", moduleName, version)
+
+        # Until it is marked as indexed again, the module is searched directly (see is_module_indexed())
+        with self._pool.writer() as con:
+            con.execute("""DELETE FROM modules WHERE name=?;""", (moduleName,))
+            if self.isFullTextAvailable:
+                con.execute("""DELETE FROM verses WHERE module=?;""", (moduleName,))
+            con.execute("""DELETE FROM concordance WHERE module=?;""", (moduleName,))
+
+        versesBatch = []
+        concordanceBatch = []
+
+        # Verses are read from the module without holding the writer,
+        # which is only taken to insert each batch
+        for bookName, verses in books:
+            for chapter, verse, text, words in verses:
+                reference = "{} {}:{}".format(bookName, chapter, verse)
+                versesBatch.append((moduleName, bookName, reference, text))
+
+                for (strongs, lemma), count in Counter(words).items():
+                    concordanceBatch.append((moduleName, strongs, lemma, bookName, reference, count))
+
+            if len(versesBatch) >= VERSES_BATCH_SIZE:
+                with self._pool.writer() as con:
+                    self._insert_verses(con, versesBatch, concordanceBatch)
+
+                versesBatch = []
+                concordanceBatch = []
+
+        # The module is marked as indexed only when all its verses are
+        with self._pool.writer() as con:
+            self._insert_verses(con, versesBatch, concordanceBatch)
+            con.execute("""INSERT INTO modules (name, version) VALUES(?, ?);""",
+                (moduleName, version))
+
+    def get_concordance(self, moduleName, strongs) -> Any:
+        """Return verses containing a Strong's number (in the canonical order)
+
+        @return: dict of lists of references, by book names
+        """
+        results = {}
+
+        rawResults = self.con.execute("""SELECT book, reference
+            FROM concordance
+            WHERE module = ? AND strongs = ?
+            ORDER BY rowid;""",
+            (moduleName, normalize_strongs(strongs)))
+
+        for bookName, reference in rawResults:
+            results.setdefault(bookName, []).append(reference)
+
+        return results
+
+    def get_lemma_concordance(self, moduleName, lemma) -> Any:
+        """Return verses containing a lemma (in the canonical order)
+
+        @return: dict of lists of references, by book names
+        """
+        results = {}
+
+        rawResults = self.con.execute("""SELECT DISTINCT book, reference
+            FROM concordance
+            WHERE module = ? AND lemma = ?
+            ORDER BY rowid;""",
+            (moduleName, lemma))
+
+        for bookName, reference in rawResults:
+            results.setdefault(bookName, []).append(reference)
+
+        return results
+
+    def get_occurrences(self, moduleName, strongs) -> Any:
+        """Return the number of occurrences of a Strong's number and the number of books containing it
+
+        @return: (nbOfOccurrences, nbOfBooks)
+        """
+        nbOfOccurrences, nbOfBooks = self.con.execute("""SELECT SUM(count), COUNT(DISTINCT book)
+            FROM concordance
+            WHERE module = ? AND strongs = ?;""",
+            (moduleName, normalize_strongs(strongs))).fetchone()
+
+        return (nbOfOccurrences or 0, nbOfBooks)
+
+    def search(self, moduleName, query, limit = -1) -> Any:
+        """Search verses of a module matching a query, ranked by relevance
+
+        @param query: (str) keywords, or phrases between double quotes
+        @return: dict of lists of references, by book names
+        """
+        results = {}
+        matchExpression = self.build_match_expression(query)
+
+        if not matchExpression:
+            return results
+
+        rawResults = self.con.execute("""SELECT book, reference
+            FROM verses
+            WHERE verses MATCH ? AND module = ?
+            ORDER BY rank
+            LIMIT ?;""",
+            (matchExpression, moduleName, limit))
+
+        for bookName, reference in rawResults:
+            results.setdefault(bookName, []).append(reference)
+
+        return results
+
+    def build_match_expression(self, query) -> str:
+        """Build a FTS5 match expression from a user query
+
+        Each keyword (or phrase between double quotes) is quoted,
+        so that the query cannot be misread as FTS5 syntax.
+            foo "bar baz" --> "foo" "bar baz"
+        """
+        tokens = []
+
+        for token in pattern_query_token.findall(query):
+            token = token.strip('"')
+
+            if token:
+                tokens.append('"{}"'.format(token.replace('"', '""')))
+
+        return " ".join(tokens)
+
+    def _insert_verses(self, con, versesBatch, concordanceBatch) -> None:
+        if self.isFullTextAvailable:
+            con.executemany("""INSERT INTO verses (module, book, reference, text)
+                VALUES(?, ?, ?, ?);""", versesBatch)
+
+        con.executemany("""INSERT INTO concordance (module, strongs, lemma, book, reference, count)
+            VALUES(?, ?, ?, ?, ?, ?);""", concordanceBatch)
@@ -8,7 +8,28 @@ class ThekeSearchResults(Gtk.TreeStore):
         #   2: (int) number of results in a given book
         super().__init__(str, int, str)
 
+        # Row of each book, and its number of results
+        self._bookIters = {}
+        self._bookCounts = {}
+
     def add(self, bookName, rawReferences, referenceType):
-        bookIter = self.append(None, [bookName, -1, str(len(rawReferences))])
+        """Add results found in a book
+
+        Results can be added several times for the same book (eg. when they are streamed):
+        they are appended to the book row and its number of results is updated.
+        """
+        bookIter = self._bookIters.get(bookName)
+
+        if bookIter is None:
+            bookIter = self.append(None, [bookName, -1, ''])
+            self._bookIters[bookName] = bookIter
+            self._bookCounts[bookName] = 0
+
         for ref in rawReferences:
-            self.append(bookIter, [ref, referenceType, ''])
\ No newline at end of file
+            self.append(bookIter, [ref, referenceType, ''])
+
+        self._bookCounts[bookName] += len(rawReferences)
+        self.set_value(bookIter, 2, str(self._bookCounts[bookName]))
+
+    def get_nb_of_results(self) -> int:
+        return sum(self._bookCounts.values())
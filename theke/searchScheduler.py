@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from gi.repository import GLib
+
+import theke.lruCache
+import theke.sword
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Maximal number of result sets kept in memory
+SEARCH_RESULTS_CACHE_SIZE = 64
+
+class _SearchRequest():
+    """A search requested by a view
+    """
+    def __init__(self, viewId, key, batchCallback, finishCallback) -> None:
+        self.viewId = viewId
+        self.key = key
+        self.batchCallback = batchCallback
+        self.finishCallback = finishCallback
+        self.isCancelled = False
+
+class _SearchJob():
+    """A search running (or waiting to run) in the worker thread
+
+    A job is shared by every request of the same (module, keyword).
+    Its results and requests are only handled in the main thread.
+    """
+    def __init__(self, key) -> None:
+        self.key = key
+        self.requests = []
+        self.results = []
+        self.nbOfResults = 0
+
+        # Read by the worker thread
+        self.isCancelled = False
+
+class ThekeSearchScheduler():
+    """Schedule searches in biblical modules
+
+    - a new search from a view supersedes the previous one of this view,
+    - identical searches (same module, same keyword) running at the same time are done once,
+    - completed result sets are kept in a LRU cache.
+
+    Searches are done one by one in a worker thread;
+    callbacks are always called in the main thread.
+    """
+
+    def __init__(self, searchIndex = None, cacheSize = SEARCH_RESULTS_CACHE_SIZE) -> None:
+        """
+        @param searchIndex: search index of biblical modules (see theke.searchIndex)
+        """
+        logger.debug("ThekeSearchScheduler - Create a new instance")
+
+        self._searchIndex = searchIndex
+
+        self._cache = theke.lruCache.LRUCache(cacheSize, "SearchResultsCache")
+
+        # Jobs in progress, by (moduleName, keyword)
+        self._jobs = {}
+
+        # Current request of each view, by viewId
+        self._requests = {}
+
+        self._executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "ThekeSearch")
+
+    def search(self, viewId, moduleName, keyword, batchCallback, finishCallback) -> None:
+        """Search a keyword in a biblical module
+
+        @param viewId: identifier of the requesting view (its previous search is cancelled)
+        @param batchCallback: called with (list of (bookName, reference), nbOfResults)
+        @param finishCallback: called with nbOfResults once every result has been delivered
+        """
+        self.cancel(viewId)
+
+        key = (moduleName, keyword)
+        request = _SearchRequest(viewId, key, batchCallback, finishCallback)
+        self._requests[viewId] = request
+
+        cachedResults = self._cache.get(key)
+        if cachedResults is not None:
+            logger.debug("ThekeSearchScheduler - %s in %s: results found in the cache", keyword, moduleName)
+            results, nbOfResults = cachedResults
+            GLib.idle_add(self._replay, request, list(results), nbOfResults, True)
+            return
+
+        job = self._jobs.get(key)
+
+        if job is None:
+            logger.debug("ThekeSearchScheduler - %s in %s: new search", keyword, moduleName)
+            job = _SearchJob(key)
+            self._jobs[key] = job
+            self._executor.submit(self._run_job, job)
+
+        else:
+            logger.debug("ThekeSearchScheduler - %s in %s: join a search in progress", keyword, moduleName)
+
+            # Results already found are delivered now, before batches waiting in the main loop
+            if job.results:
+                request.batchCallback(list(job.results), job.nbOfResults)
+
+        job.requests.append(request)
+
+    def cancel(self, viewId) -> None:
+        """Cancel the current search of a view
+
+        The search itself is stopped if no other view is waiting for its results.
+        """
+        request = self._requests.pop(viewId, None)
+
+        if request is None:
+            return
+
+        request.isCancelled = True
+
+        job = self._jobs.get(request.key)
+        if job is not None and request in job.requests:
+            job.requests.remove(request)
+
+            if not job.requests:
+                logger.debug("ThekeSearchScheduler - Cancel the search of %s in %s", request.key[1], request.key[0])
+                job.isCancelled = True
+                del self._jobs[request.key]
+
+    def clear_cache(self) -> None:
+        """Forget every cached result set (eg. when modules are updated)
+        """
+        self._cache.clear()
+
+    ### Worker thread
+    def _run_job(self, job) -> None:
+        if job.isCancelled:
+            return
+
+        moduleName, keyword = job.key
+        nbOfResults = 0
+        isFailed = False
+
+        try:
+            for batch, nbOfResults in theke.sword.bibleSearch_keyword(moduleName, keyword, lambda: job.isCancelled, self._searchIndex):
+                GLib.idle_add(self._job_batch, job, batch, nbOfResults)
+
+        except Exception:
+            logger.exception("ThekeSearchScheduler - Search of %s in %s failed", keyword, moduleName)
+            isFailed = True
+
+        GLib.idle_add(self._job_finish, job, nbOfResults, isFailed)
+
+    ### Main thread
+    def _job_batch(self, job, batch, nbOfResults) -> bool:
+        if job.isCancelled:
+            return GLib.SOURCE_REMOVE
+
+        job.results.extend(batch)
+        job.nbOfResults = nbOfResults
+
+        for request in job.requests:
+            request.batchCallback(batch, nbOfResults)
+
+        return GLib.SOURCE_REMOVE
+
+    def _job_finish(self, job, nbOfResults, isFailed = False) -> bool:
+        """
+        @param isFailed: if True, results are partial: they are not cached
+        """
+        if job.isCancelled:
+            return GLib.SOURCE_REMOVE
+
+        del self._jobs[job.key]
+
+        if not isFailed:
+            self._cache.put(job.key, (tuple(job.results), nbOfResults))
+
+        for request in job.requests:
+            self._finish_request(request, nbOfResults)
+
+        return GLib.SOURCE_REMOVE
+
+    def _replay(self, request, results, nbOfResults, isDone) -> bool:
+        """Deliver results already found to a request
+        """
+        if request.isCancelled:
+            return GLib.SOURCE_REMOVE
+
+        if results:
+            request.batchCallback(results, nbOfResults)
+
+        if isDone:
+            self._finish_request(request, nbOfResults)
+
+        return GLib.SOURCE_REMOVE
+
+    def _finish_request(self, request, nbOfResults) -> None:
+        if self._requests.get(request.viewId) is request:
+            del self._requests[request.viewId]
+
+        request.finishCallback(nbOfResults)
@@ -0,0 +1,167 @@
+"""Startup profiler
+
+Measure the time spent in each import, in each startup phase
+and in the first load of a document (see the --profile-startup option of theke.py).
+When it is not enabled, phases cost nothing but a function call.
+"""
+
+import builtins
+import importlib.util
+import sys
+import time
+
+from contextlib import contextmanager
+
+# Imports shorter than this (in ms) are not reported
+REPORT_MIN_DURATION = 1.0
+
+_isEnabled = False
+_startTime = None
+_originalImport = None
+
+# (depth, name, duration in ms) in the order of the imports
+_imports = []
+_importDepth = 0
+
+# (name, duration in ms) in the order of the phases
+_phases = []
+# name --> start time of phases in progress
+_runningPhases = {}
+
+def is_enabled() -> bool:
+    return _isEnabled
+
+def enable(startTime = None) -> None:
+    """Start profiling
+
+    @param startTime: (time.perf_counter()) start of the process, if known
+    """
+    global _isEnabled, _startTime, _originalImport
+
+    if _isEnabled:
+        return
+
+    _isEnabled = True
+    _startTime = startTime or time.perf_counter()
+
+    _originalImport = builtins.__import__
+    builtins.__import__ = _timed_import
+
+def _timed_import(name, globals = None, locals = None, fromlist = (), level = 0):
+    global _importDepth
+
+    # Only imports loading new modules are measured
+    if level == 0 and name in sys.modules:
+        return _originalImport(name, globals, locals, fromlist, level)
+
+    nbOfModules = len(sys.modules)
+    record = [_importDepth, _get_absolute_name(name, globals, level), 0]
+
+    _importDepth += 1
+    start = time.perf_counter()
+
+    try:
+        return _originalImport(name, globals, locals, fromlist, level)
+
+    finally:
+        record[2] = (time.perf_counter() - start) * 1000
+        _importDepth -= 1
+
+        if len(sys.modules) > nbOfModules:
+            _imports.append(record)
+
+def _get_absolute_name(name, globals, level) -> str:
+    if level == 0 or not globals:
+        return name
+
+    try:
+        return importlib.util.resolve_name('.' * level + name, globals.get('__package__'))
+
+    except (ImportError, ValueError):
+        return name
+
+def add_import(name, duration) -> None:
+    """Record an import measured by the caller (eg. before the profiler was enabled)
+
+    @param duration: (float) duration in seconds
+    """
+    if _isEnabled:
+        _imports.append([0, name, duration * 1000])
+
+@contextmanager
+def phase(name):
+    """Measure a startup phase
+
+        with theke.startupProfiler.phase("do_startup: settings"):
+            ...
+    """
+    start_phase(name)
+
+    try:
+        yield
+
+    finally:
+        end_phase(name)
+
+def start_phase(name) -> None:
+    """Start a phase ending in another function (see end_phase())
+    """
+    if _isEnabled:
+        _runningPhases[name] = time.perf_counter()
+
+def end_phase(name) -> None:
+    if _isEnabled and name in _runningPhases:
+        _phases.append((name, (time.perf_counter() - _runningPhases.pop(name)) * 1000))
+
+def finish(file = None) -> None:
+    """Stop profiling and print the report
+    """
+    global _isEnabled
+
+    if not _isEnabled:
+        return
+
+    totalDuration = (time.perf_counter() - _startTime) * 1000
+
+    _isEnabled = False
+    builtins.__import__ = _originalImport
+
+    file = file or sys.stderr
+
+    # Nested imports are printed in the order they are done, below the import requiring them
+    print("Startup profile (ms)", file = file)
+    print("  Imports", file = file)
+    for depth, name, duration in _sorted_imports():
+        if duration >= REPORT_MIN_DURATION:
+            print("  {:>10.1f}  {}{}".format(duration, "  " * depth, name), file = file)
+
+    print("  Phases", file = file)
+    for name, duration in _phases:
+        print("  {:>10.1f}  {}".format(duration, name), file = file)
+
+    print("  {:>10.1f}  total".format(totalDuration), file = file)
+
+def _sorted_imports():
+    """Return imports with each import before the nested ones
+    (records are appended when imports end, so nested imports come first)
+    """
+    sortedImports = []
+    pending = []
+
+    for record in _imports:
+        depth = record[0]
+
+        # Nested imports of this one are the pending imports deeper than it
+        children = [pendingRecord for pendingRecord in pending if pendingRecord[0] > depth]
+        pending = [pendingRecord for pendingRecord in pending if pendingRecord[0] <= depth]
+
+        pending.append(record)
+        record.append(children)
+
+    def flatten(records):
+        for record in records:
+            sortedImports.append(record[:3])
+            flatten(record[3])
+
+    flatten(pending)
+    return sortedImports
@@ -1,17 +1,21 @@
 import logging
+from collections import namedtuple
 import threading
+import os
 import re
 
-from bs4 import BeautifulSoup
-
 import Sword
 
-from gi.repository import GLib
+import theke.lruCache
+import theke.searchIndex
+import theke.tracing
 
 logger = logging.getLogger(__name__)
 
-MODTYPE_BIBLES = Sword.SWMgr().MODTYPE_BIBLES
-MODTYPE_GENBOOKS = Sword.SWMgr().MODTYPE_GENBOOKS
+# Values of Sword.SWMgr.MODTYPE_BIBLES and Sword.SWMgr.MODTYPE_GENBOOKS
+# (reading them from a SWMgr instance would scan every installed module)
+MODTYPE_BIBLES = "Biblical Texts"
+MODTYPE_GENBOOKS = "Generic Books"
 
 FMT_HTML = Sword.FMT_HTML
 FMT_PLAIN = Sword.FMT_PLAIN
@@ -19,51 +23,226 @@ FMT_OSIS = Sword.FMT_OSIS
 
 MARKUP = {"2TGreek": FMT_OSIS, "MorphGNT": FMT_HTML, "OSHB": FMT_HTML}
 
-pattern_paragraph_range = re.compile(r'^(\d+) to (\d+)$')
+# A node of the tree of a general book
+#   offset: position of the node in the index of the module (see Sword.TreeKey.setOffset())
+#   lastPosition: position (in the order of the book) of its last descendant
+TreeNode = namedtuple('treeNode', ['offset', 'parentOffset', 'previousOffset', 'nextOffset', 'depth', 'name', 'path', 'lastPosition'])
+
+pattern_config_section = re.compile(r'^\s*\[([^\]]+)\]')
+pattern_strongs = re.compile(r'^[GH]\d+$')
+# Tags removed from verses (see clean_verse())
+pattern_paired_unwanted_tag = re.compile(r'<(div|chapter)\b[^>]*(?<!/)>(?:(?!<(?:div|chapter)\b)[^<]|<(?!/?(?:div|chapter)\b))*?</\1\s*>')
+pattern_unwanted_tag = re.compile(r'</?(?:div|chapter)\b[^>]*>')
+# Tags balanced in verses (see balance_tags())
+pattern_tag = re.compile(r'<(/?)([A-Za-z][\w:.-]*)[^>]*>')
+VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'))
+pattern_w_lemma = re.compile(r'<w\s[^>]*?lemma="([^"]*)"')
+pattern_sync_strongs = re.compile(r'<sync\s[^>]*?type="Strongs"[^>]*?value="([^"]*)"')
+
+# Global options set on sword managers (all of them are needed to study biblical texts)
+DEFAULT_GLOBAL_OPTIONS = (
+    ("Strong's Numbers", "On"),
+    ("Cross-references", "Off"),
+    ("Lemmas", "On"),
+    ("Morphological Tags", "On"),
+    ("Hebrew Vowel Points", "On"),
+)
+
+# Global options to get the plain text of verses (eg. to index them)
+PLAIN_TEXT_GLOBAL_OPTIONS = (
+    ("Strong's Numbers", "Off"),
+    ("Cross-references", "Off"),
+    ("Footnotes", "Off"),
+    ("Lemmas", "Off"),
+    ("Morphological Tags", "Off"),
+    ("Hebrew Vowel Points", "Off"),
+    ("Hebrew Cantillation", "Off"),
+)
+
+# Number of search results sent at once to the main loop
+SEARCH_RESULTS_BATCH_SIZE = 200
+
+# Maximal number of open module handles kept by each sword library
+MODULES_POOL_SIZE = 16
+
+# Pool of sword libraries: one per markup and set of global options
+_libraries = {}
+_librariesLock = threading.Lock()
+
+# Pools of libraries not shared with the rendering of documents in the main thread
+# (a sword library is used by one thread at a time, see SwordLibrary.lock)
+POOL_SEARCH = 'search'
+POOL_PREFETCH = 'prefetch'
+
+def get_library(markup = Sword.FMT_PLAIN, globalOptions = DEFAULT_GLOBAL_OPTIONS, pool = None):
+    """Return the shared sword library for this markup and these global options
+
+    Creating a sword manager rescans every installed module,
+    so libraries are created once and live as long as the application.
+
+    @param markup: FMT_PLAIN, FMT_HTML, FMT_OSIS
+    @param globalOptions: tuple of (option name, value)
+    @param pool: POOL_SEARCH, POOL_PREFETCH or None (libraries used to render documents)
+    """
+    poolKey = (pool, markup, tuple(globalOptions))
+
+    with _librariesLock:
+        library = _libraries.get(poolKey, None)
+
+        if library is None:
+            library = SwordLibrary(markup, globalOptions)
+            _libraries[poolKey] = library
+
+        return library
+
+def reset_libraries() -> None:
+    """Forget shared sword libraries (eg. when modules were installed or removed),
+    new ones are created on demand
+    """
+    with _librariesLock:
+        _libraries.clear()
+
+def get_config_dirs():
+    """Return directories where sword reads configurations of modules (mods.d)
+
+    They are found as sword does, without creating a sword manager (which scans every module).
+    """
+    dataPaths = []
+
+    if os.environ.get('SWORD_PATH'):
+        dataPaths.append(os.environ['SWORD_PATH'])
+
+    for swordConfPath in ('/etc/sword.conf', '/usr/local/etc/sword.conf'):
+        try:
+            with open(swordConfPath, 'r') as swordConf:
+                for line in swordConf:
+                    key, _, value = line.partition('=')
+                    if key.strip() in ('DataPath', 'AugmentPath') and value.strip():
+                        dataPaths.append(value.strip())
+
+        except OSError:
+            pass
+
+    dataPaths.extend([os.path.expanduser('~/.sword'), '/usr/share/sword', '/usr/local/share/sword'])
+
+    configDirs = []
+    for dataPath in dataPaths:
+        configDir = os.path.realpath(os.path.join(dataPath, 'mods.d'))
+
+        if configDir not in configDirs and os.path.isdir(configDir):
+            configDirs.append(configDir)
+
+    return configDirs
+
+def read_config_module_name(path):
+    """Return the name of the module described by a configuration file (or None)
+    """
+    try:
+        with open(path, 'r', errors = 'replace') as config:
+            for line in config:
+                match_section = pattern_config_section.match(line)
+                if match_section:
+                    return match_section.group(1)
+
+    except OSError:
+        pass
+
+    return None
+
+def get_pool_stats() -> dict:
+    """Return some statistics about the pool of sword libraries
+    """
+    with _librariesLock:
+        libraries = list(_libraries.values())
+
+    return {
+        'libraries': len(libraries),
+        'handles': sum(len(library._handles) for library in libraries),
+        'hits': sum(library._handles.hits for library in libraries),
+        'misses': sum(library._handles.misses for library in libraries),
+        'rss': _get_resident_memory(),
+    }
+
+def _get_resident_memory() -> int:
+    """Return the resident memory of the process in bytes (-1 if unknown)
+    """
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    except (OSError, ValueError, IndexError):
+        return -1
 
 class SwordLibrary():
-    def __init__(self, markup = Sword.FMT_PLAIN):
+    def __init__(self, markup = Sword.FMT_PLAIN, globalOptions = DEFAULT_GLOBAL_OPTIONS):
+        """Prefer get_library() to share sword managers
+
+        @param markup: FMT_PLAIN, FMT_HTML, FMT_OSIS
+        @param globalOptions: tuple of (option name, value)
+        """
         logger.debug("SwordLibrary - Create a new instance")
         self.markup = Sword.MarkupFilterMgr(markup)
         self.markup.thisown = False
 
         self.mgr = Sword.SWMgr(self.markup)
 
+        for optionName, value in globalOptions:
+            self.mgr.setGlobalOption(optionName, value)
+
+        # Sword modules share the state of their manager (keys, options, ...),
+        # any access to a module should hold this lock
+        self.lock = threading.RLock()
+
+        # Open module handles, by (class, module name)
+        self._handles = theke.lruCache.LRUCache(MODULES_POOL_SIZE, "SwordModulesPool")
+
     def get_modules(self):
         """Return iterator through available modules
         """
         for moduleName in self.mgr.getModules():
-            yield str(moduleName), SwordModule(str(moduleName), self.mgr)
+            yield str(moduleName), self.get_module(str(moduleName))
 
     def get_module(self, moduleName):
         """Return a module given its name
         """
-        return SwordModule(moduleName, self.mgr)
+        return self._get_handle(SwordModule, moduleName)
 
     def get_bible_module(self, moduleName):
         """Return a biblical module given its name
         """
-        self.mgr.setGlobalOption("Strong's Numbers", "On")
-        self.mgr.setGlobalOption("Cross-references", "Off")
-        self.mgr.setGlobalOption("Lemmas", "On")
-        self.mgr.setGlobalOption("Morphological Tags", "On")
-        self.mgr.setGlobalOption("Hebrew Vowel Points", "On")
-
-        return SwordBible(moduleName, self.mgr)
+        return self._get_handle(SwordBible, moduleName)
 
     def get_book_module(self, moduleName):
         """Return a general book module given its name
         """
-        return SwordBook(moduleName, self.mgr)
+        return self._get_handle(SwordBook, moduleName)
+
+    def _get_handle(self, moduleClass, moduleName):
+        """Return an open handle to a module, from the pool if possible
+        """
+        handleKey = (moduleClass, moduleName)
+
+        with self.lock:
+            handle = self._handles.get(handleKey)
+
+            if handle is None:
+                handle = moduleClass(moduleName, self)
+                self._handles.put(handleKey, handle)
+
+            return handle
 
 class SwordModule():
-    def __init__(self, moduleName, mgr):
+    def __init__(self, moduleName, library):
+        """
+        @param library: the SwordLibrary owning the module
+        """
         self.moduleName = moduleName
-        self.mod = mgr.getModule(moduleName)
+        self.mod = library.mgr.getModule(moduleName)
 
-        # Trick: keep a reference to the SwordManager
-        #        otherwise, the Sword library crashes
-        self.mgr = mgr
+        # Modules are owned by the sword manager of the library,
+        # so the library should live at least as long as its modules
+        # (otherwise, the Sword library crashes)
+        self.library = library
 
         if not self.mod:
             raise ValueError("Unknown module: {}.".format(moduleName))
@@ -130,49 +309,78 @@ class SwordBible(SwordModule):
         @param chapter: (int)
         @param verse: (int)
         """
-        self.key.setBookName(bookName)
-        self.key.setChapter(chapter)
-        self.key.setVerse(verse)
+        with self.library.lock:
+            self.key.setBookName(bookName)
+            self.key.setChapter(chapter)
+            self.key.setVerse(verse)
 
-        self.mod.setKey(self.key)
+            self.mod.setKey(self.key)
 
-        return self.mod.renderText()
+            return self.mod.renderText()
 
     def get_chapter(self, bookName, chapter):
         """
         @param bookName: (string)
         @param chapter: (int)
         """
-        self.key.setBookName(bookName)
-        self.key.setChapter(chapter)
-        self.key.setVerse(1)
+        with self.library.lock, theke.tracing.span("sword.renderText", module = self.moduleName):
+            self.key.setBookName(bookName)
+            self.key.setChapter(chapter)
+            self.key.setVerse(1)
 
-        self.mod.setKey(self.key)
+            self.mod.setKey(self.key)
 
-        verses = []
+            rawVerses = []
 
-        while True:
-            verses.append(self.clean_verse(str(self.mod.renderText())))
-            self.key.increment()
+            while True:
+                rawVerses.append(str(self.mod.renderText()))
+                self.key.increment()
 
-            if self.key.getChapter() != chapter:
-                break
+                if self.key.getChapter() != chapter:
+                    break
 
-        return verses
-    
-    def clean_verse(self, rawVerse) -> str:
-        """Remove unwanted tags that break the display of a verse
+        # Verses are cleaned once the library is released
+        with theke.tracing.span("sword.clean_verse", module = self.moduleName):
+            return [self.clean_verse(rawVerse) for rawVerse in rawVerses]
 
-        For exemple, in swod modules, the last verse of the last chapter
-        of each biblical book ends with something like:
-            <chapter eID="gen4852" osisID="Acts.28"/> <div eID="gen3852" osisID="Acts" type="book"/>
+    def get_plain_books(self):
+        """Yield the plain text and the words (Strong's numbers, lemmas) of each book of the module
+
+        @return: iterator of (bookName, list of (chapter, verse, text, words))
+            where words is a list of (strongs, lemma)
         """
-        v = BeautifulSoup(rawVerse, 'html.parser')
-        for tag in v(['div', 'chapter']):
-            # Remove tags
-            tag.decompose()
+        defaultStrongsPrefix = 'H' if self.get_lang() in ('he', 'hbo') else 'G'
 
-        return v.prettify()
+        for itestament in [1, 2]:
+            with self.library.lock:
+                self.key.setTestament(itestament)
+                nbOfBooks = self.key.getBookMax()
+
+            for ibook in range(1, nbOfBooks +1):
+                # The lock is released between books, so that the module stays usable
+                with self.library.lock:
+                    self.key.setTestament(itestament)
+                    self.key.setBook(ibook)
+                    bookName = str(self.key.getBookName())
+                    verses = []
+
+                    for ichapter in range(1, self.key.getChapterMax() +1):
+                        self.key.setChapter(ichapter)
+
+                        for iverse in range(1, self.key.getVerseMax() +1):
+                            self.key.setVerse(iverse)
+                            self.mod.setKey(self.key)
+
+                            text = str(self.mod.stripText()).strip()
+                            if text:
+                                words = get_words(str(self.mod.getRawEntry()), defaultStrongsPrefix)
+                                verses.append((ichapter, iverse, text, words))
+
+                if verses:
+                    yield bookName, verses
+
+    def clean_verse(self, rawVerse) -> str:
+        return clean_verse(rawVerse)
 
 class SwordBook(SwordModule):
     def __init__(self, *argv, **kwargs):
@@ -183,93 +391,272 @@ class SwordBook(SwordModule):
         self.mod = Sword.SWGenBook_castTo(self.mod)
         self.key = Sword.TreeKey_castTo(self.mod.getKey())
 
-    def get_paragraph(self, parID):
-        """Return a paragraph given its id
+    def get_tree_nodes(self):
+        """Walk the tree of the book once
+
+        @return: list of TreeNode in the order of the book
         """
-        isParagraphFound, text = self.do_get_paragraph(self.key, parID)
-        self.do_reset_key(self.key)
+        nodes = []
+
+        with self.library.lock:
+            self.key.root()
+            self._walk_tree(self.key, nodes, self.key.getOffset(), 1)
+            self.key.root()
 
-        return text if isParagraphFound else None
+        return [TreeNode._make(node) for node in nodes]
 
-    def get_paragraph_and_siblings(self, parID):
-        """Return a paragraph with its surrounding given its id
+    def _walk_tree(self, tk, nodes, parentOffset, depth) -> None:
+        """Append the descendants of the current node of tk to nodes (tk is left on this node)
         """
-        isParagraphFound, text = self.do_get_paragraph(self.key, parID, doGetSiblings=True)
-        self.do_reset_key(self.key)
+        if not tk.firstChild():
+            return
 
-        return text if isParagraphFound else None
+        previousNode = None
 
-    def do_get_paragraph(self, tk, parID, doGetSiblings = False):
-        '''Return paragraph given its ID
+        while True:
+            node = [tk.getOffset(), parentOffset, None, None, depth, str(tk.getLocalName()), str(tk.getText()), None]
 
-        @param tk: a Sword.TreeKey of the module
-        @param parID: (string) id of the paragraph
-        '''
-        text = ""
-        isParagraphFound = False
+            if previousNode is not None:
+                node[2] = previousNode[0]
+                previousNode[3] = node[0]
 
-        if tk.firstChild():
-            while True:
-                # Each section has a name (= osisID)
-                sectionName = tk.getLocalName()
-                text += str(self.mod.renderText())
-
-                # Look if sectionName matches a paragraph range pattern
-                # (eg. osisId="1-5" for a section containing paragraphs from 1 to 5)
-                match_paragraph_range = pattern_paragraph_range.match(sectionName)
-
-                if parID.isdigit() and match_paragraph_range is not None:
-                    start = int(match_paragraph_range.group(1))
-                    end = int(match_paragraph_range.group(2))
-
-                    if start <= int(parID) <= end and tk.hasChildren():
-                        isParagraphFound, parText = self.do_get_paragraph(tk, parID, doGetSiblings=True)
-                        return (isParagraphFound, text + parText)
-
-                # Look if sectionName matches a paragraph pattern
-                # (paragraph number, eg. osisID="1" for paragraph number 1)
-                elif sectionName == parID:
-                    if doGetSiblings:
-                        isParagraphFound = True
-                    else:
-                        return (True, str(self.mod.renderText()))
-
-                elif tk.hasChildren():
-                    isParagraphFound, text = self.do_get_paragraph(tk, parID, doGetSiblings=True)
-                    if isParagraphFound:
-                        return (isParagraphFound, text)
-
-                if not tk.nextSibling():
-                    break
+            nodes.append(node)
+            self._walk_tree(tk, nodes, node[0], depth + 1)
 
-            tk.parent()
-            return (isParagraphFound, text)
+            # Position of the last descendant of this node
+            node[7] = len(nodes) - 1
+            previousNode = node
 
-        return (isParagraphFound, text)
+            if not tk.nextSibling():
+                break
 
-    def do_reset_key(self, tk):
-        while tk.parent():
-            pass
+        tk.parent()
 
-def bibleSearch_keyword_async(moduleName, keyword, callback):
-    """Do a asynchronous search in a biblical module
+    def get_texts(self, offsets):
+        """Return the rendered texts of nodes given their offsets in the tree (see get_tree_nodes())
+        """
+        texts = []
+
+        with self.library.lock, theke.tracing.span("sword.renderText", module = self.moduleName):
+            for offset in offsets:
+                self.key.setOffset(offset)
+                texts.append(str(self.mod.renderText()))
+
+            self.key.root()
+
+        return texts
+
+def clean_verse(rawVerse) -> str:
+    """Remove unwanted tags that break the display of a verse
+
+    For exemple, in swod modules, the last verse of the last chapter
+    of each biblical book ends with something like:
+        <chapter eID="gen4852" osisID="Acts.28"/> <div eID="gen3852" osisID="Acts" type="book"/>
+
+    div and chapter elements are removed with their content, milestones and unpaired tags alone.
+    The rest of the markup (eg. word attributes used by bible.js) is kept as is,
+    but balanced so that it does not run into the next verses (see balance_tags()).
+    """
+    if '<' not in rawVerse:
+        # No tag to remove or balance
+        return rawVerse
+
+    if pattern_unwanted_tag.search(rawVerse) is not None:
+        # Remove paired elements, from the innermost ones
+        nbOfSubstitutions = 1
+        while nbOfSubstitutions:
+            rawVerse, nbOfSubstitutions = pattern_paired_unwanted_tag.subn('', rawVerse)
+
+        rawVerse = pattern_unwanted_tag.sub('', rawVerse)
+
+    return balance_tags(rawVerse)
+
+def balance_tags(rawVerse) -> str:
+    """Close the elements left open in a verse, and remove closing tags opened by none
+
+        <w>a</w> <q>b --> <w>a</w> <q>b</q>
+        <b><i>a</b> --> <b><i>a</i></b>
+        a</span> b --> a b
+    """
+    openTags = []
+
+    # (start, end, replacement) of misplaced closing tags
+    fixes = []
+
+    for match_tag in pattern_tag.finditer(rawVerse):
+        isClosing, tagName = match_tag.groups()
+
+        if rawVerse[match_tag.end() - 2] == '/':
+            continue
+
+        tagName = tagName.lower()
+
+        if not isClosing:
+            if tagName not in VOID_TAGS:
+                openTags.append(tagName)
+
+        elif openTags and openTags[-1] == tagName:
+            openTags.pop()
+
+        elif tagName in openTags:
+            # Elements opened inside it are closed first
+            position = len(openTags) - 1 - openTags[::-1].index(tagName)
+            fixes.append((*match_tag.span(), ''.join('</{}>'.format(innerTagName) for innerTagName in reversed(openTags[position:]))))
+            del openTags[position:]
+
+        elif tagName not in VOID_TAGS:
+            fixes.append((*match_tag.span(), ''))
+
+    if not openTags and not fixes:
+        return rawVerse
+
+    for start, end, replacement in reversed(fixes):
+        rawVerse = rawVerse[:start] + replacement + rawVerse[end:]
+
+    return rawVerse + ''.join('</{}>'.format(tagName) for tagName in reversed(openTags))
+
+def get_words(rawVerse, defaultStrongsPrefix = 'G'):
+    """Return the words (Strong's numbers, lemmas) tagged in a raw verse (OSIS or ThML markup)
+
+        <w lemma="strong:G2316 lemma.Strong:θεός">...</w> --> [("G2316", "θεός")]
+        <w lemma="b/strong:H7225">...</w> --> [("H7225", None)]
+
+    @return: list of (strongs, lemma)
     """
-    mod = SwordLibrary().get_bible_module(moduleName)
+    words = []
+
+    for rawLemmas in pattern_w_lemma.findall(rawVerse):
+        strongsNumbers = []
+        lemma = None
+
+        for token in rawLemmas.split():
+            if token.startswith('lemma.'):
+                lemma = token.split(':', 1)[-1]
+                continue
+
+            for part in token.split('/'):
+                prefix, _, value = part.rpartition(':')
+
+                if prefix and prefix != 'strong':
+                    continue
+
+                strongs = theke.searchIndex.normalize_strongs(value, defaultStrongsPrefix)
+                if strongs is not None:
+                    strongsNumbers.append(strongs)
+
+        for strongs in strongsNumbers:
+            words.append((strongs, lemma))
+
+    for rawStrongs in pattern_sync_strongs.findall(rawVerse):
+        strongs = theke.searchIndex.normalize_strongs(rawStrongs, defaultStrongsPrefix)
+        if strongs is not None:
+            words.append((strongs, None))
+
+    return words
+
+def bibleSearch_keyword(moduleName, keyword, isCancelled = None, searchIndex = None):
+    """Search in a biblical module, yielding results in batches as soon as they are found
+
+    Strong's numbers are searched in the concordance, keywords in the full-text index,
+    if the module is indexed there. Else, the search is done in the sword module.
+
+    @param isCancelled: function returning True if the search should stop
+    @param searchIndex: search index of biblical modules (default: a new instance)
+    @return: iterator of (list of (bookName, reference), nbOfResults)
+        where nbOfResults is the total number of results of the search
+    """
+    if isCancelled is None:
+        isCancelled = lambda: False
+
+    def index_results_batches(results):
+        nbOfResults = sum(len(references) for references in results.values())
+        batch = []
+
+        for bookName, references in results.items():
+            for reference in references:
+                batch.append((bookName, reference))
+
+                if len(batch) >= SEARCH_RESULTS_BATCH_SIZE:
+                    yield batch, nbOfResults
+                    batch = []
+
+        if batch:
+            yield batch, nbOfResults
+
+    searchIndex = searchIndex or theke.searchIndex.ThekeSearchIndex()
+
+    if pattern_strongs.match(keyword):
+        if searchIndex.has_concordance(moduleName):
+            logger.debug("Search %s in the concordance of %s", keyword, moduleName)
+            yield from index_results_batches(searchIndex.get_concordance(moduleName, keyword))
+            return
+
+    else:
+        if searchIndex.is_module_indexed(moduleName):
+            logger.debug("Search %s in the full-text index of %s", keyword, moduleName)
+            yield from index_results_batches(searchIndex.search(moduleName, keyword))
+            return
+
+    # The library is locked during the whole scan of the module:
+    # a library of its own is used, so that rendering chapters does not wait for the search
+    mod = get_library(pool = POOL_SEARCH).get_bible_module(moduleName)
+    batches = []
+
+    with mod.library.lock:
+        if isCancelled():
+            return
 
-    def do_search():
         rawResults = mod.mod.doSearch(keyword)
+        nbOfResults = rawResults.getCount()
 
         # rawResults cannot be pass to callback (weird bug)
-        # so it is copied in a dictionnary
-        # In addition, results are sort by book
-        results = {}
-        for _ in range(rawResults.getCount()):
+        # so results are copied in batches of (bookName, reference)
+        batch = []
+        for _ in range(nbOfResults):
+            if isCancelled():
+                return
+
             bookName = str(Sword.VerseKey_castTo(rawResults.getElement()).getBookName())
-            results[bookName] = results.get(bookName, []) + [str(rawResults.getText())]
-            #results.append(rawResults.getText())
+            batch.append((bookName, str(rawResults.getText())))
             rawResults.increment()
 
-        GLib.idle_add(callback, results)
+            if len(batch) >= SEARCH_RESULTS_BATCH_SIZE:
+                batches.append(batch)
+                batch = []
+
+        if batch:
+            batches.append(batch)
+
+    # Batches are yielded once the module is released
+    for batch in batches:
+        yield batch, nbOfResults
+
+if __name__ == "__main__":
+    # Benchmark of the verse sanitizer on a long chapter (Psalm 119-like, 176 verses)
+    #   python3 -m theke.sword [nbOfRuns]
+    import sys
+    import timeit
+
+    from bs4 import BeautifulSoup
+
+    nbOfRuns = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    def clean_verse_with_bs4(rawVerse) -> str:
+        v = BeautifulSoup(rawVerse, 'html.parser')
+        for tag in v(['div', 'chapter']):
+            tag.decompose()
+
+        return v.prettify()
+
+    rawWord = '<w lemma="strong:H{0} lemma.Strong:word{0}" morph="oshm:HNcmsc" wn="00{1}">word{0}</w> '
+    verses = []
+    for iverse in range(1, 177):
+        verses.append(''.join(rawWord.format(1000 + iverse * 8 + i, i) for i in range(12)))
+
+    verses[0] = '<div type="section" sID="s1"/><chapter sID="Ps.119" osisID="Ps.119"/>' + verses[0]
+    verses[-1] += '<chapter eID="Ps.119" osisID="Ps.119"/> <div eID="gen3852" osisID="Ps" type="book"/>'
 
-    thread = threading.Thread(target=do_search, daemon=True)
-    thread.start()
+    for name, function in (("BeautifulSoup + prettify", clean_verse_with_bs4), ("clean_verse", clean_verse)):
+        duration = timeit.timeit(lambda: [function(verse) for verse in verses], number = nbOfRuns)
+        size = sum(len(function(verse)) for verse in verses)
+        print("{:<26} {:8.2f} ms/chapter {:8d} characters".format(name, 1e3 * duration / nbOfRuns, size))
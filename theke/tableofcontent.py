@@ -18,19 +18,57 @@ def get_toc_BIBLE(ref):
 
     return toc
 
+def get_toc_BOOK(ref, sourceName, sections):
+    """Return the table of contents of a book given its sections
+
+    @param sourceName: source the book is read from
+    @param sections: list of headings (theke.index.DocumentSectionData) in the order of the document
+    """
+    toc = ThekeTOC(type_of_toc = theke.TYPE_BOOK)
+
+    # Last entry of each level
+    parents = {}
+
+    for section in sections:
+        parent = None
+        for level in range(section.level - 1, 0, -1):
+            if level in parents:
+                parent = parents[level]
+                break
+
+        uri = theke.uri.build('theke', ['', theke.uri.SEGM_DOC, theke.uri.SEGM_BOOK, ref.documentName],
+            fragment = section.anchor, sources = [sourceName])
+        treeIter = toc.append(section.label, uri, parent)
+
+        parents = {level: parentIter for level, parentIter in parents.items() if level < section.level}
+        parents[section.level] = treeIter
+
+        toc.paths[section.anchor] = toc.toc.get_path(treeIter)
+
+    return toc
+
 class ThekeTOC():
     def __init__(self, type_of_toc = 0) -> None:
         if type_of_toc == theke.TYPE_BIBLE:
             self.toc = Gtk.ListStore(str, object)
+        elif type_of_toc == theke.TYPE_BOOK:
+            self.toc = Gtk.TreeStore(str, object)
         else:
             raise("Unknown type of TOC")
 
         self.type = type_of_toc
 
-    def append(self, label, data) -> None:
+        # anchor --> path of its entry (books)
+        self.paths = {}
+
+    def append(self, label, data, parent = None) -> None:
         """Append an entry to the table of content
 
         @param label: name of the entry
         @param data: data needed to jump to this entry (section number, uri, ...)
+        @param parent: (Gtk.TreeIter) parent entry (books only)
         """
+        if self.type == theke.TYPE_BOOK:
+            return self.toc.append(parent, (label, data))
+
         return self.toc.append((label, data))
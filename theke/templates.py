@@ -3,16 +3,51 @@
 Build and manage templates.
 '''
 
+import gzip
+import os
+
 import theke
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemLoader, TemplateNotFound, select_autoescape
+from jinja2.loaders import split_template_path
 
 # Config
 templates_path = './assets/templates'
 assets_path = './assets'
 
+class CompressedFileSystemLoader(FileSystemLoader):
+    """Load templates from the file system,
+    gzip compressed files (*.gz, eg. documents from the cache) being transparently decompressed.
+    """
+    def get_source(self, environment, template):
+        if not template.endswith('.gz'):
+            return super().get_source(environment, template)
+
+        pieces = split_template_path(template)
+
+        for searchpath in self.searchpath:
+            filename = os.path.join(searchpath, *pieces)
+
+            if os.path.isfile(filename):
+                break
+        else:
+            raise TemplateNotFound(template)
+
+        with gzip.open(filename, 'rt', encoding = self.encoding) as f:
+            contents = f.read()
+
+        mtime = os.path.getmtime(filename)
+
+        def uptodate() -> bool:
+            try:
+                return os.path.getmtime(filename) == mtime
+            except OSError:
+                return False
+
+        return contents, os.path.normpath(filename), uptodate
+
 env = Environment(
-    loader = FileSystemLoader([templates_path, theke.PATH_CACHE]),
+    loader = CompressedFileSystemLoader([templates_path, theke.PATH_CACHE]),
     autoescape = select_autoescape(['html', 'xml'])
 )
 env.globals.update(zip=zip)
@@ -24,7 +59,16 @@ def build_template(template_name, template_data):
     @param template_data: dict with needed datas to compile the template
     '''
     template = env.get_template('{}.html.j2'.format(template_name))
-    template.stream(template_data).dump('{}/{}.html'.format(assets_path, template_name))
+    path = get_built_template_path(template_name)
+
+    # The asset file is replaced only once it is completely written
+    template.stream(template_data).dump(path + '.part')
+    os.replace(path + '.part', path)
+
+def get_built_template_path(template_name):
+    '''Return the path of the asset file built from a template.
+    '''
+    return '{}/{}.html'.format(assets_path, template_name)
 
 def render(template_name, template_data):
     '''Fill a template with given data and return the str.
@@ -34,5 +78,11 @@ def render(template_name, template_data):
     # template.stream(template_data).dump('{}.html'.format(template_name))
     return template.render(template_data)
 
+def generate(template_name, template_data):
+    '''Fill a template with given data and yield the str piece by piece.
+    '''
+    template = env.get_template('{}.html.j2'.format(template_name))
+    return template.generate(template_data)
+
 if __name__ == '__main__':
     build_template('welcome_', {'title': 'FOO!'})
@@ -0,0 +1,208 @@
+"""Tracing of the navigation pipeline
+
+Spans measure each stage of the loading of a document: update of the context, references,
+index queries, sword rendering, templates and webkit (see the --trace option of Theke).
+Spans of a navigation share its id, so that stages done in worker threads can be correlated.
+
+Events are written in the Chrome trace format (JSON array, open it with chrome://tracing
+or Perfetto) into a file rotated when it is too large. As the file is appended
+after each navigation, its closing bracket is omitted (this is allowed by the format).
+
+When tracing is not enabled, a span costs nothing but a function call.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager, nullcontext
+
+import theke
+
+import logging
+logger = logging.getLogger(__name__)
+
+TRACE_PATH = os.path.join(theke.PATH_DATA, 'trace.json')
+
+# Size (in bytes) beyond which the trace file is rotated, and number of old files kept
+TRACE_MAX_SIZE = 10 * 1024 * 1024
+TRACE_BACKUP_COUNT = 3
+
+_isEnabled = False
+_path = TRACE_PATH
+_pid = os.getpid()
+
+# Events waiting to be written (see flush())
+_events = []
+_eventsLock = threading.Lock()
+_fileLock = threading.Lock()
+
+# Threads whose name was written in the current trace file
+_namedThreads = set()
+
+# Id of the current navigation
+_navigationId = 0
+
+# name --> (start time, args) of spans in progress (see start_span())
+_runningSpans = {}
+
+_NULL_SPAN = nullcontext()
+
+def is_enabled() -> bool:
+    return _isEnabled
+
+def enable(path = None) -> None:
+    """Start tracing
+
+    @param path: path of the trace file (default: TRACE_PATH)
+    """
+    global _isEnabled, _path
+
+    if _isEnabled:
+        return
+
+    _isEnabled = True
+    _path = path or TRACE_PATH
+
+    logger.debug("Trace the navigation into %s", _path)
+    atexit.register(flush)
+
+def get_navigation_id() -> int:
+    """Return the id of the current navigation
+    (to be given to spans done later in a worker thread)
+    """
+    return _navigationId
+
+def _now() -> float:
+    """Return the current time in µs
+    """
+    return time.perf_counter() * 1e6
+
+def _add_event(name, start, duration, args) -> None:
+    tid = threading.get_native_id()
+
+    with _eventsLock:
+        if tid not in _namedThreads:
+            _namedThreads.add(tid)
+            _events.append({'name': 'thread_name', 'ph': 'M', 'pid': _pid, 'tid': tid,
+                'args': {'name': threading.current_thread().name}})
+
+        _events.append({'name': name, 'cat': 'theke', 'ph': 'X', 'pid': _pid, 'tid': tid,
+            'ts': round(start, 1), 'dur': round(duration, 1), 'args': args})
+
+def span(name, navigationId = None, **args):
+    """Measure a stage of the navigation
+
+        with theke.tracing.span("archivist.get_document_handler", ref = ref):
+            ...
+
+    @param navigationId: id of the navigation the stage belongs to (default: the current one)
+    @param args: displayed with the span (converted to str when they are written)
+    """
+    if not _isEnabled:
+        return _NULL_SPAN
+
+    return _span(name, navigationId, args)
+
+@contextmanager
+def _span(name, navigationId, args):
+    args['navigation'] = _navigationId if navigationId is None else navigationId
+    start = _now()
+
+    try:
+        yield
+
+    finally:
+        _add_event(name, start, _now() - start, args)
+
+def start_span(name, **args) -> None:
+    """Start a span ending in another function (see end_span())
+
+    Those spans are measured in the main thread.
+    """
+    if _isEnabled:
+        args['navigation'] = _navigationId
+        _runningSpans[name] = (_now(), args)
+
+def end_span(name, **args) -> None:
+    if _isEnabled and name in _runningSpans:
+        start, startArgs = _runningSpans.pop(name)
+        startArgs.update(args)
+        _add_event(name, start, _now() - start, startArgs)
+
+def start_navigation(uri) -> int:
+    """Start a new navigation: next spans belong to it, until end_navigation()
+
+    @param uri: (str) the loaded uri
+    @return: the id of the navigation
+    """
+    global _navigationId
+
+    if not _isEnabled:
+        return _navigationId
+
+    if 'navigation' in _runningSpans:
+        end_navigation("interrupted")
+
+    _navigationId += 1
+    start_span('navigation', uri = uri)
+
+    return _navigationId
+
+def end_navigation(status = "loaded") -> None:
+    """End the current navigation and write its events into the trace file
+    """
+    if not _isEnabled or 'navigation' not in _runningSpans:
+        return
+
+    for name in list(_runningSpans.keys()):
+        if name != 'navigation':
+            end_span(name, status = status)
+
+    end_span('navigation', status = status)
+    flush()
+
+def flush() -> None:
+    """Write pending events into the trace file
+    """
+    global _events
+
+    with _eventsLock:
+        events, _events = _events, []
+
+    if not events:
+        return
+
+    with _fileLock:
+        try:
+            _rotate()
+
+            if not os.path.isfile(_path):
+                with open(_path, 'w') as traceFile:
+                    traceFile.write("[\n")
+
+            with open(_path, 'a') as traceFile:
+                for event in events:
+                    traceFile.write(json.dumps(event, default = str))
+                    traceFile.write(",\n")
+
+        except OSError as error:
+            logger.warning("Cannot write the trace file %s: %s", _path, error)
+
+def _rotate() -> None:
+    """Rotate the trace file if it is too large: trace.json --> trace.json.1 --> trace.json.2 ...
+    """
+    if not os.path.isfile(_path) or os.path.getsize(_path) < TRACE_MAX_SIZE:
+        return
+
+    for index in range(TRACE_BACKUP_COUNT - 1, 0, -1):
+        if os.path.isfile("{}.{}".format(_path, index)):
+            os.replace("{}.{}".format(_path, index), "{}.{}".format(_path, index + 1))
+
+    os.replace(_path, "{}.1".format(_path))
+
+    # Names of threads are written again in the new file
+    with _eventsLock:
+        _namedThreads.clear()
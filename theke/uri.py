@@ -26,6 +26,7 @@ SEGM_BIBLE = 'bible'
 SEGM_BOOK = 'book'
 
 SEGM_SIGNAL = 'signal'
+SEGM_FRAGMENT = 'fragment'
 
 class comparison():
     """Byte masks for uri comparison
@@ -71,6 +72,7 @@ def parse(uri):
         theke:/app/welcome
         theke:/app/assets/css/default.css
         theke:/doc/bible/John 1:1?sources=MorphGNT
+        theke:/fragment/bible/John 2?sources=MorphGNT (a chapter, in the continuous reading mode)
     '''
 
     # Parse the uri